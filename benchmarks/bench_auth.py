@@ -0,0 +1,121 @@
+"""Lecturas del token: CacheFileHandler de spotipy vs spotibot.auth.
+
+Varios hilos piden el token como lo hace spotipy antes de cada petición
+(get_access_token) y se cuentan lecturas del fichero y renovaciones. El
+endpoint de renovación es falso: no sale nada a la red.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_auth --threads 8 --calls 2000
+"""
+import argparse
+import builtins
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from spotipy.oauth2 import SpotifyOAuth
+
+from spotibot.auth import make_auth_manager
+
+
+class FakeTokenSession:
+    """Sustituye a la sesión HTTP del auth manager: cada POST es una renovación."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.posts = 0
+        self._lock = threading.Lock()
+
+    def post(self, url, **kwargs):
+        with self._lock:
+            self.posts += 1
+        time.sleep(self.latency)
+        return FakeResponse({"access_token": f"tok{self.posts}", "token_type": "Bearer",
+                             "expires_in": 3600, "scope": "playlist-read-private"})
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return dict(self.data)
+
+
+def count_opens(path):
+    counter = {"n": 0}
+    real_open = builtins.open
+
+    def counting_open(file, *args, **kwargs):
+        if os.fspath(file) == path:
+            counter["n"] += 1
+        return real_open(file, *args, **kwargs)
+    return counter, counting_open, real_open
+
+
+def no_interactive_login(*args, **kwargs):
+    # spotipy pide login por consola si lee el fichero a medio escribir
+    raise RuntimeError("token ilegible")
+
+
+def run(auth, path, threads, calls):
+    counter, counting_open, real_open = count_opens(path)
+    errors = []
+
+    def get_token(_):
+        try:
+            auth.get_access_token(as_dict=False)
+        except RuntimeError:
+            errors.append(1)
+
+    builtins.open = counting_open
+    try:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(get_token, range(calls)))
+        elapsed = time.perf_counter() - t0
+    finally:
+        builtins.open = real_open
+    return counter["n"], len(errors), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--refresh-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    logging.getLogger("spotipy").setLevel(logging.CRITICAL)
+    print(f"{'handler':>10} {'token':>10} {'aperturas':>10} {'renovaciones':>13} {'errores':>8} {'tiempo':>8}")
+    for expires_in in (3600, 30):
+        for name in ("spotipy", "spotibot"):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "token_cache.json")
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump({"access_token": "old", "refresh_token": "r", "token_type": "Bearer",
+                               "scope": "playlist-read-private", "expires_in": expires_in,
+                               "expires_at": int(time.time()) + expires_in}, f)
+                if name == "spotipy":
+                    auth = SpotifyOAuth("id", "secret", "http://127.0.0.1/cb", scope="playlist-read-private",
+                                        cache_path=path, open_browser=False)
+                else:
+                    auth = make_auth_manager("id", "secret", "http://127.0.0.1/cb", "playlist-read-private",
+                                             token_path=path)
+                fake = FakeTokenSession(args.refresh_latency)
+                auth._session = fake
+                auth.get_auth_response = no_interactive_login
+                opens, errors, elapsed = run(auth, path, args.threads, args.calls)
+                state = "válido" if expires_in > 60 else "caducando"
+                print(f"{name:>10} {state:>10} {opens:>10} {fake.posts:>13} {errors:>8} {elapsed:>7.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Tiempo de descarga de una playlist: paginación secuencial vs paralela.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_fetch --latency 0.05 --workers 8
+"""
+import argparse
+import time
+
+from benchmarks.fake_spotify import FakeSpotify, make_playlist
+from spotibot.fetch import fetch_playlist_items
+
+
+def sequential(sp, pid):
+    """El bucle original con sp.next()."""
+    items = []
+    results = sp.playlist_items(pid, limit=100)
+    while results:
+        items.extend(results["items"])
+        results = sp.next(results) if results["next"] else None
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.05, help="segundos por petición")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--sizes", default="100,500,1000,2500,5000,10000")
+    args = parser.parse_args()
+
+    print(f"{'tracks':>8} {'llamadas':>9} {'secuencial':>11} {'paralelo':>9} {'x':>6}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        sp = FakeSpotify({"bench": make_playlist(size)}, latency=args.latency)
+
+        t0 = time.perf_counter()
+        seq = sequential(sp, "bench")
+        t_seq = time.perf_counter() - t0
+        calls = sp.calls
+
+        t0 = time.perf_counter()
+        par = fetch_playlist_items(sp, "bench", max_workers=args.workers)
+        t_par = time.perf_counter() - t0
+
+        assert [i["track"]["id"] for i in seq] == [i["track"]["id"] for i in par]
+        print(f"{size:>8} {calls:>9} {t_seq:>10.2f}s {t_par:>8.2f}s {t_seq / t_par:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Lecturas repetidas de una playlist con y sin caché condicional (ETag).
+
+Servidor local que pone ETag a cada página y contesta 304 cuando llega
+un If-None-Match que coincide. Se descarga la misma playlist varias veces
+y se cuentan los bytes que salen del servidor.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_httpcache --tracks 5000 --runs 3
+"""
+import argparse
+import hashlib
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.fake_spotify import make_playlist
+from spotibot.fetch import fetch_playlist_items
+from spotibot.ratelimit import make_client
+
+
+def make_handler(items, counters):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", ["100"])[0])
+            data = json.dumps({"total": len(items), "items": items[offset:offset + limit], "next": None}).encode()
+            etag = '"' + hashlib.md5(data).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                counters["304"] += 1
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            counters["200"] += 1
+            counters["bytes"] += len(data)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tracks", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    items = make_playlist(args.tracks)
+    print(f"{'caché':>6} {'vuelta':>7} {'200':>5} {'304':>5} {'KB enviados':>12} {'tiempo':>8}")
+    for cached in (False, True):
+        counters = {"200": 0, "304": 0, "bytes": 0}
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(items, counters))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        with tempfile.TemporaryDirectory() as tmp:
+            client = make_client(auth="stub", rate=1000, burst=1000, max_concurrency=args.workers,
+                                 http_cache_dir=tmp if cached else None)
+            client.sp.prefix = f"http://127.0.0.1:{server.server_address[1]}/v1/"
+            expected = None
+            for run in range(1, args.runs + 1):
+                before = dict(counters)
+                t0 = time.perf_counter()
+                got = fetch_playlist_items(client, "bench", max_workers=args.workers)
+                elapsed = time.perf_counter() - t0
+                expected = expected or got
+                assert got == expected
+                print(f"{'sí' if cached else 'no':>6} {run:>7} {counters['200'] - before['200']:>5} "
+                      f"{counters['304'] - before['304']:>5} {(counters['bytes'] - before['bytes']) // 1024:>12} {elapsed:>7.2f}s")
+            if client.http_cache:
+                print(f"{'':>6} {client.http_cache.as_dict()}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
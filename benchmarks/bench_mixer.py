@@ -0,0 +1,65 @@
+"""Party Mixer: modo MIX original (O(n²)) vs estrategias de spotibot.mixer.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_mixer --lists 10 --size 5000
+"""
+import argparse
+import random
+import time
+
+from spotibot.mixer import STRATEGIES, mix
+from spotibot.records import TrackRecord
+
+
+def legacy_mix(lists):
+    """El bucle original con 'not in final_uris' sobre una lista."""
+    uris_lists = [[t.uri for t in tracks] for tracks in lists]
+    final_uris = []
+    max_len = max(len(l) for l in uris_lists)
+    for i in range(max_len):
+        for l in uris_lists:
+            if i < len(l) and l[i] not in final_uris:
+                final_uris.append(l[i])
+    return final_uris
+
+
+def make_lists(n_lists, size, overlap, seed):
+    rnd = random.Random(seed)
+    pool = n_lists * size
+    lists = []
+    for k in range(n_lists):
+        tracks = []
+        for j in range(size):
+            i = rnd.randrange(pool) if rnd.random() < overlap else k * size + j
+            tracks.append(TrackRecord(f"t{i}", f"spotify:track:t{i}", popularity=(i * 37) % 101))
+        lists.append(tracks)
+    return lists
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lists", type=int, default=10)
+    parser.add_argument("--size", type=int, default=5000)
+    parser.add_argument("--overlap", type=float, default=0.2, help="fracción de canciones repetidas entre listas")
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    lists = make_lists(args.lists, args.size, args.overlap, seed=1)
+    print(f"{args.lists} listas x {args.size} canciones")
+    print(f"{'estrategia':>12} {'únicas':>8} {'tiempo':>9}")
+
+    if not args.skip_legacy:
+        t0 = time.perf_counter()
+        legacy = legacy_mix(lists)
+        print(f"{'mix (antes)':>12} {len(legacy):>8} {time.perf_counter() - t0:>8.3f}s")
+
+    for name in STRATEGIES:
+        t0 = time.perf_counter()
+        out = list(mix(lists, name))
+        print(f"{name:>12} {len(out):>8} {time.perf_counter() - t0:>8.3f}s")
+        if name == "mix" and not args.skip_legacy:
+            assert out == legacy
+
+
+if __name__ == "__main__":
+    main()
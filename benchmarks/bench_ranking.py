@@ -0,0 +1,82 @@
+"""Ranking de popularidad: DataFrame de pandas vs spotibot.ranking.
+
+Se descarga la misma playlist falsa con cada método y se mide tiempo y
+pico de memoria (tracemalloc) del ranking. El camino 'pandas' es el de
+antes: lista de dicts -> DataFrame -> sort_values -> head(n). Si pandas
+no está instalado ese modo se salta.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_ranking --size 50000 --top 10
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.fake_spotify import FakeSpotify, make_playlist
+from spotibot.fetch import fetch_playlist_tracks
+from spotibot.ranking import ExternalRanking, rank_playlist
+from spotibot.records import RANK_FIELDS
+
+
+def pandas_rank(sp, n):
+    import pandas as pd
+    tracks = fetch_playlist_tracks(sp, "bench", max_workers=1, fields=RANK_FIELDS)
+    data = [{"Nombre": t.name, "Artista": t.artist, "Popularidad": t.popularity} for t in tracks]
+    df = pd.DataFrame(data).sort_values(by="Popularidad", ascending=False)
+    return df if n is None else df.head(n)
+
+
+def list_rank(sp, n):
+    """Lista completa + sort de Python (lo que hacía /rank en el bot)."""
+    tracks = fetch_playlist_tracks(sp, "bench", max_workers=1, fields=RANK_FIELDS)
+    tracks.sort(key=lambda t: t.popularity, reverse=True)
+    return tracks if n is None else tracks[:n]
+
+
+def heap_rank(sp, n):
+    return list(rank_playlist(sp, "bench", n, max_workers=1))
+
+
+def measure(func, sp, n):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = func(sp, n)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return len(result), elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--run-size", type=int, default=5000, help="tramo en memoria para 'all'")
+    args = parser.parse_args()
+
+    playlist = make_playlist(args.size)
+    print(f"{args.size} canciones")
+    print(f"{'método':>8} {'n':>6} {'filas':>7} {'tiempo':>8} {'pico MB':>8}")
+    for n in (args.top, None):
+        for name, func in (("pandas", pandas_rank), ("lista", list_rank), ("heap", heap_rank)):
+            sp = FakeSpotify({"bench": playlist})
+            try:
+                rows, elapsed, peak = measure(func, sp, n)
+            except ImportError:
+                print(f"{name:>8} {'all' if n is None else n:>6}   (pandas no instalado)")
+                continue
+            print(f"{name:>8} {'all' if n is None else n:>6} {rows:>7} {elapsed:>7.2f}s {peak / 1e6:>8.1f}")
+
+    # Orden estable: a igual popularidad manda la posición en la playlist
+    sp = FakeSpotify({"bench": playlist})
+    expected = list_rank(sp, None)
+    import spotibot.ranking as ranking
+    ranking.RUN_SIZE = args.run_size
+    assert [t.uri for t in heap_rank(sp, None)] == [t.uri for t in expected]
+    assert [t.uri for t in heap_rank(sp, args.top)] == [t.uri for t in expected[:args.top]]
+    assert isinstance(rank_playlist(sp, "bench", None, max_workers=1), ExternalRanking)
+    print("orden idéntico al sort estable de Python (también volcando tramos a disco)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Descarga contra un servidor local que responde 429 con Retry-After.
+
+El servidor deja pasar 'rps' peticiones por segundo y al resto les
+devuelve 429. Se compara el cliente de spotipy tal cual (reintentos a
+ciegas dentro de la sesión) con spotibot.ratelimit.make_client().
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_ratelimit --tracks 5000 --rps 20 --workers 8
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import spotipy
+
+from benchmarks.fake_spotify import make_playlist
+from spotibot.fetch import fetch_playlist_items
+from spotibot.ratelimit import make_client
+
+
+class StubState:
+    def __init__(self, items, rps, retry_after):
+        self.items = items
+        self.rps = rps
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.window = 0
+        self.count = 0
+        self.ok = 0
+        self.throttled = 0
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _json(self, status, body, headers=()):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            with state.lock:
+                second = int(time.monotonic())
+                if second != state.window:
+                    state.window, state.count = second, 0
+                state.count += 1
+                allowed = state.count <= state.rps
+                if allowed:
+                    state.ok += 1
+                else:
+                    state.throttled += 1
+            if not allowed:
+                self._json(429, {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                           headers=[("Retry-After", str(state.retry_after))])
+                return
+            query = parse_qs(urlparse(self.path).query)
+            offset = int(query.get("offset", ["0"])[0])
+            limit = int(query.get("limit", ["100"])[0])
+            self._json(200, {"total": len(state.items), "items": state.items[offset:offset + limit], "next": None})
+
+    return Handler
+
+
+def run(client, state, workers):
+    t0 = time.perf_counter()
+    try:
+        items = fetch_playlist_items(client, "bench", max_workers=workers)
+        result = f"{len(items)} items"
+    except Exception as e:
+        result = f"ERROR {type(e).__name__}: {str(e).splitlines()[0][:60]}"
+    return result, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tracks", type=int, default=5000)
+    parser.add_argument("--rps", type=int, default=20, help="peticiones por segundo que acepta el servidor")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    # spotipy registra cada 429 como error
+    logging.getLogger("spotipy").setLevel(logging.CRITICAL)
+
+    items = make_playlist(args.tracks)
+    for name in ("spotipy", "ratelimit"):
+        state = StubState(items, args.rps, args.retry_after)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        prefix = f"http://127.0.0.1:{server.server_address[1]}/v1/"
+
+        if name == "spotipy":
+            client = spotipy.Spotify(auth="stub")
+            client.prefix = prefix
+        else:
+            # El límite propio por debajo del servidor evita casi todos los 429
+            client = make_client(auth="stub", rate=args.rps * 0.9, burst=max(1, args.rps // 2), max_concurrency=args.workers)
+            client.sp.prefix = prefix
+
+        result, elapsed = run(client, state, args.workers)
+        server.shutdown()
+        print(f"{name:>10}: {result:<45} {elapsed:6.2f}s  peticiones={state.ok + state.throttled} 429={state.throttled}")
+        if name == "ratelimit":
+            print(f"{'':>10}  {client.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Bytes transferidos y memoria: JSON completo vs TrackRecord proyectado.
+
+Cada modo corre en un subproceso aparte para que el pico de RSS sea
+comparable. Uso (desde la raíz del repo):
+    python -m benchmarks.bench_records --size 10000
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_mode(mode, size):
+    from benchmarks.fake_spotify import FakeSpotify, make_playlist
+    from spotibot.fetch import fetch_playlist_items, fetch_playlist_tracks
+    from spotibot.records import RANK_FIELDS, URI_FIELDS
+
+    sp = FakeSpotify({"bench": make_playlist(size)})
+    base = peak_rss_kb()
+    if mode == "full":
+        # Comportamiento anterior: lista de dicts de track completos
+        tracks = [i["track"] for i in fetch_playlist_items(sp, "bench", max_workers=1) if i.get("track")]
+    else:
+        fields = RANK_FIELDS if mode == "rank" else URI_FIELDS
+        tracks = fetch_playlist_tracks(sp, "bench", max_workers=1, fields=fields)
+    print(json.dumps({
+        "mode": mode,
+        "tracks": len(tracks),
+        "bytes": sp.bytes_sent,
+        "rss_growth_kb": peak_rss_kb() - base,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.size)
+        return
+
+    print(f"{'modo':>6} {'tracks':>7} {'bytes':>12} {'RSS +KB':>9}")
+    for mode in ("full", "rank", "uri"):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_records", "--size", str(args.size), "--mode", mode],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(out)
+        print(f"{r['mode']:>6} {r['tracks']:>7} {r['bytes']:>12,} {r['rss_growth_kb']:>9,}")
+
+
+if __name__ == "__main__":
+    main()
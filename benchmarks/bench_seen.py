@@ -0,0 +1,90 @@
+"""global_tracks.txt vs SeenStore (SQLite) con 1M de canciones vistas.
+
+Mide lo que paga cada ejecución del actualizador: cargar el histórico,
+comprobar un lote de candidatas y guardar las nuevas. Cada modo va en un
+subproceso aparte para comparar el pico de RSS.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_seen --rows 1000000
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BATCH = 10000
+
+
+def fixture(directory, rows):
+    txt = os.path.join(directory, "global_tracks.txt")
+    db = os.path.join(directory, "seen.db")
+    if not os.path.exists(txt):
+        with open(txt, "w", encoding="utf-8") as f:
+            for i in range(rows):
+                f.write(f"t{i:021d}\n")
+    if not os.path.exists(db):
+        from spotibot.seen import SeenStore
+        with SeenStore(db, migrate=False) as store:
+            store.add_many((f"t{i:021d}", f"p{i % 50}", "GENRE") for i in range(rows))
+    return txt, db
+
+
+def run_mode(mode, directory, rows):
+    txt, db = fixture(directory, rows)
+    candidates = [f"t{i:021d}" for i in range(rows - BATCH // 2, rows + BATCH // 2)]
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    if mode == "txt":
+        with open(txt, "r", encoding="utf-8") as f:
+            seen = set(line.strip() for line in f if line.strip())
+        t_load = time.perf_counter() - t0
+        new = [c for c in candidates if c not in seen]
+        with open(txt + ".new", "a", encoding="utf-8") as f:
+            for tid in new:
+                f.write(f"{tid}\n")
+    else:
+        from spotibot.seen import SeenStore
+        store = SeenStore(db, migrate=False)
+        t_load = time.perf_counter() - t0
+        known = store.known(candidates)
+        new = [c for c in candidates if c not in known]
+        store.add_many((tid, "bench", "GENRE") for tid in new)
+        store.close()
+    print(json.dumps({
+        "mode": mode,
+        "load_s": round(t_load, 4),
+        "total_s": round(time.perf_counter() - t0, 4),
+        "new": len(new),
+        "rss_growth_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--dir")
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.dir, args.rows)
+        return
+
+    directory = args.dir or tempfile.mkdtemp(prefix="bench_seen_")
+    fixture(directory, args.rows)
+    print(f"{'modo':>7} {'carga':>8} {'total':>8} {'nuevas':>7} {'RSS +KB':>9}")
+    for mode in ("txt", "sqlite"):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_seen", "--rows", str(args.rows), "--dir", directory, "--mode", mode],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(out)
+        print(f"{r['mode']:>7} {r['load_s']:>7.3f}s {r['total_s']:>7.3f}s {r['new']:>7} {r['rss_growth_kb']:>9,}")
+
+
+if __name__ == "__main__":
+    main()
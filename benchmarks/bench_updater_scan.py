@@ -0,0 +1,58 @@
+"""Llamadas a la API que ahorra el escaneo desde la cola en el actualizador.
+
+Lee las fuentes de playlists.txt. Sin --live se simulan con tamaños
+aleatorios (una de cada cinco desordenada, para ver el fallback); con
+--live se usa la cuenta autenticada de cli_spotibot.py.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_updater_scan --days 7
+    python -m benchmarks.bench_updater_scan --days 7 --live
+"""
+import argparse
+import datetime
+import random
+
+from benchmarks.fake_spotify import FakeSpotify, make_playlist
+from spotibot.sources import load_plan
+from spotibot.updater import scan_recent_items
+
+
+def fake_client(pids, seed):
+    rnd = random.Random(seed)
+    playlists = {}
+    for n, pid in enumerate(pids):
+        items = make_playlist(rnd.randint(150, 8000), start=n * 10000, step=datetime.timedelta(hours=rnd.choice([1, 3, 12])))
+        if n % 5 == 4:
+            rnd.shuffle(items)
+        playlists[pid] = items
+    return FakeSpotify(playlists)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--config", default="playlists.txt")
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    pids = list(load_plan(args.config, cache_dir=None).sources)
+    if args.live:
+        from cli_spotibot import sp
+    else:
+        sp = fake_client(pids, args.seed)
+
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=args.days)
+    total_calls = total_full = 0
+    print(f"{'playlist':<24} {'modo':>5} {'nuevas':>7} {'llamadas':>9} {'completo':>9} {'ahorro':>7}")
+    for pid in pids:
+        recent, stats = scan_recent_items(sp, pid, cutoff)
+        total_calls += stats["calls"]
+        total_full += stats["full_calls"]
+        print(f"{pid:<24} {stats['mode']:>5} {len(recent):>7} {stats['calls']:>9} {stats['full_calls']:>9} "
+              f"{stats['full_calls'] - stats['calls']:>7}")
+    print(f"{'TOTAL':<24} {'':>5} {'':>7} {total_calls:>9} {total_full:>9} {total_full - total_calls:>7}")
+
+
+if __name__ == "__main__":
+    main()
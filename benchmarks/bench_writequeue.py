@@ -0,0 +1,81 @@
+"""Dos actualizaciones a la vez sobre las mismas playlists, con y sin cola.
+
+Simula el caso del bot: la actualización programada y un /updater manual
+arrancan juntas con el mismo historial. Sin cola cada una escribe sus
+propios lotes (el último a medias) y las dos añaden las mismas canciones;
+con WriteQueue los lotes se juntan y las repetidas se descartan.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.bench_writequeue --genres 6 --new 130
+"""
+import argparse
+import datetime
+import os
+import tempfile
+import threading
+
+from benchmarks.fake_spotify import FakeSpotify, make_playlist
+from spotibot.journal import WriteJournal
+from spotibot.updater import run_updater
+from spotibot.writequeue import WriteQueue
+
+
+def run(genres, new, use_queue, latency):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    playlists, source_map = {}, {}
+    for g in range(genres):
+        pid = f"src{g}".ljust(22, "0")
+        playlists[pid] = make_playlist(new, start=g * 10000, newest=now, step=datetime.timedelta(minutes=1))
+        source_map[f"GENRE {g}"] = [pid]
+    sp = FakeSpotify(playlists, latency=latency, user_id="me")
+    cutoff = now - datetime.timedelta(days=1)
+    journal = WriteJournal("journal.jsonl")
+    queue = None
+    if use_queue:
+        queue = WriteQueue(sp, journal=journal, seen_path="seen.db", max_delay=0.5,
+                           present=lambda pid: [i["track"]["uri"] for i in sp.playlists[pid]])
+
+    # Los destinos ya existen (si no, cada ejecución crearía los suyos)
+    for name in source_map:
+        sp.user_playlist_create("me", f"{name} {now.year}")
+    sp.calls, sp.calls_by_method = 0, {}
+
+    def job():
+        run_updater(sp, "me", source_map, cutoff, log=lambda msg: None, seen_path="seen.db",
+                    migrate_seen=False, journal=journal, queue=queue)
+
+    threads = [threading.Thread(target=job) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if queue:
+        queue.close()
+
+    dests = [pid for pid, owner in sp.owners.items() if owner == "me"]
+    total = sum(len(sp.playlists[pid]) for pid in dests)
+    unique = sum(len({i["track"]["uri"] for i in sp.playlists[pid]}) for pid in dests)
+    return sp.calls_by_method.get("playlist_add_items", 0), total, unique
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--genres", type=int, default=6)
+    parser.add_argument("--new", type=int, default=130, help="canciones nuevas por género")
+    parser.add_argument("--latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    print(f"{'modo':>10} {'playlist_add_items':>19} {'canciones':>10} {'repetidas':>10}")
+    for use_queue in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                adds, total, unique = run(args.genres, args.new, use_queue, args.latency)
+            finally:
+                os.chdir(cwd)
+        print(f"{'cola' if use_queue else 'sin cola':>10} {adds:>19} {total:>10} {total - unique:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Comprueba el circuito de portadas del actualizador.
+
+- Una portada que ya cabe se sube tal cual y se codifica una sola vez
+  (la segunda vez sale de la caché; si cambia el fichero, se rehace).
+- Una portada de más de 256 KB en base64 se reduce con Pillow hasta caber,
+  o, sin Pillow, se avisa y no se intenta subir.
+- Crear las playlists no espera a las subidas (API falsa con la subida lenta).
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.check_covers
+"""
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_spotify import FakeSpotify, make_playlist
+from spotibot.covers import COVER_MAX_BYTES, CoverError, CoverStore, CoverUploader, encoded_size
+from spotibot.updater import run_updater
+
+# Cabecera JPEG mínima: basta para la comprobación, Spotify no la ve
+SMALL_JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 20 * 1024
+BIG_JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 400 * 1024
+
+
+class SlowCovers(FakeSpotify):
+    def __init__(self, *args, upload_seconds=0.5, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_seconds = upload_seconds
+        self.uploaded = {}
+
+    def playlist_upload_cover_image(self, playlist_id, image_b64):
+        time.sleep(self.upload_seconds)
+        assert len(image_b64) <= COVER_MAX_BYTES
+        self.uploaded[playlist_id] = len(image_b64)
+        return super().playlist_upload_cover_image(playlist_id, image_b64)
+
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def check_cache():
+    write("rock.jpg", SMALL_JPEG)
+    store = CoverStore(cache_dir="cache")
+    first = store.payload("rock.jpg")
+    # Otro proceso: la encuentra ya codificada en disco
+    again = CoverStore(cache_dir="cache")
+    cached = again._disk.get(again._key("rock.jpg")) == first
+    # Si cambia el fichero cambia la clave
+    write("rock.jpg", SMALL_JPEG + b"\x00")
+    changed = again.payload("rock.jpg") != first
+    return cached and changed
+
+
+def make_big_image():
+    from PIL import Image
+    img = Image.effect_noise((1500, 1500), 100).convert("RGB")
+    img.save("big.jpg", "JPEG", quality=100)
+    return os.path.getsize("big.jpg")
+
+
+def check_big():
+    try:
+        original = make_big_image()
+    except ImportError:
+        write("big.jpg", BIG_JPEG)
+        try:
+            CoverStore(cache_dir=None).payload("big.jpg")
+        except CoverError as e:
+            print(f"   (sin Pillow) {e}")
+            return True
+        return False
+    payload = CoverStore(cache_dir=None).payload("big.jpg")
+    print(f"   {encoded_size(original) // 1024} KB -> {len(payload) // 1024} KB en base64")
+    return len(payload) <= COVER_MAX_BYTES
+
+
+def check_background(genres=4, upload_seconds=0.5):
+    os.makedirs("images")
+    now = datetime.datetime.now(datetime.timezone.utc)
+    playlists, source_map = {}, {}
+    for g in range(genres):
+        pid = f"src{g}".ljust(22, "0")
+        playlists[pid] = make_playlist(20, start=g * 1000, newest=now, step=datetime.timedelta(minutes=1))
+        source_map[f"GENRE {g}"] = [pid]
+        write(f"images/genre_{g}.jpg", SMALL_JPEG)
+    sp = SlowCovers(playlists, user_id="me", upload_seconds=upload_seconds)
+    covers = CoverUploader(CoverStore(cache_dir="cache"))
+    t0 = time.perf_counter()
+    run_updater(sp, "me", source_map, now - datetime.timedelta(days=1), log=lambda msg: None,
+                seen_path="seen.db", migrate_seen=False, covers=covers)
+    elapsed = time.perf_counter() - t0
+    covers.close()
+    total = time.perf_counter() - t0
+    print(f"   actualizador {elapsed:.2f}s, con las {len(sp.uploaded)} portadas subidas {total:.2f}s")
+    return elapsed < upload_seconds and len(sp.uploaded) == genres
+
+
+def main():
+    ok = True
+    checks = (("caché por ruta+mtime", check_cache), ("portada de más de 256 KB", check_big),
+              ("subidas en segundo plano", check_background))
+    for name, check in checks:
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            try:
+                passed = check()
+            finally:
+                os.chdir(cwd)
+        print(f"{'✅' if passed else '❌'} {name}")
+        ok = ok and passed
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
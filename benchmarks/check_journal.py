@@ -0,0 +1,146 @@
+"""Comprueba que las escrituras cortadas a medias se reanudan bien.
+
+Simula que el proceso muere en mitad de un mixer, de un /sort y del
+actualizador (antes y después de que Spotify aplique el lote en curso),
+"reinicia" abriendo de nuevo el diario y comprueba que las playlists
+quedan exactamente como debían, sin lotes repetidos ni perdidos, y que las
+canciones del actualizador solo quedan como vistas tras escribirse.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.check_journal
+"""
+import datetime
+import os
+import sys
+import tempfile
+
+from benchmarks.fake_spotify import FakeSpotify, make_playlist
+from spotibot.journal import WriteJournal, batches, resume_pending, write_steps
+from spotibot.rewrite import rewrite_playlist
+from spotibot.seen import SeenStore
+from spotibot.updater import run_updater
+
+PID = "crashA".ljust(22, "0")
+
+
+class Crash(BaseException):
+    """Como un kill: no lo captura ningún 'except Exception'."""
+
+
+class CrashingSpotify(FakeSpotify):
+    """Muere en la escritura número 'crash_at'; con 'applied' después de aplicarla."""
+
+    def __init__(self, *args, crash_at=None, applied=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.crash_at = crash_at
+        self.applied = applied
+        self.writes = 0
+
+    def _write(self, method, *args, **kwargs):
+        self.writes += 1
+        crash = self.crash_at is not None and self.writes == self.crash_at
+        if crash and not self.applied:
+            raise Crash()
+        res = getattr(super(), method)(*args, **kwargs)
+        if crash:
+            raise Crash()
+        return res
+
+    def playlist_add_items(self, *args, **kwargs):
+        return self._write("playlist_add_items", *args, **kwargs)
+
+    def playlist_replace_items(self, *args, **kwargs):
+        return self._write("playlist_replace_items", *args, **kwargs)
+
+    def playlist_reorder_items(self, *args, **kwargs):
+        return self._write("playlist_reorder_items", *args, **kwargs)
+
+    def playlist_remove_specific_occurrences_of_items(self, *args, **kwargs):
+        return self._write("playlist_remove_specific_occurrences_of_items", *args, **kwargs)
+
+
+def uris(sp, pid):
+    return [item["track"]["uri"] for item in sp.playlists[pid]]
+
+
+def restart(sp, path):
+    """Otro proceso: diario recién abierto y sin crashes."""
+    sp.crash_at = None
+    return resume_pending(sp, WriteJournal(path), log=lambda msg: None)
+
+
+def check_mixer(applied):
+    sp = CrashingSpotify(user_id="me", crash_at=3, applied=applied)
+    target = [f"spotify:track:m{i:020d}" for i in range(450)]
+    pid = sp.user_playlist_create("me", "Mix")["id"]
+    journal = WriteJournal("journal.jsonl")
+    try:
+        write_steps(sp, pid, [("add", b) for b in batches(target)], journal=journal, target=target, label="mixer")
+    except Crash:
+        pass
+    resumed = restart(sp, "journal.jsonl")
+    return resumed == 1 and uris(sp, pid) == target
+
+
+def check_sort(applied, small=False):
+    sp = CrashingSpotify(crash_at=2, applied=applied)
+    sp.playlists[PID] = make_playlist(400)
+    current = uris(sp, PID)
+    if small:
+        # Pocos cambios: va por reorder/remove en vez de reemplazo
+        target = current[10:20] + current[:10] + current[20:390] + current[395:]
+    else:
+        target = current[::-1]
+    journal = WriteJournal("journal.jsonl")
+    try:
+        rewrite_playlist(sp, PID, current, target, journal=journal, label="sort")
+    except Crash:
+        pass
+    resumed = restart(sp, "journal.jsonl")
+    return resumed == 1 and uris(sp, PID) == target
+
+
+def check_updater(applied):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    source = make_playlist(350, newest=now, step=datetime.timedelta(minutes=1))
+    sp = CrashingSpotify({PID: source}, user_id="me", crash_at=3, applied=applied)
+    cutoff = now - datetime.timedelta(days=1)
+    quiet = dict(log=lambda msg: None, seen_path="seen.db", migrate_seen=False)
+    try:
+        run_updater(sp, "me", {"ROCK": [PID]}, cutoff, journal=WriteJournal("journal.jsonl"), **quiet)
+    except Crash:
+        pass
+    with SeenStore("seen.db", migrate=False) as seen:
+        seen_after_crash = len(seen)
+    # Siguiente ejecución: termina lo pendiente y no vuelve a añadir nada
+    sp.crash_at = None
+    result = run_updater(sp, "me", {"ROCK": [PID]}, cutoff, journal=WriteJournal("journal.jsonl"), **quiet)
+    dest = next(pid for pid, owner in sp.owners.items() if owner == "me")
+    with SeenStore("seen.db", migrate=False) as seen:
+        seen_total = len(seen)
+    expected = [item["track"]["uri"] for item in source]
+    return (seen_after_crash == 0 and seen_total == 350 and result["summary"] == [("ROCK", 0)]
+            and uris(sp, dest) == expected)
+
+
+def main():
+    ok = True
+    checks = (("mixer", check_mixer), ("sort (reemplazo)", check_sort),
+              ("sort (cambios mínimos)", lambda applied: check_sort(applied, small=True)), ("updater", check_updater))
+    for name, check in checks:
+        for applied in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                cwd = os.getcwd()
+                os.chdir(tmp)
+                try:
+                    passed = check(applied)
+                finally:
+                    os.chdir(cwd)
+            when = "después de aplicar el lote" if applied else "antes de aplicar el lote"
+            print(f"{'✅' if passed else '❌'} {name}: caída {when}")
+            ok = ok and passed
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
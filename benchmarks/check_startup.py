@@ -0,0 +1,70 @@
+"""Presupuesto de arranque de cli_spotibot.py.
+
+Importa el módulo en un proceso nuevo con 'python -X importtime' y falla
+(código de salida 1) si tarda más que el presupuesto o si se ha colado en
+el arranque alguno de los módulos pesados que deben cargarse al usarse.
+Importar el módulo tampoco debe ir a la red ni pedir autenticación.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.check_startup --budget-ms 100
+"""
+import argparse
+import subprocess
+import sys
+
+# Solo se importan con la primera llamada a Spotify
+FORBIDDEN = ("spotipy", "requests")
+
+
+def import_times(module):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, stdin=subprocess.DEVNULL,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"Fallo importando {module}:\n{proc.stderr}")
+    # Formato: "import time: self [us] | cumulative | imported package"
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times, proc.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="cli_spotibot")
+    parser.add_argument("--budget-ms", type=float, default=100)
+    parser.add_argument("--runs", type=int, default=3, help="se toma la mejor de N ejecuciones")
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.runs):
+        times, stdout = import_times(args.module)
+        total = times[args.module] / 1000
+        best = total if best is None else min(best, total)
+
+    errors = []
+    loaded = sorted({name.split(".")[0] for name in times} & set(FORBIDDEN))
+    if loaded:
+        errors.append(f"módulos pesados cargados al arrancar: {', '.join(loaded)}")
+    if stdout.strip():
+        errors.append(f"el import escribe por pantalla (¿conecta con Spotify?): {stdout.strip()[:80]}")
+    if best > args.budget_ms:
+        errors.append(f"arranque {best:.1f} ms > presupuesto {args.budget_ms:.0f} ms")
+
+    slowest = sorted(((n, t) for n, t in times.items() if n != args.module), key=lambda kv: kv[1], reverse=True)[:5]
+    print(f"import {args.module}: {best:.1f} ms (presupuesto {args.budget_ms:.0f} ms)")
+    for name, us in slowest:
+        print(f"   {us / 1000:7.1f} ms  {name}")
+    if errors:
+        for e in errors:
+            print(f"❌ {e}")
+        sys.exit(1)
+    print("✅ OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""API de Spotify falsa en memoria para medir sin cuenta real.
+
+Imita los métodos de spotipy.Spotify que usan los scripts: paginación,
+proyecciones 'fields=', snapshot_id que cambia con cada escritura, una
+latencia configurable por llamada y, opcionalmente, un límite de
+peticiones por segundo que responde 429 con Retry-After. Cuenta llamadas
+(en total y por método) y bytes de las respuestas.
+
+Los datos pueden ser sintéticos (make_playlist) o un fichero de fixtures
+(save_fixture / FakeSpotify.from_fixture), p.ej. grabado de una cuenta real.
+"""
+import datetime
+import json
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+MARKETS = ["AR", "AU", "BR", "CA", "CL", "CO", "DE", "ES", "FR", "GB", "IT", "JP", "MX", "NL", "SE", "US"]
+
+
+def make_track(i, added_at=None):
+    """Track sintético con la misma forma (y peso) que uno real."""
+    tid = f"t{i:021d}"
+    album_id = f"a{i // 12:021d}"
+    artist_id = f"r{i % 997:021d}"
+    track = {
+        "id": tid,
+        "uri": f"spotify:track:{tid}",
+        "name": f"Track {i}",
+        "popularity": (i * 37) % 101,
+        "duration_ms": 180000 + (i % 60) * 1000,
+        "explicit": False,
+        "track_number": i % 12 + 1,
+        "disc_number": 1,
+        "is_local": False,
+        "type": "track",
+        "href": f"https://api.spotify.com/v1/tracks/{tid}",
+        "external_ids": {"isrc": f"ES{i:010d}"},
+        "external_urls": {"spotify": f"https://open.spotify.com/track/{tid}"},
+        "available_markets": MARKETS,
+        "artists": [{
+            "id": artist_id,
+            "name": f"Artist {i % 997}",
+            "type": "artist",
+            "uri": f"spotify:artist:{artist_id}",
+            "href": f"https://api.spotify.com/v1/artists/{artist_id}",
+            "external_urls": {"spotify": f"https://open.spotify.com/artist/{artist_id}"},
+        }],
+        "album": {
+            "id": album_id,
+            "name": f"Album {i // 12}",
+            "album_type": "album",
+            "release_date": "2024-01-01",
+            "total_tracks": 12,
+            "uri": f"spotify:album:{album_id}",
+            "available_markets": MARKETS,
+            "images": [
+                {"url": f"https://i.scdn.co/image/{album_id}{size}", "height": size, "width": size}
+                for size in (640, 300, 64)
+            ],
+        },
+    }
+    return {
+        "added_at": added_at or "2024-01-01T00:00:00Z",
+        "added_by": {"id": "curator", "type": "user"},
+        "is_local": False,
+        "track": track,
+    }
+
+
+def make_playlist(size, start=0, newest=None, step=datetime.timedelta(hours=1)):
+    """Items de una playlist; el último añadido en 'newest' y el resto hacia atrás."""
+    newest = newest or datetime.datetime.now(datetime.timezone.utc)
+    items = []
+    for i in range(size):
+        added = newest - step * (size - 1 - i)
+        items.append(make_track(start + i, added.strftime("%Y-%m-%dT%H:%M:%SZ")))
+    return items
+
+
+def parse_fields(fields):
+    """Convierte 'total,items(track(id,uri)),tracks.total' en un dict anidado."""
+    spec, stack, name = {}, [], ""
+    current = spec
+
+    def close_dots():
+        nonlocal current
+        while stack and stack[-1][1]:
+            current = stack.pop()[0]
+
+    for ch in fields:
+        if ch in ",)":
+            if name:
+                current[name] = None
+            name = ""
+            close_dots()
+            if ch == ")":
+                current = stack.pop()[0]
+        elif ch in "(.":
+            child = current.get(name) or {}
+            current[name] = child
+            stack.append((current, ch == "."))
+            current, name = child, ""
+        else:
+            name += ch.strip()
+    if name:
+        current[name] = None
+    return spec
+
+
+def project(obj, spec):
+    """Aplica una proyección 'fields=' como lo hace la Web API."""
+    if spec is None:
+        return obj
+    if isinstance(obj, list):
+        return [project(o, spec) for o in obj]
+    if not isinstance(obj, dict):
+        return obj
+    return {k: project(obj[k], sub) for k, sub in spec.items() if k in obj}
+
+
+class FakeHTTPError(Exception):
+    """Lo mismo que lee spotibot.ratelimit de una SpotifyException."""
+
+    def __init__(self, http_status, msg, headers=None):
+        super().__init__(f"http status: {http_status}, {msg}")
+        self.http_status = http_status
+        self.msg = msg
+        self.headers = headers or {}
+
+
+class FakeSpotify:
+    def __init__(self, playlists=None, latency=0.0, user_id="fake_user", rate_limit=None, retry_after=1):
+        self.playlists = playlists or {}
+        self.latency = latency
+        self.user_id = user_id
+        # Peticiones por segundo aceptadas; el resto recibe 429
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.calls = 0
+        self.calls_by_method = {}
+        self.throttled = 0
+        self.bytes_sent = 0
+        self.names = {}
+        self.owners = {}
+        self.versions = {}
+        self._window = (0, 0)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_fixture(cls, path, **kwargs):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        sp = cls(data["playlists"], user_id=data.get("user_id", "fake_user"), **kwargs)
+        sp.names.update(data.get("names", {}))
+        sp.owners.update(data.get("owners", {}))
+        return sp
+
+    def save_fixture(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"user_id": self.user_id, "playlists": self.playlists,
+                       "names": self.names, "owners": self.owners}, f)
+
+    def _hit(self, method):
+        with self._lock:
+            self.calls += 1
+            self.calls_by_method[method] = self.calls_by_method.get(method, 0) + 1
+            if self.rate_limit:
+                second, count = self._window
+                now = int(time.monotonic())
+                count = count + 1 if now == second else 1
+                self._window = (now, count)
+                if count > self.rate_limit:
+                    self.throttled += 1
+                    raise FakeHTTPError(429, "API rate limit exceeded", {"Retry-After": str(self.retry_after)})
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _send(self, payload, fields=None):
+        """Serializa la respuesta como haría el servidor y cuenta los bytes."""
+        if fields:
+            payload = project(payload, parse_fields(fields))
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        with self._lock:
+            self.bytes_sent += len(body)
+        return json.loads(body)
+
+    @staticmethod
+    def _pid(playlist_id):
+        if "playlist/" in playlist_id:
+            return playlist_id.split("playlist/")[1].split("?")[0]
+        return playlist_id
+
+    def playlist_items(self, playlist_id, fields=None, limit=50, offset=0, market=None, additional_types=("track", "episode")):
+        self._hit("playlist_items")
+        pid = self._pid(playlist_id)
+        items = self.playlists[pid]
+        page = items[offset:offset + limit]
+        nxt = offset + limit
+        return self._send({
+            "href": f"fake://{pid}?offset={offset}&limit={limit}",
+            "items": page,
+            "limit": limit,
+            "offset": offset,
+            "total": len(items),
+            "next": f"fake://{pid}?offset={nxt}&limit={limit}" if nxt < len(items) else None,
+        }, fields)
+
+    def next(self, result):
+        if not result["next"]:
+            return None
+        url = urlparse(result["next"])
+        qs = parse_qs(url.query)
+        return self.playlist_items(url.netloc, limit=int(qs["limit"][0]), offset=int(qs["offset"][0]))
+
+    # --- Playlists del usuario y escrituras ---
+    def _bump(self, pid):
+        with self._lock:
+            self.versions[pid] = self.versions.get(pid, 0) + 1
+        return {"snapshot_id": self.snapshot_id(pid)}
+
+    def snapshot_id(self, pid):
+        return f"{pid}-v{self.versions.get(pid, 0)}"
+
+    def current_user(self):
+        self._hit("current_user")
+        return {"id": self.user_id, "display_name": self.user_id}
+
+    def playlist(self, playlist_id, fields=None, market=None, additional_types=("track",)):
+        self._hit("playlist")
+        pid = self._pid(playlist_id)
+        return self._send({
+            "id": pid,
+            "name": self.names.get(pid, pid),
+            "owner": {"id": self.owners.get(pid, "curator")},
+            "snapshot_id": self.snapshot_id(pid),
+            "tracks": {"total": len(self.playlists[pid])},
+        }, fields)
+
+    def current_user_playlists(self, limit=50, offset=0):
+        self._hit("current_user_playlists")
+        own = [pid for pid, owner in self.owners.items() if owner == self.user_id]
+        page = own[offset:offset + limit]
+        return self._send({
+            "items": [{"id": pid, "name": self.names[pid], "owner": {"id": self.user_id}} for pid in page],
+            "limit": limit,
+            "offset": offset,
+            "total": len(own),
+            "next": "fake://me" if offset + limit < len(own) else None,
+        })
+
+    def user_playlist_create(self, user, name, public=True, collaborative=False, description=""):
+        self._hit("user_playlist_create")
+        with self._lock:
+            pid = f"new{len(self.names):019d}"
+            self.playlists[pid] = []
+            self.names[pid] = name
+            self.owners[pid] = user
+        return {"id": pid, "name": name, "external_urls": {"spotify": f"https://open.spotify.com/playlist/{pid}"}}
+
+    def _items_for(self, uris):
+        return [{"added_at": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                 "track": {"id": u.split(":")[-1], "uri": u, "name": u, "popularity": 0, "artists": [{"name": "?"}]}}
+                for u in uris]
+
+    def playlist_add_items(self, playlist_id, items, position=None):
+        self._hit("playlist_add_items")
+        assert len(items) <= 100
+        pid = self._pid(playlist_id)
+        new = self._items_for(items)
+        with self._lock:
+            if position is None:
+                self.playlists[pid].extend(new)
+            else:
+                self.playlists[pid][position:position] = new
+        return self._bump(pid)
+
+    def playlist_replace_items(self, playlist_id, items):
+        self._hit("playlist_replace_items")
+        assert len(items) <= 100
+        pid = self._pid(playlist_id)
+        with self._lock:
+            self.playlists[pid] = self._items_for(items)
+        return self._bump(pid)
+
+    def playlist_reorder_items(self, playlist_id, range_start, insert_before, range_length=1, snapshot_id=None):
+        self._hit("playlist_reorder_items")
+        pid = self._pid(playlist_id)
+        with self._lock:
+            items = self.playlists[pid]
+            block = items[range_start:range_start + range_length]
+            del items[range_start:range_start + range_length]
+            at = insert_before - range_length if insert_before > range_start else insert_before
+            items[at:at] = block
+        return self._bump(pid)
+
+    def playlist_remove_specific_occurrences_of_items(self, playlist_id, items, snapshot_id=None):
+        self._hit("playlist_remove_specific_occurrences_of_items")
+        assert len(items) <= 100
+        pid = self._pid(playlist_id)
+        positions = sorted((p for it in items for p in it["positions"]), reverse=True)
+        with self._lock:
+            for p in positions:
+                del self.playlists[pid][p]
+        return self._bump(pid)
+
+    def playlist_upload_cover_image(self, playlist_id, image_b64):
+        self._hit("playlist_upload_cover_image")
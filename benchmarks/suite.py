@@ -0,0 +1,171 @@
+"""Suite de benchmarks de punta a punta contra la API falsa.
+
+Ejecuta las cinco funcionalidades de la CLI (rank, mixer, updater, sort y
+top) con varios tamaños de playlist y guarda en JSON, por cada caso, el
+tiempo, las llamadas a la API (total y por método), los bytes de las
+respuestas, los 429 recibidos y el pico de memoria (tracemalloc). Con
+--compare se muestran las diferencias frente a una ejecución anterior.
+
+Cada caso corre en un directorio temporal propio (cachés, seen_tracks.db,
+playlists.txt) y con una API falsa nueva, así que no hay estado cruzado.
+
+Uso (desde la raíz del repo):
+    python -m benchmarks.suite --sizes 1000,5000 --out bench.json
+    python -m benchmarks.suite --sizes 1000,5000 --latency 0.02 --rate-limit 50 --compare bench.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cli_spotibot as cli
+from benchmarks.fake_spotify import FakeSpotify, make_playlist
+from spotibot.ratelimit import RateLimitedSpotify
+
+FEATURES = ("rank", "mixer", "updater", "sort", "top")
+USER = "bench_user"
+# Ids con la misma forma que los reales (22 caracteres)
+PID_A = "benchA".ljust(22, "0")
+PID_B = "benchB".ljust(22, "0")
+
+
+def build_fake(feature, size, args):
+    """API falsa con las playlists que necesita cada funcionalidad."""
+    kwargs = dict(latency=args.latency, user_id=USER, rate_limit=args.rate_limit, retry_after=args.retry_after)
+    if args.fixture:
+        sp = FakeSpotify.from_fixture(args.fixture, **kwargs)
+        sp.user_id = USER
+        first = next(iter(sp.playlists))
+        sp.playlists.setdefault(PID_A, sp.playlists[first])
+        sp.playlists.setdefault(PID_B, sp.playlists[first])
+    else:
+        sp = FakeSpotify({PID_A: make_playlist(size), PID_B: make_playlist(size, start=size // 2)}, **kwargs)
+    if feature in ("sort", "top"):
+        sp.owners[PID_A] = USER
+    return sp
+
+
+def run_feature(feature, size):
+    if feature == "rank":
+        return len(list(cli.rank_tracks(PID_A, 10)))
+    if feature == "mixer":
+        return cli.create_mix([PID_A, PID_B], "mix", "Bench")["tracks"]
+    if feature == "updater":
+        with open("playlists.txt", "w", encoding="utf-8") as f:
+            f.write(f"https://open.spotify.com/playlist/{PID_A} ROCK\nhttps://open.spotify.com/playlist/{PID_B} POP\n")
+        return sum(cli.update_playlists(days=7)["added"].values())
+    if feature == "sort":
+        return cli.sort_by_popularity(PID_A)["calls"]
+    if feature == "top":
+        return cli.keep_top(PID_A, max(1, size // 2))["calls"]
+    raise ValueError(feature)
+
+
+def run_case(feature, size, args):
+    fake = build_fake(feature, size, args)
+    client = RateLimitedSpotify(fake, rate=args.client_rps, burst=args.client_rps, max_concurrency=16)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        cli._sp, cli._profile, cli._playlist_cache, cli._journal = client, None, None, None
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                output = run_feature(feature, size)
+            error = None
+        except Exception as e:
+            output, error = None, f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if cli._journal:
+            cli._journal.close()
+        os.chdir(cwd)
+    cli._sp, cli._profile, cli._playlist_cache, cli._journal = None, None, None, None
+    return {
+        "feature": feature,
+        "size": size,
+        "seconds": round(elapsed, 4),
+        "calls": fake.calls,
+        "calls_by_method": fake.calls_by_method,
+        "bytes": fake.bytes_sent,
+        "throttled": fake.throttled,
+        "peak_mb": round(peak / 1e6, 2),
+        "output": output,
+        "error": error,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(results, previous_path):
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = {(r["feature"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"\nComparación con {previous_path}:")
+    print(f"{'caso':>14} {'tiempo':>16} {'llamadas':>14} {'bytes':>22}")
+    for r in results:
+        old = previous.get((r["feature"], r["size"]))
+        if not old:
+            continue
+        case = f"{r['feature']}/{r['size']}"
+        print(f"{case:>14} {old['seconds']:>7.2f}→{r['seconds']:<7.2f}s "
+              f"{old['calls']:>6}→{r['calls']:<6} {old['bytes']:>10,}→{r['bytes']:<10,}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="500,2000,5000")
+    parser.add_argument("--features", default=",".join(FEATURES))
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos por llamada a la API falsa")
+    parser.add_argument("--rate-limit", type=int, default=None, help="peticiones/s antes de responder 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--client-rps", type=float, default=1000, help="ritmo del RateLimitedSpotify")
+    parser.add_argument("--fixture", help="JSON de FakeSpotify.save_fixture en vez de datos sintéticos")
+    parser.add_argument("--out", help="fichero JSON de resultados")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'funcionalidad':>13} {'tamaño':>7} {'tiempo':>8} {'llamadas':>9} {'bytes':>12} {'429':>5} {'pico MB':>8}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        for feature in args.features.split(","):
+            r = run_case(feature, size, args)
+            results.append(r)
+            line = (f"{feature:>13} {size:>7} {r['seconds']:>7.2f}s {r['calls']:>9} {r['bytes']:>12,} "
+                    f"{r['throttled']:>5} {r['peak_mb']:>8.1f}")
+            print(line + (f"  ❌ {r['error']}" if r["error"] else ""))
+
+    report = {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "params": vars(args),
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResultados en {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+    if any(r["error"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
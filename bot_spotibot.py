@@ -2,12 +2,12 @@ import logging
 import re
 import os
 import sys
-import base64
 import datetime
 import asyncio
-import pandas as pd
+import threading
+import csv
+import io
 from datetime import timedelta
-import nest_asyncio
 
 # Telegram Imports
 from telegram import Update
@@ -21,9 +21,27 @@ from telegram.ext import (
 )
 
 # Spotify Imports
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth, SpotifyClientCredentials
+from spotipy.oauth2 import SpotifyClientCredentials
 from spotipy.exceptions import SpotifyException
+from spotibot.auth import TOKEN_CACHE_PATH, make_auth_manager
+from spotibot.cache import PlaylistCache
+from spotibot.chat import Attachment, ThrottledEditor, split_message
+from spotibot.covers import CoverUploader, check_covers
+from spotibot.fetch import fetch_playlist_tracks
+from spotibot.jobs import JobManager, QueueFull
+from spotibot.journal import JOURNAL_PATH, WriteJournal, batches, resume_pending, write_steps
+from spotibot.metrics import METRICS
+from spotibot.mixer import STRATEGIES, STRATEGY_LABELS, mix
+from spotibot.records import URI_FIELDS
+from spotibot.ranking import rank_playlist
+from spotibot.ratelimit import TokenBucket, make_client
+from spotibot.rewrite import rewrite_playlist
+from spotibot.scheduler import SCHEDULER_STATE_PATH, UpdaterScheduler
+from spotibot.seen import SEEN_DB_PATH
+from spotibot.sources import SOURCES_PATH, SourcesError, load_plan
+from spotibot.tenants import TENANT_DIR, NotLinked, TenantPool, tenant_dir
+from spotibot.updater import run_updater
+from spotibot.writequeue import WriteQueue
 
 # --- CONFIGURACIÓN DE DESARROLLO (NO BORRAR) ---
 TELEGRAM_TOKEN = "PEGA AQUI TU TOKEN DE BOT DE TELEGRAM"
@@ -35,10 +53,63 @@ SPOTIPY_REDIRECT_URI = "http://127.0.0.1:8888/callback"
 
 # IDs de Telegram autorizados
 AUTHORIZED_USER_IDS = {942135888, 123456789}
+# IDs que además pueden ver /stats
+ADMIN_USER_IDS = {942135888}
+# Usuario de Telegram que usa la cuenta autenticada por consola al arrancar
+# (token_cache.json) y la de las actualizaciones programadas. El resto
+# vincula su propia cuenta de Spotify con /link
+OWNER_USER_ID = 942135888
+
+# Puerto local para exponer las métricas en formato Prometheus
+# (http://127.0.0.1:PUERTO/metrics); None para desactivarlo
+METRICS_PORT = None
+
+# Trabajos de Spotify que pueden ejecutarse a la vez (entre todos los usuarios)
+JOB_WORKERS = 4
+# Trabajos que cada usuario puede tener esperando en su cola
+JOB_MAX_PENDING = 5
+
+# Actualizador automático: None para desactivarlo, un intervalo ("12h", "1d")
+# o una expresión cron en hora local ("0 6 * * *" = todos los días a las 6:00)
+UPDATER_SCHEDULE = None
+# Segundos de retraso aleatorio máximo antes de cada ejecución programada
+UPDATER_SCHEDULE_JITTER = 300
 
 # Scope permisos completos
 SCOPE = "playlist-read-private playlist-modify-private ugc-image-upload playlist-modify-public user-library-read"
 
+# Páginas de 100 canciones que se descargan a la vez al leer una playlist
+FETCH_WORKERS = 8
+
+# Caché local de playlists (se invalida sola cuando cambia el snapshot_id)
+PLAYLIST_CACHE_DIR = "cache/playlists"
+PLAYLIST_CACHE_MAX_MB = 200
+
+# Ritmo máximo de peticiones a la API (compartido por todos los hilos).
+# Con cada 429 se respeta el Retry-After y se baja la concurrencia
+API_MAX_RPS = 25
+API_MAX_CONCURRENCY = 16
+# Lo mismo para cada usuario (API_MAX_RPS es el total de la aplicación)
+TENANT_MAX_RPS = 10
+TENANT_MAX_CONCURRENCY = 8
+# Clientes de Spotify en memoria y minutos sin uso antes de descartarlos
+TENANT_MAX_CLIENTS = 20
+TENANT_IDLE_MINUTES = 60
+
+# Segundos que espera un lote a medias de la cola de escrituras por si otro
+# trabajo añade canciones a la misma playlist
+WRITE_QUEUE_DELAY = 2
+
+# Caché HTTP de lecturas de playlists (If-None-Match: si no han cambiado,
+# Spotify responde 304 sin cuerpo y se usa la copia local)
+HTTP_CACHE_DIR = "cache/http"
+HTTP_CACHE_MAX_MB = 100
+
+# /rank: segundos mínimos entre ediciones del mensaje de progreso y
+# líneas a partir de las cuales el ranking se envía como CSV adjunto
+RANK_EDIT_INTERVAL = 2
+RANK_MAX_LINES = 100
+
 # --- LOGGING ---
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -56,31 +127,65 @@ logger = logging.getLogger(__name__)
     CREATOR_DAYS,       # Bot 3: Updater
     SORT_URL,           # Bot 4: Ordenar (Sort)
     TOP_URL,            # Bot 5: Top Filter (URL)
-    TOP_NUMBER          # Bot 5: Top Filter (Número)
-) = range(9)
+    TOP_NUMBER,         # Bot 5: Top Filter (Número)
+    LINK_URL            # Vincular cuenta de Spotify
+) = range(10)
 
 # --- GESTIÓN DE AUTENTICACIÓN SPOTIFY ---
-sp_global = None
-sp_user_id_global = None
+# Límite de peticiones de la aplicación, compartido por los clientes de todos los usuarios
+api_bucket = TokenBucket(API_MAX_RPS, API_MAX_RPS * 2)
+
+def tenant_token_path(telegram_id):
+    if telegram_id == OWNER_USER_ID:
+        return TOKEN_CACHE_PATH
+    return os.path.join(tenant_dir(telegram_id, TENANT_DIR), "token.json")
+
+def tenant_seen_path(telegram_id):
+    if telegram_id == OWNER_USER_ID:
+        return SEEN_DB_PATH
+    return os.path.join(tenant_dir(telegram_id, TENANT_DIR), "seen_tracks.db")
+
+def tenant_journal_path(telegram_id):
+    if telegram_id == OWNER_USER_ID:
+        return JOURNAL_PATH
+    return os.path.join(tenant_dir(telegram_id, TENANT_DIR), "write_journal.jsonl")
+
+# Un WriteJournal por usuario (sobreviven a que se descarte su cliente)
+journals = {}
+journals_lock = threading.Lock()
+
+def tenant_journal(telegram_id):
+    with journals_lock:
+        if telegram_id not in journals:
+            journals[telegram_id] = WriteJournal(tenant_journal_path(telegram_id))
+        return journals[telegram_id]
+
+def tenant_auth_manager(telegram_id):
+    return make_auth_manager(SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, SPOTIPY_REDIRECT_URI,
+                             SCOPE, token_path=tenant_token_path(telegram_id))
+
+def make_tenant_client(telegram_id, auth_manager=None):
+    """Cliente de Spotify del usuario, o None si no ha vinculado su cuenta."""
+    if auth_manager is None:
+        if not os.path.exists(tenant_token_path(telegram_id)):
+            return None
+        auth_manager = tenant_auth_manager(telegram_id)
+    return make_client(auth_manager, rate=TENANT_MAX_RPS, max_concurrency=TENANT_MAX_CONCURRENCY,
+                       shared_bucket=api_bucket, http_cache_dir=os.path.join(HTTP_CACHE_DIR, str(telegram_id)),
+                       http_cache_max_bytes=HTTP_CACHE_MAX_MB * 1024 * 1024)
+
+tenants = TenantPool(make_tenant_client, max_clients=TENANT_MAX_CLIENTS, idle_seconds=TENANT_IDLE_MINUTES * 60,
+                     is_busy=lambda telegram_id: bool(jobs.running(telegram_id) or jobs.queue_depth(telegram_id)))
 
 def init_spotify_auth():
-    global sp_global, sp_user_id_global
+    """Autentica por consola la cuenta de OWNER_USER_ID."""
     print("\n🔄 Conectando con Spotify...")
-    
+    auth_manager = tenant_auth_manager(OWNER_USER_ID)
+
     try:
-        auth_manager = SpotifyOAuth(
-            client_id=SPOTIPY_CLIENT_ID,
-            client_secret=SPOTIPY_CLIENT_SECRET,
-            redirect_uri=SPOTIPY_REDIRECT_URI,
-            scope=SCOPE,
-            cache_path="token_cache.json",
-            open_browser=False
-        )
-        sp = spotipy.Spotify(auth_manager=auth_manager)
-        user = sp.current_user()
-        sp_global = sp
-        sp_user_id_global = user['id']
-        print(f"✅ Autenticación exitosa. Logueado como: {user['display_name']} ({sp_user_id_global})")
+        tenant = tenants.add(OWNER_USER_ID, make_tenant_client(OWNER_USER_ID, auth_manager))
+        user = tenant.profile
+        print(f"✅ Autenticación exitosa. Logueado como: {user['display_name']} ({user['id']})")
         return True
 
     except Exception as e:
@@ -91,40 +196,43 @@ def init_spotify_auth():
             print(f"🔗 URL DE AUTORIZACIÓN:\n{auth_url}\n")
             response = input("👉 Pega aquí la URL de redirección completa: ").strip()
             code = auth_manager.parse_response_code(response)
-            auth_manager.get_access_token(code)
+            auth_manager.get_access_token(code, check_cache=False)
             
-            sp_global = spotipy.Spotify(auth_manager=auth_manager)
-            user = sp_global.current_user()
-            sp_user_id_global = user['id']
+            tenant = tenants.add(OWNER_USER_ID, make_tenant_client(OWNER_USER_ID, auth_manager))
+            user = tenant.profile
             print(f"✅ ¡Listo! Logueado como: {user['display_name']}")
             return True
         except Exception as err:
             print(f"❌ Error fatal de autenticación: {err}")
             return False
 
+# Cola de escrituras por usuario: el actualizador manual y el programado que
+# escriben en las mismas playlists juntan sus lotes y no repiten canciones
+write_queues = {}
+write_queues_lock = threading.Lock()
+
+def tenant_write_queue(tenant):
+    with write_queues_lock:
+        queue = write_queues.get(tenant.key)
+        if queue is None or queue.sp is not tenant.client:
+            if queue is not None:
+                # Cliente nuevo (descartado y recreado, o cuenta vinculada otra vez)
+                queue.close(wait=False)
+            queue = write_queues[tenant.key] = WriteQueue(
+                tenant.client, journal=tenant_journal(tenant.key), seen_path=tenant_seen_path(tenant.key),
+                max_delay=WRITE_QUEUE_DELAY,
+                present=lambda pid: [t.uri for t in get_all_tracks_from_playlist(tenant, pid)])
+        return queue
+
+# Portadas de las playlists nuevas del actualizador: se suben en segundo plano
+covers = CoverUploader()
+
 # --- HERRAMIENTAS DE ARCHIVOS ---
-def load_txt_set(path):
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return set(line.strip() for line in f if line.strip())
-    return set()
-
-def save_txt_set(path, new_items):
-    os.makedirs(os.path.dirname(path), exist_ok=True) if os.path.dirname(path) else None
-    with open(path, "a", encoding="utf-8") as f:
-        for item in new_items:
-            f.write(f"{item}\n")
-
-def get_all_tracks_from_playlist(playlist_id):
-    """Helper para descargar tracks completos de una lista"""
-    tracks = []
-    results = sp_global.playlist_items(playlist_id)
-    while results:
-        for item in results['items']:
-            if item.get('track'):
-                tracks.append(item['track'])
-        results = sp_global.next(results) if results['next'] else None
-    return tracks
+playlist_cache = PlaylistCache(PLAYLIST_CACHE_DIR, max_bytes=PLAYLIST_CACHE_MAX_MB * 1024 * 1024)
+
+def get_all_tracks_from_playlist(tenant, playlist_id, fields=URI_FIELDS):
+    """Helper para descargar los tracks de una lista como TrackRecord (páginas en paralelo)"""
+    return fetch_playlist_tracks(tenant.client, playlist_id, max_workers=FETCH_WORKERS, fields=fields, cache=playlist_cache)
 
 async def check_auth_telegram(update: Update):
     """Verifica permisos de Telegram."""
@@ -133,12 +241,15 @@ async def check_auth_telegram(update: Update):
         return False
     return True
 
-def verify_spotify_ownership(playlist_id):
-    """Verifica si la playlist pertenece al usuario autenticado."""
+class OwnershipError(Exception):
+    """La playlist no es del usuario; el mensaje va en Markdown."""
+
+def verify_spotify_ownership(tenant, playlist_id):
+    """Verifica si la playlist pertenece a la cuenta vinculada del usuario."""
     try:
-        pl_details = sp_global.playlist(playlist_id)
+        pl_details = tenant.client.playlist(playlist_id)
         owner_id = pl_details['owner']['id']
-        if owner_id != sp_user_id_global:
+        if owner_id != tenant.user_id:
             return False, f"⛔ **Error de Permisos Spotify**\nEsta playlist pertenece a `{owner_id}`, no a ti.\nSpotify solo permite modificar playlists creadas por tu propia cuenta."
         return True, None
     except Exception as e:
@@ -156,19 +267,146 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "3️⃣ **Escanear Novedades** (/updater)\n"
         "4️⃣ **Reordenar mis Listas** (/sort)\n"
         "5️⃣ **Filtrar Mejores Canciones** (/top)\n\n"
+        "🔗 Vincular tu cuenta de Spotify (/link)\n"
         "❌ Cancelar operación (/cancel)"
     )
     await update.message.reply_markdown(txt)
     return CHOOSING_MODE
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("❌ Operación cancelada. 👉 Para lanzar un nuevo comando pulsa /start")
+    user_id = update.message.from_user.id
+    dropped = jobs.cancel_pending(user_id)
+    txt = "❌ Operación cancelada."
+    if dropped:
+        txt += f" Se han descartado {dropped} tareas en cola."
+    if jobs.running(user_id):
+        txt += f"\n⏳ La tarea en curso ({jobs.running(user_id)}) terminará por su cuenta."
+    await update.message.reply_text(txt + " 👉 Para lanzar un nuevo comando pulsa /start")
     return ConversationHandler.END
 
 async def finish_task(update: Update):
     """Helper para enviar el mensaje estándar al terminar."""
     await update.message.reply_text("✨ **¡Hecho!**\n👉 Para lanzar un nuevo comando pulsa /start", parse_mode="Markdown")
 
+jobs = JobManager(max_workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING)
+
+async def submit_job(update: Update, label, func, *args):
+    """Lanza func(*args) en el pool de trabajos sin bloquear el bot.
+
+    func es síncrona y devuelve la lista de mensajes a enviar al terminar
+    (textos o Attachment para mandar un documento).
+    """
+    user_id = update.message.from_user.id
+
+    async def on_done(messages):
+        for item in messages:
+            if isinstance(item, Attachment):
+                await update.message.reply_document(document=item.data, filename=item.filename, caption=item.caption)
+            else:
+                await update.message.reply_text(item)
+        await finish_task(update)
+
+    async def on_error(e):
+        if isinstance(e, OwnershipError):
+            await update.message.reply_markdown(str(e))
+        else:
+            await update.message.reply_text(f"❌ Error: {e}")
+        await finish_task(update)
+
+    ahead = jobs.queue_depth(user_id) + (1 if jobs.running(user_id) else 0)
+    try:
+        jobs.submit(user_id, label, func, *args, on_done=on_done, on_error=on_error)
+    except QueueFull:
+        await update.message.reply_text(f"🚫 Ya tienes {ahead} tareas pendientes. Espera a que terminen o usa /cancel.")
+        return
+    if ahead:
+        await update.message.reply_text(f"🕒 En cola: tienes {ahead} tarea(s) por delante. Puedes seguir usando el bot.")
+
+def resume_writes(tenant):
+    """Termina las escrituras que el usuario dejó a medias (bot caído, error de red...)."""
+    journal = tenant_journal(tenant.key)
+    if not journal.pending():
+        return []
+    done = resume_pending(tenant.client, journal, log=logger.info)
+    return [f"♻️ Se han completado {done} escrituras que habían quedado a medias."] if done else []
+
+def with_resume(func, tenant, *args):
+    return resume_writes(tenant) + func(tenant, *args)
+
+def resume_on_startup(application):
+    """Encola, para cada usuario con escrituras a medias, un trabajo que las termina."""
+    ids = {OWNER_USER_ID}
+    if os.path.isdir(TENANT_DIR):
+        ids.update(int(name) for name in os.listdir(TENANT_DIR) if name.isdigit())
+    for telegram_id in ids:
+        if not os.path.exists(tenant_journal_path(telegram_id)) or not tenant_journal(telegram_id).pending():
+            continue
+        try:
+            tenant = tenants.get(telegram_id)
+        except NotLinked:
+            continue
+
+        async def on_done(messages, chat_id=telegram_id):
+            for text in messages:
+                await application.bot.send_message(chat_id=chat_id, text=text)
+
+        jobs.submit(telegram_id, "resume", resume_writes, tenant, on_done=on_done)
+
+async def run_job(update: Update, label, func, *args):
+    """Como submit_job, pero func recibe primero el Tenant (cliente de Spotify) del usuario."""
+    try:
+        tenant = tenants.get(update.message.from_user.id)
+    except NotLinked:
+        await update.message.reply_text("🔗 Todavía no has vinculado tu cuenta de Spotify. Usa /link para hacerlo.")
+        return
+    await submit_job(update, label, with_resume, func, tenant, *args)
+
+# ============================================================================
+#   VINCULAR CUENTA DE SPOTIFY
+# ============================================================================
+async def enter_link_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await check_auth_telegram(update): return ConversationHandler.END
+    auth_manager = tenant_auth_manager(update.message.from_user.id)
+    context.user_data["link_auth"] = auth_manager
+    await update.message.reply_text(
+        "🔗 VINCULAR SPOTIFY\n"
+        f"1. Abre este enlace y autoriza el acceso:\n{auth_manager.get_authorize_url()}\n\n"
+        "2. Pégame aquí la URL completa a la que te redirige (aunque la página no cargue)."
+    )
+    return LINK_URL
+
+def link_job(telegram_id, auth_manager, response):
+    code = auth_manager.parse_response_code(response)
+    folder = os.path.dirname(tenant_token_path(telegram_id))
+    if folder:
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+    # Canjea el código y guarda el token en el fichero del usuario. Sin
+    # check_cache=False spotipy devolvería el token que ya hubiera y no se
+    # podría volver a vincular ni cambiar de cuenta
+    auth_manager.get_access_token(code, as_dict=False, check_cache=False)
+    tenant = tenants.add(telegram_id, make_tenant_client(telegram_id, auth_manager))
+    user = tenant.profile
+    return [f"✅ Cuenta vinculada: {user['display_name']} ({user['id']})"]
+
+async def link_process_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    auth_manager = context.user_data.pop("link_auth", None)
+    if auth_manager is None:
+        return await enter_link_mode(update, context)
+    await submit_job(update, "link", link_job, update.message.from_user.id, auth_manager, update.message.text.strip())
+    return ConversationHandler.END
+
+async def unlink(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await check_auth_telegram(update): return ConversationHandler.END
+    user_id = update.message.from_user.id
+    tenants.drop(user_id)
+    path = tenant_token_path(user_id)
+    if os.path.exists(path):
+        os.remove(path)
+        await update.message.reply_text("🔌 Cuenta de Spotify desvinculada. Puedes volver a vincularla con /link.")
+    else:
+        await update.message.reply_text("No tienes ninguna cuenta de Spotify vinculada.")
+    return ConversationHandler.END
+
 # ============================================================================
 #   BOT 1: RANKING (LECTURA)
 # ============================================================================
@@ -189,33 +427,49 @@ async def rank_handle_playlist(update: Update, context: ContextTypes.DEFAULT_TYP
     await update.message.reply_text("🔢 ¿Cuántas canciones quieres ver en el ranking? (Escribe un número o 'all').")
     return RANK_NUMBER
 
-async def rank_handle_number(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    try:
-        url = context.user_data.get("rank_url")
-        n_str = update.message.text.strip().lower()
-        
-        await update.message.reply_text("⏳ Analizando popularidad...")
-        tracks = get_all_tracks_from_playlist(url)
-        
-        tracks.sort(key=lambda x: x['popularity'], reverse=True)
-        
-        n = len(tracks) if n_str == 'all' else int(n_str)
-        top = tracks[:n]
-        
-        msg = [f"🏆 **Top {n} Popularidad**"]
-        for i, t in enumerate(top):
-            msg.append(f"{i+1}. {t['name']} - {t['artists'][0]['name']} ({t['popularity']})")
-            
-        text = "\n".join(msg)
-        # Dividir si es muy largo
-        for i in range(0, len(text), 4000):
-            await update.message.reply_text(text[i:i+4000])
-            
-    except Exception as e:
-        logger.error(e)
-        await update.message.reply_text(f"❌ Error: {str(e)}")
+def rank_progress_text(fetched, total, top):
+    lines = [f"⏳ Descargadas {fetched}/{total} canciones. Top provisional:"]
+    for i, t in enumerate(top, 1):
+        lines.append(f"{i}. {t.name} - {t.artist} ({t.popularity})")
+    return "\n".join(lines)
+
+def rank_csv(ranked):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["posicion", "nombre", "artista", "popularidad", "uri"])
+    for i, t in enumerate(ranked, 1):
+        writer.writerow([i, t.name, t.artist, t.popularity, t.uri])
+    return out.getvalue().encode("utf-8")
+
+def rank_job(tenant, url, n_str, progress=None):
+    # Top N con un heap según llegan las páginas; 'all' ordena por tramos
+    n = None if n_str == 'all' else int(n_str)
+
+    def on_page(fetched, total, preview):
+        if progress:
+            progress.update(rank_progress_text(fetched, total, preview.top(5)))
+
+    ranked = rank_playlist(tenant.client, url, n, max_workers=FETCH_WORKERS, cache=playlist_cache, on_page=on_page)
+    count = len(ranked) if n is not None else ranked.count
+    if progress:
+        progress.update(f"✅ Ranking listo: {count} canciones.", force=True)
+
+    if count > RANK_MAX_LINES:
+        # Mejor un CSV que decenas de mensajes
+        return [Attachment("ranking.csv", rank_csv(ranked), caption=f"🏆 Top {count} Popularidad")]
+
+    msg = [f"🏆 **Top {count} Popularidad**"]
+    for i, t in enumerate(ranked, 1):
+        msg.append(f"{i}. {t.name} - {t.artist} ({t.popularity})")
+    return split_message("\n".join(msg))
 
-    await finish_task(update)
+async def rank_handle_number(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    url = context.user_data.get("rank_url")
+    n_str = update.message.text.strip().lower()
+    
+    status = await update.message.reply_text("⏳ Analizando popularidad...")
+    progress = ThrottledEditor(status, asyncio.get_running_loop(), min_interval=RANK_EDIT_INTERVAL)
+    await run_job(update, "rank", rank_job, url, n_str, progress)
     return ConversationHandler.END
 
 # ============================================================================
@@ -232,20 +486,23 @@ async def enter_mixer_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "1. Envíame los enlaces de las playlists separados por un **espacio**.\n"
         "2. Por defecto el modo es **Normal** (una lista detrás de otra).\n"
         "3. Si quieres mezclar canciones alternadas, escribe `/modo mix` antes de enviar los links.\n"
-        "4. Si quieres volver al modo secuencial, escribe `/modo normal`.\n\n"
+        "4. Si quieres volver al modo secuencial, escribe `/modo normal`.\n"
+        "5. Otros modos: `/modo peso` (según tamaño), `/modo reparto` (proporcional) y `/modo popularidad` (alterna hits).\n\n"
         "Cuando me envíes los enlaces, te preguntaré el nombre para la nueva playlist."
     )
     await update.message.reply_markdown(msg)
     return MIXER_INPUT
 
+def parse_mixer_mode(text):
+    """Devuelve la estrategia pedida en '/modo xxx' (normal si no se reconoce)."""
+    parts = text.lower().split()
+    name = parts[1] if len(parts) > 1 else "normal"
+    return name if name in STRATEGIES else "normal"
+
 async def mixer_set_mode_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    text = update.message.text.lower()
-    if "mix" in text:
-        context.user_data["mixer_mode"] = "mix"
-        await update.message.reply_text("🔀 **Modo MIX activado:** Las canciones se alternarán (1, 1, 1...).")
-    else:
-        context.user_data["mixer_mode"] = "normal"
-        await update.message.reply_text("➡️ **Modo NORMAL activado:** Las playlists se añadirán una tras otra.")
+    mode = parse_mixer_mode(update.message.text)
+    context.user_data["mixer_mode"] = mode
+    await update.message.reply_text(f"🔀 **Modo {mode.upper()} activado:** {STRATEGY_LABELS[mode]}.")
     return MIXER_INPUT
 
 async def mixer_process_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -253,12 +510,9 @@ async def mixer_process_input(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # Gestionar comandos de modo si el usuario los escribe manual
     if text.lower().startswith("/modo"):
-        if "mix" in text.lower():
-            context.user_data["mixer_mode"] = "mix"
-            await update.message.reply_text("🔀 Modo MIX activado.")
-        else:
-            context.user_data["mixer_mode"] = "normal"
-            await update.message.reply_text("➡️ Modo NORMAL activado.")
+        mode = parse_mixer_mode(text)
+        context.user_data["mixer_mode"] = mode
+        await update.message.reply_text(f"🔀 Modo {mode.upper()} activado.")
         return MIXER_INPUT
 
     # Procesar Links
@@ -272,50 +526,28 @@ async def mixer_process_input(update: Update, context: ContextTypes.DEFAULT_TYPE
     await update.message.reply_text("📝 ¿Qué **nombre** le ponemos a la nueva playlist?")
     return MIXER_NAME
 
+def mixer_job(tenant, pids, mode, playlist_name):
+    tracks_lists = [get_all_tracks_from_playlist(tenant, pid) for pid in pids]
+    final_uris = list(mix(tracks_lists, mode))
+    
+    if not final_uris:
+        return ["❌ No se encontraron canciones válidas en las listas."]
+
+    new_pl = tenant.client.user_playlist_create(tenant.user_id, playlist_name, public=False, description=f"Mixer {mode.upper()} created by SpotiBOT")
+    
+    write_steps(tenant.client, new_pl['id'], [('add', chunk) for chunk in batches(final_uris)],
+                journal=tenant_journal(tenant.key), target=final_uris, snapshot_id=new_pl.get('snapshot_id'),
+                label=f"mixer {playlist_name}")
+
+    return [f"✅ Playlist creada con éxito:\n{new_pl['external_urls']['spotify']}"]
+
 async def mixer_process_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     playlist_name = update.message.text.strip()
     pids = context.user_data.get("mixer_pids", [])
     mode = context.user_data.get("mixer_mode", "normal")
 
     await update.message.reply_text(f"🍹 Creando mezcla **'{playlist_name}'** en modo **{mode.upper()}**...")
-
-    try:
-        tracks_lists = []
-        for pid in pids:
-            tracks = get_all_tracks_from_playlist(pid)
-            tracks_lists.append([t['uri'] for t in tracks])
-            
-        final_uris = []
-        
-        if mode == 'mix':
-            max_len = max(len(l) for l in tracks_lists)
-            for i in range(max_len):
-                for l in tracks_lists:
-                    if i < len(l) and l[i] not in final_uris: final_uris.append(l[i])
-        else:
-            seen = set()
-            for l in tracks_lists:
-                for u in l:
-                    if u not in seen:
-                        final_uris.append(u)
-                        seen.add(u)
-        
-        if not final_uris:
-            await update.message.reply_text("❌ No se encontraron canciones válidas en las listas.")
-            return ConversationHandler.END
-
-        new_pl = sp_global.user_playlist_create(sp_user_id_global, playlist_name, public=False, description=f"Mixer {mode.upper()} created by SpotiBOT")
-        
-        for i in range(0, len(final_uris), 100):
-            sp_global.playlist_add_items(new_pl['id'], final_uris[i:i+100])
-            
-        await update.message.reply_text(f"✅ Playlist creada con éxito:\n{new_pl['external_urls']['spotify']}")
-
-    except Exception as e:
-        logger.error(e)
-        await update.message.reply_text(f"❌ Error: {e}")
-
-    await finish_task(update)
+    await run_job(update, "mixer", mixer_job, pids, mode, playlist_name)
     return ConversationHandler.END
 
 # ============================================================================
@@ -324,17 +556,43 @@ async def mixer_process_name(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def enter_creator_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_auth_telegram(update): return ConversationHandler.END
     
-    if not os.path.exists("playlists.txt"):
-        await update.message.reply_text("⚠️ Error: No encuentro el archivo 'playlists.txt' en el servidor.")
+    try:
+        plan = load_plan(SOURCES_PATH)
+    except SourcesError as e:
+        await update.message.reply_text(f"⚠️ Error: {e}")
         return ConversationHandler.END
 
     await update.message.reply_text(
         "🆕 **MODO ACTUALIZADOR**\n"
         "Se actualizaré tus playlists personales basándome en el archivo `playlists.txt`.\n"
+        + "\n".join(plan.report()) + "\n"
         "Por favor, introduce el **número de días** de antigüedad para buscar novedades (ej: 7 para la última semana)."
     )
     return CREATOR_DAYS
 
+def updater_job(tenant, cutoff):
+    plan = load_plan(SOURCES_PATH)
+    for line in plan.report():
+        logger.info(line)
+
+    result = run_updater(tenant.client, tenant.user_id, plan.source_map, cutoff,
+                         max_workers=FETCH_WORKERS, log=logger.info, seen_path=tenant_seen_path(tenant.key),
+                         migrate_seen=tenant.key == OWNER_USER_ID, journal=tenant_journal(tenant.key),
+                         queue=tenant_write_queue(tenant), covers=covers)
+    msg_log = "".join(f"{line.strip()}\n" for line in plan.report()[1:])
+    for genre, added in result['summary']:
+        msg_log += f"✅ {genre}: +{added}\n" if added else f"💤 {genre}: 0\n"
+
+    logger.info(f"Updater: {result['calls']} llamadas de lectura, {result['calls_saved']} ahorradas")
+    msg_log += f"📉 Llamadas API: {result['calls']} (ahorradas: {result['calls_saved']})\n"
+    limits = tenant.client.stats()
+    logger.info(f"Límite de peticiones: {limits}")
+    if limits['throttled']:
+        msg_log += f"⏳ Llamadas frenadas por Spotify (429): {limits['throttled']}\n"
+    if tenant.client.http_cache:
+        logger.info(f"Caché HTTP: {tenant.client.http_cache.as_dict()}")
+    return [f"🏁 **Resumen:**\n{msg_log}"]
+
 async def creator_process_days(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         days = int(update.message.text.strip())
@@ -343,89 +601,48 @@ async def creator_process_days(update: Update, context: ContextTypes.DEFAULT_TYP
         days = 7
     
     await update.message.reply_text(f"🚀 Buscando novedades de los últimos {days} días...")
-    msg_log = ""
-    
-    try:
-        playlists_map = {}
-        with open("playlists.txt", "r", encoding="utf-8") as f:
-            for line in f:
-                parts = line.strip().split(" ")
-                if len(parts) < 2: continue
-                url, genre = parts[0], parts[1]
-                if "playlist/" in url:
-                    pid = url.split("playlist/")[1].split("?")[0]
-                    genre = genre.replace("&", "AND").replace("_", " ").upper()
-                    if genre not in playlists_map: playlists_map[genre] = []
-                    playlists_map[genre].append(pid)
-        
-        global_tracks = load_txt_set("global_tracks.txt")
-
-        for genre, pids in playlists_map.items():
-            target_name = f"{genre} {datetime.date.today().year}"
-            target_id = None
-            
-            user_pls = sp_global.current_user_playlists(limit=50)
-            for pl in user_pls['items']:
-                if pl['name'] == target_name:
-                    target_id = pl['id']
-                    break
-            
-            if not target_id:
-                new_pl = sp_global.user_playlist_create(sp_user_id_global, target_name, public=False, description=f"Auto-gen: {genre}")
-                target_id = new_pl['id']
-                img_path = f"images/{genre.lower().replace(' ', '_')}.jpg"
-                if os.path.exists(img_path):
-                    try:
-                        with open(img_path, "rb") as img:
-                            sp_global.playlist_upload_cover_image(target_id, base64.b64encode(img.read()))
-                    except: pass
-
-            tracks_to_add = []
-            cutoff = datetime.datetime.now(datetime.timezone.utc) - timedelta(days=days)
-            
-            for pid in pids:
-                local_hist_path = f"data/{pid}_tracks.txt"
-                local_hist = load_txt_set(local_hist_path)
-                new_local_items = []
-                
-                try:
-                    res = sp_global.playlist_items(pid)
-                    while res:
-                        for item in res['items']:
-                            if not item.get('track'): continue
-                            tid = item['track']['id']
-                            turi = item['track']['uri']
-                            try:
-                                added = datetime.datetime.strptime(item['added_at'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=datetime.timezone.utc)
-                                if added >= cutoff:
-                                    if tid not in local_hist and tid not in global_tracks:
-                                        tracks_to_add.append(turi)
-                                        global_tracks.add(tid)
-                                        new_local_items.append(tid)
-                            except: pass
-                        res = sp_global.next(res) if res['next'] else None
-                    if new_local_items: save_txt_set(local_hist_path, new_local_items)
-                except Exception as e:
-                    logger.warning(f"Error {pid}: {e}")
-
-            if tracks_to_add:
-                unique_uris = list(set(tracks_to_add))
-                for i in range(0, len(unique_uris), 100):
-                    sp_global.playlist_add_items(target_id, unique_uris[i:i+100])
-                new_ids = [u.split(":")[-1] for u in unique_uris]
-                save_txt_set("global_tracks.txt", new_ids)
-                msg_log += f"✅ {genre}: +{len(unique_uris)}\n"
-            else:
-                msg_log += f"💤 {genre}: 0\n"
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - timedelta(days=days)
+    await run_job(update, "updater", updater_job, cutoff)
+    return ConversationHandler.END
 
-        await update.message.reply_text(f"🏁 **Resumen:**\n{msg_log}")
+# --- Ejecuciones programadas ---
+SCHEDULER_JOB_ID = "scheduler"
 
+async def notify_user(bot, chat_id, text):
+    """Envía un mensaje al chat privado de un usuario."""
+    try:
+        await bot.send_message(chat_id=chat_id, text=text)
     except Exception as e:
-        logger.error(e)
-        await update.message.reply_text(f"❌ Error crítico: {str(e)}")
+        logger.warning(f"No se pudo avisar a {chat_id}: {e}")
 
-    await finish_task(update)
-    return ConversationHandler.END
+def make_scheduled_update(application):
+    async def scheduled_update(cutoff):
+        try:
+            load_plan(SOURCES_PATH)
+        except SourcesError as e:
+            logger.warning(f"Actualización programada: {e}")
+            return False
+        outcome = {}
+
+        # Es la cuenta del dueño: el resumen solo le llega a él, no al resto de usuarios
+        async def on_done(messages):
+            outcome["ok"] = True
+            for text in messages:
+                await notify_user(application.bot, OWNER_USER_ID, f"⏰ Actualización programada\n{text}")
+
+        async def on_error(e):
+            await notify_user(application.bot, OWNER_USER_ID, f"⏰ ❌ Error en la actualización programada: {e}")
+
+        try:
+            tenant = tenants.get(OWNER_USER_ID)
+        except NotLinked:
+            logger.warning("Actualización programada: la cuenta de OWNER_USER_ID no está vinculada")
+            return False
+        # Pasa por la misma cola de trabajos y el mismo límite global
+        await jobs.submit(SCHEDULER_JOB_ID, "updater (programado)", updater_job, tenant, cutoff,
+                          on_done=on_done, on_error=on_error)
+        return outcome.get("ok", False)
+    return scheduled_update
 
 # ============================================================================
 #   BOT 4: SORT (ORDENAR PLAYLIST EXISTENTE)
@@ -440,39 +657,35 @@ async def enter_sort_mode(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return SORT_URL
 
+def sort_job(tenant, pid):
+    # Verificación de dueño
+    is_owner, err_msg = verify_spotify_ownership(tenant, pid)
+    if not is_owner:
+        raise OwnershipError(err_msg)
+
+    tracks = get_all_tracks_from_playlist(tenant, pid)
+    if not tracks:
+        return ["❌ Playlist vacía."]
+
+    current_uris = [t.uri for t in tracks]
+    tracks.sort(key=lambda x: x.popularity, reverse=True)
+    sorted_uris = [t.uri for t in tracks]
+
+    res = rewrite_playlist(tenant.client, pid, current_uris, sorted_uris, journal=tenant_journal(tenant.key), label="sort")
+    logger.info(f"Sort {pid}: {res['calls']} llamadas ({res['mode']})")
+    return [f"✅ **Hecho:** {len(sorted_uris)} canciones reordenadas por fama."]
+
 async def process_sort_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     url = update.message.text.strip()
     try:
         pid = url.split("playlist/")[1].split("?")[0]
-        
-        # Verificación de dueño
-        is_owner, err_msg = verify_spotify_ownership(pid)
-        if not is_owner:
-            await update.message.reply_markdown(err_msg)
-            return ConversationHandler.END
-
-        await update.message.reply_text("⏳ Ordenando por popularidad...")
-        
-        tracks = get_all_tracks_from_playlist(pid)
-        if not tracks:
-            await update.message.reply_text("❌ Playlist vacía.")
-            return ConversationHandler.END
-
-        tracks.sort(key=lambda x: x['popularity'], reverse=True)
-        sorted_uris = [t['uri'] for t in tracks]
-
-        sp_global.playlist_replace_items(pid, sorted_uris[:100])
-        if len(sorted_uris) > 100:
-            for i in range(100, len(sorted_uris), 100):
-                sp_global.playlist_add_items(pid, sorted_uris[i:i+100])
-                
-        await update.message.reply_text(f"✅ **Hecho:** {len(sorted_uris)} canciones reordenadas por fama.")
+    except IndexError:
+        await update.message.reply_text("❌ Error: enlace de playlist no válido.")
+        await finish_task(update)
+        return ConversationHandler.END
 
-    except Exception as e:
-        logger.error(e)
-        await update.message.reply_text(f"❌ Error: {e}")
-    
-    await finish_task(update)
+    await update.message.reply_text("⏳ Ordenando por popularidad...")
+    await run_job(update, "sort", sort_job, pid)
     return ConversationHandler.END
 
 # ============================================================================
@@ -492,42 +705,86 @@ async def process_top_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("🔢 ¿Con cuántas canciones quieres quedarte? (Ej: 50)")
     return TOP_NUMBER
 
+def top_job(tenant, pid, n):
+    is_owner, err_msg = verify_spotify_ownership(tenant, pid)
+    if not is_owner:
+        raise OwnershipError(err_msg)
+
+    tracks = get_all_tracks_from_playlist(tenant, pid)
+    current_uris = [t.uri for t in tracks]
+    tracks.sort(key=lambda x: x.popularity, reverse=True)
+    
+    top_tracks = tracks[:n]
+    top_uris = [t.uri for t in top_tracks]
+    
+    res = rewrite_playlist(tenant.client, pid, current_uris, top_uris, journal=tenant_journal(tenant.key), label=f"top {n}")
+    logger.info(f"Top {pid}: {res['calls']} llamadas ({res['mode']})")
+    return [f"✅ **Listo:** Tu playlist ahora solo tiene las {len(top_uris)} mejores canciones."]
+
 async def process_top_number(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         n = int(update.message.text.strip())
         url = context.user_data["top_url"]
         pid = url.split("playlist/")[1].split("?")[0]
-        
-        is_owner, err_msg = verify_spotify_ownership(pid)
-        if not is_owner:
-            await update.message.reply_markdown(err_msg)
-            return ConversationHandler.END
-
-        await update.message.reply_text(f"⏳ Filtrando Top {n}...")
-        
-        tracks = get_all_tracks_from_playlist(pid)
-        tracks.sort(key=lambda x: x['popularity'], reverse=True)
-        
-        top_tracks = tracks[:n]
-        top_uris = [t['uri'] for t in top_tracks]
-        
-        sp_global.playlist_replace_items(pid, top_uris[:100])
-        if len(top_uris) > 100:
-            for i in range(100, len(top_uris), 100):
-                sp_global.playlist_add_items(pid, top_uris[i:i+100])
-                
-        await update.message.reply_text(f"✅ **Listo:** Tu playlist ahora solo tiene las {len(top_uris)} mejores canciones.")
-
     except ValueError:
         await update.message.reply_text("❌ Debes introducir un número.")
-    except Exception as e:
-        logger.error(e)
-        await update.message.reply_text(f"❌ Error: {e}")
-        
-    await finish_task(update)
+        await finish_task(update)
+        return ConversationHandler.END
+    except IndexError:
+        await update.message.reply_text("❌ Error: enlace de playlist no válido.")
+        await finish_task(update)
+        return ConversationHandler.END
+
+    await update.message.reply_text(f"⏳ Filtrando Top {n}...")
+    await run_job(update, "top", top_job, pid, n)
     return ConversationHandler.END
 
 
+# ============================================================================
+#   ESTADÍSTICAS (solo admins)
+# ============================================================================
+def http_cache_hit_ratio():
+    stats = [c.http_cache.as_dict() for c in tenants.clients() if c.http_cache is not None]
+    hits = sum(s["not_modified"] for s in stats)
+    total = hits + sum(s["changed"] + s["misses"] for s in stats)
+    return round(hits / total, 3) if total else 0.0
+
+def register_gauges():
+    """Valores que se leen en el momento de pedir las métricas."""
+    METRICS.gauge("job_queue_depth", jobs.queue_depth)
+    METRICS.gauge("jobs_running", lambda: len(jobs.running()))
+    METRICS.gauge("playlist_cache_hits", lambda: playlist_cache.hits)
+    METRICS.gauge("playlist_cache_misses", lambda: playlist_cache.misses)
+    METRICS.gauge("tenants_active", lambda: len(tenants))
+    METRICS.gauge("tenants_evicted", lambda: tenants.evicted)
+    METRICS.gauge("write_queue_depth", lambda: sum(q.depth() for q in list(write_queues.values())))
+    METRICS.gauge("http_cache_hit_ratio", http_cache_hit_ratio)
+
+def stats_text():
+    snap = METRICS.snapshot()
+    lines = ["📊 **Estadísticas**", "", "**Comandos** (n · p50 · p95):"]
+    for name, h in sorted(snap["histograms"].items()):
+        if name.startswith(("job_seconds", "phase_seconds")):
+            lines.append(f"• `{name}`: {h['count']} · {h['p50']}s · {h['p95']}s")
+    lines += ["", "**Llamadas a Spotify:**"]
+    for name, value in sorted(snap["counters"].items()):
+        if name.startswith(("spotify_", "job_errors")):
+            lines.append(f"• `{name}`: {round(value, 2)}")
+    lines += ["", "**Colas y cachés:**"]
+    for name, value in sorted(snap["gauges"].items()):
+        lines.append(f"• `{name}`: {value}")
+    return "\n".join(lines)
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.message.from_user.id not in ADMIN_USER_IDS:
+        return
+    for chunk in split_message(stats_text()):
+        await update.message.reply_markdown(chunk)
+
+def report_covers():
+    for path, problem in check_covers(store=covers.store).items():
+        logger.warning(f"Portada {path}: {problem}")
+
 # ============================================================================
 #   MAIN
 # ============================================================================
@@ -536,10 +793,37 @@ def main():
         print("❌ Error Auth")
         return
 
-    nest_asyncio.apply()
     print("🤖 Iniciando Bot...")
     
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    async def on_startup(app):
+        register_gauges()
+        resume_on_startup(app)
+        # Portadas que no se podrán subir, avisadas ya y no al crear la playlist
+        app.create_task(asyncio.to_thread(report_covers))
+        if METRICS_PORT:
+            METRICS.serve(METRICS_PORT)
+            print(f"📈 Métricas en http://127.0.0.1:{METRICS_PORT}/metrics")
+        if UPDATER_SCHEDULE:
+            scheduler = UpdaterScheduler(UPDATER_SCHEDULE, make_scheduled_update(app),
+                                         state_path=SCHEDULER_STATE_PATH, jitter=UPDATER_SCHEDULE_JITTER)
+            app.create_task(scheduler.run_forever())
+            print(f"⏰ Actualizador programado: {UPDATER_SCHEDULE}")
+
+    async def on_shutdown(app):
+        jobs.shutdown()
+        covers.close()
+        for queue in write_queues.values():
+            queue.close()
+        for journal in journals.values():
+            journal.close()
+
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
 
     entry_points_list = [
         CommandHandler("start", start),
@@ -547,7 +831,9 @@ def main():
         CommandHandler("mixer", enter_mixer_mode),
         CommandHandler("updater", enter_creator_mode),
         CommandHandler("sort", enter_sort_mode),
-        CommandHandler("top", enter_top_mode)
+        CommandHandler("top", enter_top_mode),
+        CommandHandler("link", enter_link_mode),
+        CommandHandler("unlink", unlink)
     ]
 
     conv_handler = ConversationHandler(
@@ -570,10 +856,13 @@ def main():
             
             TOP_URL: [MessageHandler(filters.TEXT & ~filters.COMMAND, process_top_url)],
             TOP_NUMBER: [MessageHandler(filters.TEXT & ~filters.COMMAND, process_top_number)],
+
+            LINK_URL: [MessageHandler(filters.TEXT & ~filters.COMMAND, link_process_url)],
         },
         fallbacks=[CommandHandler("cancel", cancel), CommandHandler("start", start)]
     )
 
+    application.add_handler(CommandHandler("stats", stats))
     application.add_handler(conv_handler)
     application.run_polling()
 
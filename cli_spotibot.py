@@ -2,13 +2,26 @@ import os
 import sys
 import re
 import time
-import base64
 import datetime
+import argparse
+import contextlib
+import json
+import shlex
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-import pandas as pd
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-from spotipy.exceptions import SpotifyException
+# spotipy se importa al usarse: el menú (y un simple 'import cli_spotibot')
+# arranca sin pagar su carga ni ir a la red
+from spotibot.cache import PlaylistCache
+from spotibot.fetch import fetch_playlist_tracks
+from spotibot.journal import JOURNAL_PATH, WriteJournal, batches, resume_pending, write_steps
+from spotibot.metrics import METRICS
+from spotibot.mixer import STRATEGIES, STRATEGY_LABELS, mix
+from spotibot.ranking import rank_playlist
+from spotibot.records import URI_FIELDS
+from spotibot.rewrite import rewrite_playlist
+from spotibot.sources import SOURCES_PATH, SourcesError, load_plan
+from spotibot.updater import run_updater
 
 # --- CONFIGURACIÓN (YA EDITADA) ---
 SPOTIPY_CLIENT_ID = "d03aa02f8eee4816ad49125646d00260"
@@ -19,82 +32,159 @@ SPOTIPY_REDIRECT_URI = "http://127.0.0.1:8888/callback"
 # Scope amplio para que funcione todo con una sola autenticación
 SCOPE = "playlist-read-private playlist-modify-private ugc-image-upload playlist-modify-public user-library-read"
 
+# Páginas de 100 canciones que se descargan a la vez al leer una playlist
+FETCH_WORKERS = 8
+
+# Caché local de playlists (se invalida sola cuando cambia el snapshot_id)
+PLAYLIST_CACHE_DIR = "cache/playlists"
+PLAYLIST_CACHE_MAX_MB = 200
+
+# Ritmo máximo de peticiones a la API (compartido por todos los hilos).
+# Con cada 429 se respeta el Retry-After y se baja la concurrencia
+API_MAX_RPS = 25
+API_MAX_CONCURRENCY = 16
+
+# Caché HTTP de lecturas de playlists (If-None-Match: si no han cambiado,
+# Spotify responde 304 sin cuerpo y se usa la copia local)
+HTTP_CACHE_DIR = "cache/http"
+HTTP_CACHE_MAX_MB = 100
+
 # --- AUTHENTICATION ---
 def get_spotify_client():
+    from spotibot.auth import TOKEN_CACHE_PATH, make_auth_manager
+    from spotibot.ratelimit import make_client
     try:
-        # open_browser=False es CLAVE para entornos sin GUI (VPS, SSH)
-        auth_manager = SpotifyOAuth(
-            client_id=SPOTIPY_CLIENT_ID,
-            client_secret=SPOTIPY_CLIENT_SECRET,
-            redirect_uri=SPOTIPY_REDIRECT_URI,
-            scope=SCOPE,
-            cache_path="token_cache.json",
-            open_browser=False  
-        )
-        sp = spotipy.Spotify(auth_manager=auth_manager)
+        auth_manager = make_auth_manager(SPOTIPY_CLIENT_ID, SPOTIPY_CLIENT_SECRET, SPOTIPY_REDIRECT_URI,
+                                         SCOPE, token_path=TOKEN_CACHE_PATH)
+        sp = make_client(auth_manager, rate=API_MAX_RPS, max_concurrency=API_MAX_CONCURRENCY,
+                         http_cache_dir=HTTP_CACHE_DIR, http_cache_max_bytes=HTTP_CACHE_MAX_MB * 1024 * 1024)
         return sp
     except Exception as e:
         print(f"❌ Error de autenticación: {e}")
         sys.exit()
 
-# Intentamos conectar e imprimir instrucciones si falta auth
-print("🔄 Conectando con Spotify...")
-sp = get_spotify_client()
-sp_user_id = None
-
-# Esta llamada forzará el flujo de autenticación si no hay token válido
-try:
-    user_info = sp.current_user()
-    sp_user_id = user_info['id']
-    print(f"✅ Logueado como: {user_info['display_name']} ({sp_user_id})")
-except Exception as e:
-    print("\n⚠️  SI ES LA PRIMERA VEZ, SIGUE LAS INSTRUCCIONES ARRIBA ⚠️")
-    print("Copia la URL que aparece arriba, pégala en tu navegador, autoriza y pega la URL de vuelta aquí.")
-    sys.exit()
+# El cliente y el perfil se crean la primera vez que hacen falta. Con
+# 'batch --parallel' varios hilos pueden pedirlos a la vez: se crean con
+# el candado (reentrante: get_profile() llama a get_sp(), y este a get_journal())
+_sp = None
+_profile = None
+_init_lock = threading.RLock()
+
+def get_sp():
+    global _sp
+    with _init_lock:
+        if _sp is None:
+            print("🔄 Conectando con Spotify...")
+            sp = get_spotify_client()
+            # Escrituras que una ejecución anterior dejó a medias
+            if get_journal().pending():
+                resume_pending(sp, get_journal())
+            _sp = sp
+    return _sp
+
+def get_profile():
+    """Perfil del usuario logueado (una sola llamada por ejecución)."""
+    global _profile
+    with _init_lock:
+        if _profile is None:
+            # Esta llamada forzará el flujo de autenticación si no hay token válido
+            try:
+                _profile = get_sp().current_user()
+            except Exception as e:
+                print("\n⚠️  SI ES LA PRIMERA VEZ, SIGUE LAS INSTRUCCIONES ARRIBA ⚠️")
+                print("Copia la URL que aparece arriba, pégala en tu navegador, autoriza y pega la URL de vuelta aquí.")
+                sys.exit()
+            print(f"✅ Logueado como: {_profile['display_name']} ({_profile['id']})")
+    return _profile
+
+def get_user_id():
+    return get_profile()['id']
 
 # --- HERRAMIENTAS DE ARCHIVOS ---
-def load_txt_set(path):
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return set(line.strip() for line in f if line.strip())
-    return set()
-
-def save_txt_set(path, new_items):
-    os.makedirs(os.path.dirname(path), exist_ok=True) if os.path.dirname(path) else None
-    with open(path, "a", encoding="utf-8") as f:
-        for item in new_items:
-            f.write(f"{item}\n")
+_playlist_cache = None
+_journal = None
+
+def get_journal():
+    global _journal
+    with _init_lock:
+        if _journal is None:
+            _journal = WriteJournal(JOURNAL_PATH)
+    return _journal
+
+def get_playlist_cache():
+    global _playlist_cache
+    with _init_lock:
+        if _playlist_cache is None:
+            _playlist_cache = PlaylistCache(PLAYLIST_CACHE_DIR, max_bytes=PLAYLIST_CACHE_MAX_MB * 1024 * 1024)
+    return _playlist_cache
 
 # --- HELPER FUNCTIONS ---
-def get_all_tracks_from_playlist(playlist_id):
-    """Descarga todas las canciones de una playlist paginando."""
+class CLIError(Exception):
+    """Error de uso (URL mala, playlist ajena...) con mensaje para el usuario."""
+
+@contextlib.contextmanager
+def job_timer(command):
+    """job_seconds y job_errors_total de un comando, igual desde el menú que en modo batch."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        METRICS.inc("job_errors_total", command=command)
+        raise
+    finally:
+        METRICS.observe("job_seconds", time.perf_counter() - t0, command=command)
+
+def playlist_id_from_url(url):
+    if "playlist/" in url:
+        return url.split("playlist/")[1].split("?")[0]
+    if len(url) > 10 and "/" not in url:
+        return url
+    raise CLIError(f"URL inválida: {url}")
+
+def load_tracks(playlist_id, fields=URI_FIELDS):
+    """Descarga todas las canciones de una playlist (páginas en paralelo).
+
+    Devuelve TrackRecord con solo los campos pedidos en 'fields'.
+    """
+    return fetch_playlist_tracks(get_sp(), playlist_id, max_workers=FETCH_WORKERS, fields=fields, cache=get_playlist_cache())
+
+def get_all_tracks_from_playlist(playlist_id, fields=URI_FIELDS):
+    """Como load_tracks, pero en caso de error avisa y devuelve []."""
     tracks = []
     try:
-        results = sp.playlist_items(playlist_id)
-        while results:
-            for item in results['items']:
-                if item.get('track'):
-                    tracks.append(item['track'])
-            results = sp.next(results) if results['next'] else None
+        tracks = load_tracks(playlist_id, fields)
     except Exception as e:
         print(f"Error leyendo playlist: {e}")
     return tracks
 
+def check_ownership(playlist_id):
+    pl = get_sp().playlist(playlist_id, fields="owner.id")
+    if pl['owner']['id'] != get_user_id():
+        raise CLIError(f"Esta playlist pertenece a {pl['owner']['id']}, no a ti. "
+                       "Spotify solo permite editar tus propias playlists.")
+
 def verify_ownership(playlist_id):
     """Verifica si la playlist pertenece al usuario logueado."""
     try:
-        pl = sp.playlist(playlist_id)
-        if pl['owner']['id'] != sp_user_id:
-            print(f"⛔ Error: Esta playlist pertenece a {pl['owner']['id']}, no a ti.")
-            print("   Spotify solo permite editar tus propias playlists.")
-            return False
+        check_ownership(playlist_id)
         return True
+    except CLIError as e:
+        print(f"⛔ Error: {e}")
+        return False
     except:
         return False
 
 # ==========================================
 # 1. RANKING
 # ==========================================
+def rank_tracks(url, limit=10):
+    """Canciones de la playlist de más a menos popular ('all' = todas).
+
+    Con un número devuelve una lista; con 'all', un iterable ordenado.
+    """
+    n = None if limit == "all" else int(limit)
+    return rank_playlist(get_sp(), url, n, max_workers=FETCH_WORKERS, cache=get_playlist_cache())
+
 def feature_ranking():
     print("\n📊 --- RANKING DE PLAYLIST ---")
     url = input("👉 Pega la URL de la playlist: ").strip()
@@ -104,29 +194,19 @@ def feature_ranking():
         return
 
     limit_input = input("👉 ¿Cuántas canciones quieres ver? (Número o 'all'): ").strip().lower()
+    if limit_input != "all":
+        try:
+            int(limit_input)
+        except ValueError:
+            limit_input = 10
     
     print("⏳ Obteniendo canciones...")
     try:
-        tracks = get_all_tracks_from_playlist(url)
-        
-        data = []
-        for t in tracks:
-            data.append({
-                "Nombre": t["name"],
-                "Artista": t["artists"][0]["name"],
-                "Popularidad": t["popularity"]
-            })
-
-        df = pd.DataFrame(data).sort_values(by="Popularidad", ascending=False)
-        
-        if limit_input == "all":
-            print(df.to_string(index=False))
-        else:
-            try:
-                n = int(limit_input)
-                print(df.head(n).to_string(index=False))
-            except:
-                print(df.head(10).to_string(index=False))
+        # Con 'all' el ranking se va leyendo mientras se imprime: se mide todo
+        with job_timer("rank"):
+            print(f"{'#':>5}  {'Pop':>3}  Nombre - Artista")
+            for i, t in enumerate(rank_tracks(url, limit_input), 1):
+                print(f"{i:>5}  {t.popularity:>3}  {t.name} - {t.artist}")
 
     except Exception as e:
         print(f"❌ Error: {e}")
@@ -134,6 +214,30 @@ def feature_ranking():
 # ==========================================
 # 2. PARTY MIXER
 # ==========================================
+def create_mix(playlist_ids, strategy="normal", playlist_name=None, log=print):
+    """Crea una playlist nueva mezclando las fuentes; devuelve sus datos."""
+    if len(playlist_ids) < 2:
+        raise CLIError("Necesitas al menos 2 playlists.")
+    if not playlist_name:
+        playlist_name = f"Mixer {datetime.date.today()}"
+
+    all_tracks_lists = [load_tracks(pid) for pid in playlist_ids]
+    final_uris = list(mix(all_tracks_lists, strategy))
+    if not final_uris:
+        raise CLIError("No se encontraron canciones válidas.")
+    log(f"💿 Total canciones únicas: {len(final_uris)}")
+
+    sp = get_sp()
+    new_pl = sp.user_playlist_create(get_user_id(), playlist_name, public=False,
+                                     description=f"Generada con SpotiBOT CLI ({strategy.upper()})")
+    # Subir en lotes de 100 (con diario: si se corta, se termina en la siguiente ejecución)
+    chunks = batches(final_uris)
+    log(f"   ...Subiendo {len(chunks)} lotes")
+    write_steps(sp, new_pl['id'], [('add', chunk) for chunk in chunks], journal=get_journal(),
+                target=final_uris, snapshot_id=new_pl.get('snapshot_id'), label=f"mixer {playlist_name}")
+    return {"playlist_id": new_pl['id'], "url": new_pl['external_urls']['spotify'],
+            "name": playlist_name, "mode": strategy, "tracks": len(final_uris)}
+
 def feature_mixer():
     print("\n🍹 --- PARTY MIXER ---")
     print("Introduce las URLs de las playlists separadas por ESPACIO.")
@@ -141,63 +245,70 @@ def feature_mixer():
     
     playlist_ids = []
     for part in urls_input.split():
-        if "playlist/" in part:
-            playlist_ids.append(part.split("playlist/")[1].split("?")[0])
-        elif len(part) > 10:
-            playlist_ids.append(part)
+        try:
+            playlist_ids.append(playlist_id_from_url(part))
+        except CLIError:
+            pass
             
     if len(playlist_ids) < 2:
         print("⚠️ Necesitas al menos 2 playlists.")
         return
 
-    mode = input("👉 ¿Modo mezcla? (1=Normal [Seguidas], 2=Mix [Intercaladas]): ").strip()
+    strategies = list(STRATEGIES)
+    for i, name in enumerate(strategies, 1):
+        print(f"   {i}. {STRATEGY_LABELS[name]}")
+    mode = input("👉 ¿Modo mezcla? (Número, Enter = 1): ").strip()
+    try:
+        strategy = strategies[int(mode) - 1] if mode else "normal"
+    except (ValueError, IndexError):
+        strategy = "normal"
     playlist_name = input("👉 Nombre de la nueva playlist: ").strip()
-    if not playlist_name: playlist_name = f"Mixer {datetime.date.today()}"
 
-    all_tracks_lists = []
     print("⏳ Descargando canciones de las fuentes...")
-    
-    for pid in playlist_ids:
-        tracks = get_all_tracks_from_playlist(pid)
-        uris = [t['uri'] for t in tracks]
-        all_tracks_lists.append(uris)
-
-    final_uris = []
-    if mode == "2": # Mix
-        max_len = max(len(l) for l in all_tracks_lists)
-        for i in range(max_len):
-            for l in all_tracks_lists:
-                if i < len(l) and l[i] not in final_uris:
-                    final_uris.append(l[i])
-        desc_mode = "MIX"
-    else: # Normal
-        seen = set()
-        for l in all_tracks_lists:
-            for uri in l:
-                if uri not in seen:
-                    final_uris.append(uri)
-                    seen.add(uri)
-        desc_mode = "NORMAL"
-
-    if not final_uris:
-        print("❌ No se encontraron canciones válidas.")
-        return
-
-    print(f"💿 Total canciones únicas: {len(final_uris)}")
-    
     try:
-        new_pl = sp.user_playlist_create(sp_user_id, playlist_name, public=False, description=f"Generada con SpotiBOT CLI ({desc_mode})")
-        # Subir en lotes de 100
-        for i in range(0, len(final_uris), 100):
-            sp.playlist_add_items(new_pl['id'], final_uris[i:i+100])
-            print(f"   ...Subiendo lote {i//100 + 1}")
-        print(f"✅ ¡Lista creada! -> {new_pl['external_urls']['spotify']}")
+        with job_timer("mixer"):
+            res = create_mix(playlist_ids, strategy, playlist_name)
+        print(f"✅ ¡Lista creada! -> {res['url']}")
+    except CLIError as e:
+        print(f"❌ {e}")
     except Exception as e:
         print(f"❌ Error creando playlist: {e}")
 
 # ==========================================
 # 3. CREATOR / UPDATER
 # ==========================================
+def load_source_plan():
+    """playlists.txt validado y agrupado (cada fuente una vez con todos sus géneros)."""
+    try:
+        return load_plan(SOURCES_PATH)
+    except SourcesError as e:
+        raise CLIError(str(e))
+
+def plan_summary(plan):
+    return {
+        "genres": plan.source_map,
+        "planned_calls": plan.planned_calls(),
+        "errors": [f"línea {n}: {msg}" for n, msg in plan.errors],
+        "warnings": [f"línea {n}: {msg}" for n, msg in plan.warnings],
+    }
+
+def update_playlists(days=7, log=print):
+    plan = load_source_plan()
+    for line in plan.report():
+        log(line)
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - timedelta(days=days)
+    sp = get_sp()
+    result = run_updater(sp, get_user_id(), plan.source_map, cutoff, max_workers=FETCH_WORKERS, log=log,
+                         journal=get_journal())
+    return {
+        "added": dict(result['summary']),
+        "planned_calls": plan.planned_calls(),
+        "calls": result['calls'],
+        "calls_saved": result['calls_saved'],
+        "rate_limit": sp.stats(),
+        "http_cache": sp.http_cache.as_dict() if sp.http_cache else None,
+    }
+
 def feature_updater():
     print("\n🆕 --- ACTUALIZADOR DE PLAYLISTS ---")
     print("Este módulo lee 'playlists.txt' y busca novedades.")
@@ -208,150 +319,78 @@ def feature_updater():
     except:
         days = 7
 
-    if not os.path.exists("playlists.txt"):
-        print("❌ Error: No existe el archivo 'playlists.txt'.")
+    try:
+        with job_timer("updater"):
+            result = update_playlists(days)
+    except CLIError as e:
+        print(f"❌ Error: {e}")
         return
 
-    # Cargar playlists
-    source_map = {}
-    with open("playlists.txt", "r", encoding="utf-8") as f:
-        for line in f:
-            parts = line.strip().split(" ")
-            if len(parts) >= 2:
-                url, genre = parts[0], parts[1]
-                if "playlist/" in url:
-                    pid = url.split("playlist/")[1].split("?")[0]
-                    genre = genre.replace("&", "AND").replace("_", " ").upper()
-                    if genre not in source_map: source_map[genre] = []
-                    source_map[genre].append(pid)
-
-    global_tracks = load_txt_set("global_tracks.txt")
-    
-    print(f"🚀 Iniciando escaneo de {len(source_map)} géneros...")
-
-    for genre, pids in source_map.items():
-        print(f"\n📂 Procesando GÉNERO: {genre}")
-        
-        # 1. Obtener/Crear Playlist Destino
-        dest_name = f"{genre} {datetime.date.today().year}"
-        dest_id = None
-        
-        user_pls = sp.current_user_playlists(limit=50)
-        for pl in user_pls['items']:
-            if pl['name'] == dest_name:
-                dest_id = pl['id']
-                break
-        
-        if not dest_id:
-            print(f"   Creating new playlist: {dest_name}")
-            new_pl = sp.user_playlist_create(sp_user_id, dest_name, public=False)
-            dest_id = new_pl['id']
-            
-            img_path = f"images/{genre.lower().replace(' ', '_')}.jpg"
-            if os.path.exists(img_path):
-                try:
-                    with open(img_path, "rb") as img:
-                        sp.playlist_upload_cover_image(dest_id, base64.b64encode(img.read()))
-                except Exception as e: print(f"   Error imagen: {e}")
-
-        # 2. Buscar canciones
-        tracks_to_add = []
-        cutoff = datetime.datetime.now(datetime.timezone.utc) - timedelta(days=days)
-
-        for pid in pids:
-            local_file = f"data/{pid}_tracks.txt"
-            local_hist = load_txt_set(local_file)
-            new_local_hist = []
-
-            try:
-                res = sp.playlist_items(pid)
-                while res:
-                    for item in res['items']:
-                        if not item.get('track'): continue
-                        tid = item['track']['id']
-                        turi = item['track']['uri']
-                        
-                        try:
-                            added = datetime.datetime.strptime(item['added_at'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=datetime.timezone.utc)
-                        except:
-                            continue 
-
-                        if added >= cutoff:
-                            if tid not in local_hist and tid not in global_tracks:
-                                tracks_to_add.append(turi)
-                                global_tracks.add(tid)
-                                new_local_hist.append(tid)
-                    
-                    res = sp.next(res) if res['next'] else None
-                
-                if new_local_hist:
-                    save_txt_set(local_file, new_local_hist)
-
-            except Exception as e:
-                print(f"   Error leyendo fuente {pid}: {e}")
-
-        # 3. Guardar cambios
-        if tracks_to_add:
-            unique_uris = list(set(tracks_to_add))
-            print(f"   🔥 Agregando {len(unique_uris)} canciones nuevas...")
-            for i in range(0, len(unique_uris), 100):
-                sp.playlist_add_items(dest_id, unique_uris[i:i+100])
-            
-            new_ids = [u.split(":")[-1] for u in unique_uris]
-            save_txt_set("global_tracks.txt", new_ids)
-        else:
-            print("   💤 Sin novedades.")
+    print(f"\n📉 Lecturas de fuentes: {result['calls']} llamadas ({result['calls_saved']} ahorradas frente al escaneo completo)")
+    limits = result['rate_limit']
+    if limits['throttled']:
+        print(f"⏳ Spotify frenó {limits['throttled']} llamadas (429); {limits['wait_seconds']:.0f}s esperando")
+    if result['http_cache']:
+        http = result['http_cache']
+        print(f"💾 Caché HTTP: {http['not_modified']} respuestas sin cambios (304), {http['bytes_saved'] // 1024} KB sin descargar")
 
 # ==========================================
 # 4. SORT (ORDENAR)
 # ==========================================
+def sort_by_popularity(url):
+    """Reordena una playlist propia por popularidad."""
+    pid = playlist_id_from_url(url)
+    check_ownership(pid)
+    tracks = load_tracks(pid)
+    if not tracks:
+        raise CLIError("Playlist vacía.")
+
+    current_uris = [t.uri for t in tracks]
+    tracks.sort(key=lambda x: x.popularity, reverse=True)
+    sorted_uris = [t.uri for t in tracks]
+    # Solo se mueve lo necesario (o reemplazo completo si sale más barato)
+    res = rewrite_playlist(get_sp(), pid, current_uris, sorted_uris, journal=get_journal(), label="sort")
+    return {"playlist_id": pid, "tracks": len(sorted_uris), "mode": res['mode'], "calls": res['calls']}
+
 def feature_sort():
     print("\n⚠️ --- ORDENAR PLAYLIST (SORT) ---")
     print("Esto REORDENARÁ permanentemente una playlist TUYA por popularidad.")
     url = input("👉 URL de la playlist: ").strip()
     
-    try:
-        pid = url.split("playlist/")[1].split("?")[0]
-    except:
-        print("❌ URL inválida.")
-        return
-
-    if not verify_ownership(pid): return
-
     print("⏳ Descargando y analizando...")
-    tracks = get_all_tracks_from_playlist(pid)
-    
-    if not tracks:
-        print("❌ Playlist vacía.")
-        return
-        
-    tracks.sort(key=lambda x: x['popularity'], reverse=True)
-    sorted_uris = [t['uri'] for t in tracks]
-    
-    print(f"🔄 Reordenando {len(sorted_uris)} canciones...")
-    
     try:
-        # Primer lote reemplaza, siguientes añaden
-        sp.playlist_replace_items(pid, sorted_uris[:100])
-        if len(sorted_uris) > 100:
-            for i in range(100, len(sorted_uris), 100):
-                sp.playlist_add_items(pid, sorted_uris[i:i+100])
-                print(f"   ...Procesando lote {i//100 + 1}")
+        with job_timer("sort"):
+            res = sort_by_popularity(url)
+        print(f"   ...{res['calls']} llamadas de escritura ({'cambios mínimos' if res['mode'] == 'diff' else 'reemplazo completo'})")
         print("✅ ¡Hecho! Playlist ordenada.")
+    except CLIError as e:
+        print(f"❌ {e}")
     except Exception as e:
         print(f"❌ Error: {e}")
 
 # ==========================================
 # 5. TOP FILTER
 # ==========================================
+def keep_top(url, n):
+    """Deja en una playlist propia solo sus n canciones más populares."""
+    pid = playlist_id_from_url(url)
+    check_ownership(pid)
+    tracks = load_tracks(pid)
+    current_uris = [t.uri for t in tracks]
+    tracks.sort(key=lambda x: x.popularity, reverse=True)
+    top_uris = [t.uri for t in tracks[:n]]
+    res = rewrite_playlist(get_sp(), pid, current_uris, top_uris, journal=get_journal(), label=f"top {n}")
+    return {"playlist_id": pid, "tracks": len(top_uris), "removed": len(current_uris) - len(top_uris),
+            "mode": res['mode'], "calls": res['calls']}
+
 def feature_top_filter():
     print("\n✂️ --- FILTRAR TOP N ---")
     print("Esto MANTENDRÁ solo las mejores N canciones y BORRARÁ el resto.")
     url = input("👉 URL de la playlist: ").strip()
     
     try:
-        pid = url.split("playlist/")[1].split("?")[0]
-    except:
+        pid = playlist_id_from_url(url)
+    except CLIError:
         print("❌ URL inválida.")
         return
 
@@ -364,23 +403,182 @@ def feature_top_filter():
         return
 
     print("⏳ Procesando...")
-    tracks = get_all_tracks_from_playlist(pid)
-    tracks.sort(key=lambda x: x['popularity'], reverse=True)
-    
-    top_tracks = tracks[:n]
-    top_uris = [t['uri'] for t in top_tracks]
-    
-    print(f"🔄 Reduciendo playlist a {len(top_uris)} canciones...")
-    
     try:
-        sp.playlist_replace_items(pid, top_uris[:100])
-        if len(top_uris) > 100:
-            for i in range(100, len(top_uris), 100):
-                sp.playlist_add_items(pid, top_uris[i:i+100])
+        with job_timer("top"):
+            res = keep_top(pid, n)
+        print(f"   ...{res['calls']} llamadas de escritura ({'cambios mínimos' if res['mode'] == 'diff' else 'reemplazo completo'})")
         print("✅ ¡Hecho! Playlist filtrada.")
     except Exception as e:
         print(f"❌ Error: {e}")
 
+# ==========================================
+# MODO NO INTERACTIVO (cron, scripts)
+# ==========================================
+def build_parser(with_batch=True):
+    parser = argparse.ArgumentParser(
+        prog="cli_spotibot.py",
+        description="SpotiBOT CLI. Sin argumentos abre el menú interactivo.",
+    )
+    parser.add_argument("--format", choices=["ndjson", "json"], default="ndjson",
+                        help="ndjson: una línea por resultado según terminan; json: un array al final")
+    parser.add_argument("--metrics", metavar="FICHERO",
+                        help="al terminar, vuelca tiempos, llamadas a la API y cachés en JSON ('-' = stderr)")
+    sub = parser.add_subparsers(dest="command", required=not with_batch)
+
+    p = sub.add_parser("rank", help="ranking de popularidad")
+    p.add_argument("url")
+    p.add_argument("-n", "--limit", default="10", help="número de canciones o 'all'")
+
+    p = sub.add_parser("mixer", help="crea una playlist mezclando varias")
+    p.add_argument("urls", nargs="+")
+    p.add_argument("--mode", choices=list(STRATEGIES), default="normal")
+    p.add_argument("--name")
+
+    p = sub.add_parser("updater", help="añade las novedades de playlists.txt")
+    p.add_argument("--days", type=int, default=7)
+    p.add_argument("--plan", action="store_true", help="solo valida playlists.txt y muestra las llamadas previstas")
+
+    p = sub.add_parser("sort", help="ordena una playlist propia por popularidad")
+    p.add_argument("url")
+
+    p = sub.add_parser("top", help="deja solo las N canciones más populares")
+    p.add_argument("url")
+    p.add_argument("-n", type=int, required=True)
+
+    if with_batch:
+        p = sub.add_parser("batch", help="ejecuta un fichero de trabajos (uno por línea, misma sintaxis)")
+        p.add_argument("file", help="'-' para leer de la entrada estándar")
+        p.add_argument("--parallel", type=int, default=4, help="trabajos a la vez")
+    return parser
+
+# Trabajos que necesitan saber quién es el usuario
+NEEDS_PROFILE = {"mixer", "updater", "sort", "top"}
+
+def run_job(args):
+    if args.command == "rank":
+        limit = args.limit if args.limit == "all" else int(args.limit)
+        return [{"name": t.name, "artist": t.artist, "popularity": t.popularity, "uri": t.uri}
+                for t in rank_tracks(args.url, limit)]
+    if args.command == "mixer":
+        return create_mix([playlist_id_from_url(u) for u in args.urls], args.mode, args.name)
+    if args.command == "updater":
+        if args.plan:
+            return plan_summary(load_source_plan())
+        return update_playlists(args.days)
+    if args.command == "sort":
+        return sort_by_popularity(args.url)
+    if args.command == "top":
+        return keep_top(args.url, args.n)
+    raise CLIError(f"Comando desconocido: {args.command}")
+
+def read_batch_file(path, job_parser):
+    jobs = []
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    try:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                jobs.append((line, job_parser.parse_args(shlex.split(line))))
+            except SystemExit:
+                raise CLIError(f"{path}:{lineno}: trabajo no válido: {line}")
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    return jobs
+
+def run_jobs(jobs, parallel, fmt, out):
+    """Ejecuta los trabajos con un solo cliente compartido; devuelve el código de salida."""
+    # Autenticación y perfil una sola vez, antes de repartir los trabajos
+    # ('updater --plan' solo lee playlists.txt: no necesita Spotify)
+    online = [args for _, args in jobs if not (args.command == "updater" and args.plan)]
+    if online:
+        get_sp()
+        get_playlist_cache()
+    if any(args.command in NEEDS_PROFILE for args in online):
+        get_user_id()
+
+    results = [None] * len(jobs)
+    out_lock = threading.Lock()
+
+    def execute(i):
+        line, args = jobs[i]
+        record = {"job": i, "command": args.command, "args": line}
+        t0 = time.perf_counter()
+        try:
+            with job_timer(args.command):
+                record["result"] = run_job(args)
+            record["ok"] = True
+        except Exception as e:
+            record["ok"] = False
+            record["error"] = str(e)
+        record["seconds"] = round(time.perf_counter() - t0, 3)
+        results[i] = record
+        if fmt == "ndjson":
+            with out_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+        return record["ok"]
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as pool:
+        ok = all(list(pool.map(execute, range(len(jobs)))))
+    if fmt == "json":
+        json.dump(results, out, ensure_ascii=False, indent=2)
+        out.write("\n")
+    return 0 if ok else 1
+
+def register_gauges():
+    """Cachés para --metrics (como /stats en el bot); leerlas no crea el cliente ni la caché."""
+    METRICS.gauge("playlist_cache_hits", lambda: _playlist_cache.hits if _playlist_cache else 0)
+    METRICS.gauge("playlist_cache_misses", lambda: _playlist_cache.misses if _playlist_cache else 0)
+    for key in ("hit_ratio", "not_modified", "bytes_saved"):
+        METRICS.gauge(f"http_cache_{key}", lambda key=key: http_cache_stats().get(key, 0))
+
+def http_cache_stats():
+    return _sp.http_cache.as_dict() if _sp is not None and _sp.http_cache else {}
+
+def dump_metrics(path):
+    if path == "-":
+        print(METRICS.to_json(), file=sys.stderr)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(METRICS.to_json() + "\n")
+
+def batch_main(argv):
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        register_gauges()
+    if args.command is None:
+        # Solo opciones globales (p.ej. --metrics): menú interactivo
+        try:
+            main()
+        finally:
+            if args.metrics:
+                dump_metrics(args.metrics)
+        return 0
+    try:
+        return _run_batch(args, argv)
+    finally:
+        if args.metrics:
+            dump_metrics(args.metrics)
+
+def _run_batch(args, argv):
+    out = sys.stdout
+    # Los mensajes para humanos van a stderr; stdout queda solo para el JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            if args.command == "batch":
+                jobs = read_batch_file(args.file, build_parser(with_batch=False))
+                parallel = args.parallel
+            else:
+                jobs = [(shlex.join(argv), args)]
+                parallel = 1
+        except (CLIError, OSError) as e:
+            print(f"❌ {e}")
+            return 2
+        return run_jobs(jobs, parallel, args.format, out)
+
 # ==========================================
 # MAIN MENU
 # ==========================================
@@ -417,6 +615,9 @@ def main():
         input("\nPresiona ENTER para volver al menú...")
 
 if __name__ == "__main__":
+    # Con argumentos: modo no interactivo (ver --help)
+    if len(sys.argv) > 1:
+        sys.exit(batch_main(sys.argv[1:]))
     # Pequeño hack para limpiar pantalla al inicio
     os.system('cls' if os.name == 'nt' else 'clear')
     main()
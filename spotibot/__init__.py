@@ -0,0 +1 @@
+"""Piezas compartidas por bot_spotibot.py y cli_spotibot.py."""
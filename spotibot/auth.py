@@ -0,0 +1,95 @@
+"""Token de Spotify en memoria y renovado en un solo sitio.
+
+Con el CacheFileHandler de spotipy cada petición a la API vuelve a leer
+token_cache.json, y si el token caduca con varios hilos descargando, cada
+uno lo renueva por su cuenta y escribe el fichero a la vez que los demás.
+
+Aquí el token se lee del disco una vez, se guarda solo cuando cambia
+(escritura atómica) y la renovación la hace un único hilo, un poco antes
+de que caduque; el resto espera y usa el token nuevo.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from spotipy.cache_handler import CacheHandler
+from spotipy.oauth2 import SpotifyOAuth
+
+from spotibot.cache import atomic_write
+
+logger = logging.getLogger(__name__)
+
+TOKEN_CACHE_PATH = "token_cache.json"
+# Se renueva el token cuando le quedan menos de estos segundos
+REFRESH_MARGIN = 300
+
+
+class MemoryTokenCache(CacheHandler):
+    def __init__(self, path=TOKEN_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._token = None
+        self.disk_reads = 0
+        self.disk_writes = 0
+
+    def get_cached_token(self):
+        with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self._token = json.load(f)
+                    self.disk_reads += 1
+                except (OSError, ValueError):
+                    self._token = None
+            return dict(self._token) if self._token else None
+
+    def save_token_to_cache(self, token_info):
+        with self._lock:
+            self._loaded = True
+            if token_info == self._token:
+                return
+            self._token = dict(token_info)
+            try:
+                atomic_write(self.path, json.dumps(token_info).encode())
+                os.chmod(self.path, 0o600)
+                self.disk_writes += 1
+            except OSError as e:
+                logger.warning(f"No se pudo guardar el token en {self.path}: {e}")
+
+
+class SharedRefreshOAuth(SpotifyOAuth):
+    """SpotifyOAuth que renueva por adelantado y con un solo hilo a la vez."""
+
+    def __init__(self, *args, refresh_margin=REFRESH_MARGIN, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.refresh_margin = refresh_margin
+        self._refresh_lock = threading.Lock()
+        self.refreshes = 0
+
+    def is_token_expired(self, token_info):
+        return token_info["expires_at"] - int(time.time()) < self.refresh_margin
+
+    def refresh_access_token(self, refresh_token):
+        with self._refresh_lock:
+            # Si otro hilo lo ha renovado mientras esperábamos, vale ese
+            current = self.cache_handler.get_cached_token()
+            if current and not self.is_token_expired(current):
+                return current
+            self.refreshes += 1
+            return super().refresh_access_token(refresh_token)
+
+
+def make_auth_manager(client_id, client_secret, redirect_uri, scope, token_path=TOKEN_CACHE_PATH):
+    # open_browser=False: en servidores sin navegador se pega la URL a mano
+    return SharedRefreshOAuth(
+        client_id=client_id,
+        client_secret=client_secret,
+        redirect_uri=redirect_uri,
+        scope=scope,
+        cache_handler=MemoryTokenCache(token_path),
+        open_browser=False,
+    )
@@ -0,0 +1,232 @@
+"""Caché persistente de playlists validada por snapshot_id.
+
+Spotify cambia el snapshot_id de una playlist cada vez que se modifica,
+así que con una petición barata (fields=snapshot_id) sabemos si la copia
+local sigue valiendo y nos ahorramos toda la paginación.
+"""
+import atexit
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+
+from spotibot.records import PROJECTION_ATTRS, TrackRecord
+
+
+# Almacenes abiertos: sus índices se guardan al salir del proceso
+_open_stores = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_stores():
+    for store in list(_open_stores):
+        store.flush()
+
+
+def atomic_write(path, data):
+    tmp = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class DiskLRU:
+    """Almacén clave -> bytes en disco, acotado en bytes y con expulsión LRU.
+
+    El orden LRU vive en memoria (OrderedDict); index.json solo se reescribe
+    cada FLUSH_SECONDS como mucho, con flush() y al salir del proceso. Si el
+    proceso muere antes, los ficheros que faltan en el índice se recuperan
+    al abrirlo (ver _find_orphans) y siguen contando para el presupuesto.
+    """
+
+    FLUSH_SECONDS = 5.0
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index_path = os.path.join(directory, "index.json")
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._index = self._load_index()
+        self._orphans = self._find_orphans()
+        self._total = sum(self._index.values()) + sum(self._orphans.values())
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        # Por si max_bytes ha bajado desde la última ejecución
+        with self._lock:
+            self._evict()
+            self._save_index()
+        _open_stores.add(self)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return collections.OrderedDict()
+        # Índices antiguos: {clave: {"size", "atime"}} sin orden
+        entries = sorted(raw.items(), key=lambda kv: kv[1].get("atime", 0)) \
+            if any("atime" in e for e in raw.values()) else raw.items()
+        return collections.OrderedDict((key, entry["size"]) for key, entry in entries)
+
+    def _find_orphans(self):
+        """Ficheros que no están en el índice (de otra instancia o de una caída).
+
+        No se borran: pueden ser de otro proceso que aún no ha guardado su
+        índice. Cuentan para el presupuesto y son los primeros en salir.
+        """
+        known = {os.path.basename(self._path(key)) for key in self._index}
+        orphans = collections.OrderedDict()
+        for name in os.listdir(self.directory):
+            # Los .tmp pueden ser de un atomic_write de otro proceso a medias
+            if name == "index.json" or ".tmp." in name or name in known:
+                continue
+            try:
+                orphans[name] = os.path.getsize(os.path.join(self.directory, name))
+            except OSError:
+                pass
+        return orphans
+
+    def _save_index(self):
+        # Del menos al más usado: el orden del JSON es el orden LRU
+        data = {key: {"size": size} for key, size in self._index.items()}
+        atomic_write(self._index_path, json.dumps(data).encode())
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def _touch(self):
+        """Marca el índice como cambiado y lo guarda si hace rato que no se guarda."""
+        self._dirty = True
+        if time.monotonic() - self._saved_at >= self.FLUSH_SECONDS:
+            self._save_index()
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    @property
+    def total_bytes(self):
+        return self._total
+
+    def _adopt(self, key):
+        """Mete en el índice el fichero huérfano de 'key', si lo hay."""
+        size = self._orphans.pop(os.path.basename(self._path(key)), None)
+        if size is not None:
+            self._index[key] = size
+        return size is not None
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._index and not self._adopt(key):
+                return None
+            self._index.move_to_end(key)
+            self._touch()
+        # La lectura va fuera del candado: los GET en paralelo no se esperan
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            with self._lock:
+                self._drop(key)
+            return None
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        atomic_write(self._path(key), data)
+        with self._lock:
+            self._adopt(key)
+            self._total -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total += len(data)
+            self._evict()
+            self._touch()
+
+    def delete(self, key):
+        with self._lock:
+            self._adopt(key)
+            if self._drop(key):
+                self._remove_file(key)
+
+    def _drop(self, key):
+        size = self._index.pop(key, None)
+        if size is None:
+            return False
+        self._total -= size
+        self._touch()
+        return True
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self._total > self.max_bytes and self._orphans:
+            name, size = self._orphans.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+        while self._total > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            self._remove_file(key)
+            self._dirty = True
+
+
+def _playlist_key(playlist_id):
+    if "playlist/" in playlist_id:
+        return playlist_id.split("playlist/")[1].split("?")[0]
+    return playlist_id
+
+
+class PlaylistCache:
+    """Contenido de playlists (como TrackRecord) indexado por id + proyección.
+
+    Una entrada sirve si su snapshot_id coincide con el actual y su
+    proyección cubre los atributos pedidos: tras un /rank, el /sort de la
+    misma playlist se sirve de la copia de /rank.
+    """
+
+    def __init__(self, directory="cache/playlists", max_bytes=200 * 1024 * 1024, max_age=24 * 3600):
+        self.store = DiskLRU(directory, max_bytes)
+        # La popularidad cambia sin que cambie el snapshot_id
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, playlist_id, snapshot_id, fields):
+        pid = _playlist_key(playlist_id)
+        wanted = PROJECTION_ATTRS.get(fields)
+        candidates = [fields] + [f for f, attrs in PROJECTION_ATTRS.items()
+                                 if f != fields and wanted is not None and wanted <= attrs]
+        for candidate in candidates:
+            data = self.store.get(f"{pid}|{candidate}")
+            if data is None:
+                continue
+            entry = json.loads(data)
+            if entry["snapshot_id"] != snapshot_id or time.time() - entry["stored_at"] > self.max_age:
+                continue
+            self.hits += 1
+            return [TrackRecord.from_row(row) for row in entry["records"]]
+        self.misses += 1
+        return None
+
+    def put(self, playlist_id, snapshot_id, fields, records):
+        entry = {
+            "snapshot_id": snapshot_id,
+            "stored_at": time.time(),
+            "records": [r.to_row() for r in records],
+        }
+        data = json.dumps(entry, separators=(",", ":")).encode()
+        self.store.put(f"{_playlist_key(playlist_id)}|{fields}", data)
@@ -0,0 +1,93 @@
+"""Salida de trabajos largos hacia Telegram.
+
+ThrottledEditor deja que un trabajo (que corre en un hilo del pool) vaya
+editando un único mensaje con su progreso sin pasarse del ritmo de
+ediciones que tolera Telegram por chat. split_message trocea textos
+largos por líneas y Attachment representa un fichero a enviar.
+"""
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Límite de Telegram: 4096 caracteres por mensaje (dejamos margen)
+MESSAGE_LIMIT = 4000
+
+
+class Attachment:
+    """Documento que run_job envía con reply_document."""
+
+    def __init__(self, filename, data, caption=None):
+        self.filename = filename
+        self.data = data
+        self.caption = caption
+
+
+def split_message(text, limit=MESSAGE_LIMIT):
+    """Trocea 'text' en mensajes de como mucho 'limit' caracteres sin partir líneas."""
+    chunks, current, size = [], [], 0
+    for line in text.split("\n"):
+        # Una línea sola más larga que el límite no tiene más remedio que partirse
+        while len(line) > limit:
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            chunks.append(line[:limit])
+            line = line[limit:]
+        extra = len(line) + (1 if current else 0)
+        if size + extra > limit:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+            extra = len(line)
+        current.append(line)
+        size += extra
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class ThrottledEditor:
+    """Edita 'message' como mucho una vez cada 'min_interval' segundos.
+
+    update() se llama desde el hilo del trabajo (nunca desde el bucle): la
+    edición se programa en el bucle del bot. Si hay una edición en curso o
+    es demasiado pronto, el texto se descarta (salvo force=True, que espera
+    a que termine la anterior).
+    """
+
+    def __init__(self, message, loop, min_interval=2.0):
+        self.message = message
+        self.loop = loop
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._last_at = 0.0
+        self._last_text = None
+        self._pending = None
+        self.edits = 0
+
+    async def _edit(self, text):
+        try:
+            await self.message.edit_text(text)
+        except Exception as e:
+            # "message is not modified", mensaje borrado, flood control...
+            logger.debug(f"No se pudo editar el progreso: {e}")
+
+    def update(self, text, force=False):
+        with self._lock:
+            if text == self._last_text:
+                return
+            now = time.monotonic()
+            busy = self._pending is not None and not self._pending.done()
+            if not force and (busy or now - self._last_at < self.min_interval):
+                return
+            if force and busy:
+                try:
+                    self._pending.result(timeout=10)
+                except Exception:
+                    pass
+            self._last_at = now
+            self._last_text = text
+            self.edits += 1
+            self._pending = asyncio.run_coroutine_threadsafe(self._edit(text), self.loop)
@@ -0,0 +1,198 @@
+"""Portadas de las playlists del actualizador (images/<genero>.jpg).
+
+Spotify rechaza las portadas cuyo JPEG en base64 pasa de 256 KB. Antes de
+subirlas se comprueban y, si no caben (o no son JPEG), se vuelven a
+codificar con menos calidad y, si hace falta, más pequeñas. Para eso hace
+falta Pillow (opcional): sin él las portadas que ya caben se suben igual y
+las demás se avisan y se saltan.
+
+El base64 resultante se guarda en disco con la ruta y el mtime del fichero
+como clave, así que cada imagen se procesa una sola vez mientras no cambie.
+Las subidas van en un hilo aparte: crear la playlist y añadirle canciones
+no espera a la portada.
+"""
+import base64
+import io
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as wait_all
+
+from spotibot.cache import DiskLRU
+from spotibot.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+COVER_DIR = "images"
+COVER_CACHE_DIR = "cache/covers"
+# Límite de Spotify para el cuerpo de la petición (el JPEG ya en base64)
+COVER_MAX_BYTES = 256 * 1024
+
+# Calidades que se prueban antes de reducir el tamaño de la imagen
+QUALITIES = (90, 80, 70, 60, 50)
+MIN_SIDE = 64
+
+
+class CoverError(Exception):
+    """La portada no se puede subir (no existe, no es una imagen o no cabe)."""
+
+
+def cover_path(genre, directory=COVER_DIR):
+    return os.path.join(directory, f"{genre.lower().replace(' ', '_')}.jpg")
+
+
+def encoded_size(n):
+    """Bytes que ocupan 'n' bytes en base64."""
+    return 4 * math.ceil(n / 3)
+
+
+def is_jpeg(data):
+    return data[:3] == b"\xff\xd8\xff"
+
+
+def fit_jpeg(data, max_bytes=COVER_MAX_BYTES):
+    """Vuelve a codificar la imagen como JPEG hasta que su base64 quepa en max_bytes."""
+    try:
+        from PIL import Image
+    except ImportError:
+        raise CoverError("hay que convertirla o reducirla y Pillow no está instalado (pip install Pillow)")
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.load()
+    except Exception as e:
+        raise CoverError(f"no es una imagen válida ({e})")
+    img = img.convert("RGB")
+    while True:
+        for quality in QUALITIES:
+            buf = io.BytesIO()
+            img.save(buf, "JPEG", quality=quality, optimize=True)
+            if encoded_size(buf.tell()) <= max_bytes:
+                return buf.getvalue()
+        width, height = img.size
+        if min(width, height) <= MIN_SIDE:
+            raise CoverError("no cabe en el límite ni reducida al mínimo")
+        img = img.resize((max(MIN_SIDE, int(width * 0.75)), max(MIN_SIDE, int(height * 0.75))), Image.LANCZOS)
+
+
+class CoverStore:
+    """Portadas listas para subir (base64 de un JPEG que cabe), en caché por ruta+mtime."""
+
+    def __init__(self, cache_dir=COVER_CACHE_DIR, max_cache_bytes=20 * 1024 * 1024, max_bytes=COVER_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._disk = DiskLRU(cache_dir, max_cache_bytes) if cache_dir else None
+        self._memory = {}
+        self._lock = threading.Lock()
+        self.reencoded = 0
+
+    def _key(self, path):
+        st = os.stat(path)
+        return f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{self.max_bytes}"
+
+    def payload(self, path):
+        """base64 listo para playlist_upload_cover_image; CoverError si no se puede."""
+        try:
+            key = self._key(path)
+        except OSError:
+            raise CoverError(f"no existe {path}")
+        with self._lock:
+            cached = self._memory.get(key)
+        if cached is None and self._disk is not None:
+            cached = self._disk.get(key)
+        if cached is not None:
+            return cached
+
+        with open(path, "rb") as f:
+            data = f.read()
+        if not is_jpeg(data) or encoded_size(len(data)) > self.max_bytes:
+            original = len(data)
+            data = fit_jpeg(data, self.max_bytes)
+            self.reencoded += 1
+            METRICS.inc("covers_reencoded_total")
+            logger.info(f"Portada {path}: {original // 1024} KB -> {len(data) // 1024} KB")
+        payload = base64.b64encode(data)
+        with self._lock:
+            self._memory[key] = payload
+        if self._disk is not None:
+            self._disk.put(key, payload)
+        return payload
+
+    def check(self, paths):
+        """{ruta: problema} de las portadas que no se podrían subir."""
+        problems = {}
+        for path in paths:
+            try:
+                self.payload(path)
+            except (CoverError, OSError) as e:
+                problems[path] = str(e)
+        return problems
+
+
+def check_covers(directory=COVER_DIR, store=None):
+    """Revisa (y deja preparadas) todas las portadas .jpg de 'directory'."""
+    if not os.path.isdir(directory):
+        return {}
+    store = store or CoverStore()
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                   if name.lower().endswith(".jpg"))
+    return store.check(paths)
+
+
+class CoverUploader:
+    """Prepara y sube portadas en segundo plano.
+
+    upload() devuelve un Future enseguida; los fallos se registran en el
+    log y en las métricas pero nunca llegan a quien creó la playlist.
+    """
+
+    def __init__(self, store=None, max_workers=1):
+        self.store = store or CoverStore()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="spotibot-covers")
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def _submit(self, fn, *args):
+        future = self._pool.submit(fn, *args)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def prepare(self, paths, log=None):
+        """Procesa ya las portadas que existan para que la subida no tenga que hacerlo."""
+        def run():
+            problems = self.store.check(p for p in paths if os.path.exists(p))
+            for path, problem in problems.items():
+                logger.warning(f"Portada {path}: {problem}")
+                if log:
+                    log(f"   ⚠️ Portada {path}: {problem}")
+            return problems
+        return self._submit(run)
+
+    def upload(self, sp, playlist_id, path, log=None):
+        def run():
+            try:
+                sp.playlist_upload_cover_image(playlist_id, self.store.payload(path))
+            except Exception as e:
+                METRICS.inc("cover_errors_total")
+                logger.warning(f"Portada {path} en {playlist_id}: {e}")
+                if log:
+                    log(f"   ⚠️ Error imagen ({path}): {e}")
+                return False
+            METRICS.inc("covers_uploaded_total")
+            return True
+        return self._submit(run)
+
+    def wait(self):
+        """Espera a las subidas en curso (p.ej. antes de que salga la CLI)."""
+        with self._lock:
+            futures = list(self._futures)
+        wait_all(futures)
+
+    def close(self, wait=True):
+        self._pool.shutdown(wait=wait)
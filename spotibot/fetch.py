@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from spotibot.records import TrackRecord, URI_FIELDS
+
+# Máximo que admite la API de Spotify en /playlists/{id}/tracks
+PAGE_SIZE = 100
+# Peticiones simultáneas por defecto al descargar una playlist
+DEFAULT_WORKERS = 8
+
+
+def page_offsets(total, page_size=PAGE_SIZE, start=PAGE_SIZE):
+    """Offsets de las páginas que faltan tras la primera."""
+    return list(range(start, total, page_size))
+
+
+def fetch_playlist_items(sp, playlist_id, max_workers=DEFAULT_WORKERS, fields=None):
+    """Descarga todos los items de una playlist en paralelo.
+
+    La primera página trae el 'total', con él se calculan los offsets
+    restantes y se piden en un pool acotado a 'max_workers'. El resultado
+    conserva el mismo orden que la paginación secuencial con sp.next().
+    """
+    first = sp.playlist_items(playlist_id, fields=fields, limit=PAGE_SIZE, offset=0)
+    items = list(first['items'])
+    total = first.get('total') or 0
+    offsets = page_offsets(total)
+    if not offsets:
+        return items
+
+    def fetch_page(offset):
+        return sp.playlist_items(playlist_id, fields=fields, limit=PAGE_SIZE, offset=offset)['items']
+
+    if max_workers <= 1:
+        for offset in offsets:
+            items.extend(fetch_page(offset))
+        return items
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # map() devuelve los resultados en el orden de los offsets
+        for page in pool.map(fetch_page, offsets):
+            items.extend(page)
+    return items
+
+
+def iter_playlist_pages(sp, playlist_id, max_workers=DEFAULT_WORKERS, fields=None):
+    """Como fetch_playlist_items, pero entrega cada página según llega.
+
+    Genera tuplas (offset, total, items); las páginas pueden llegar
+    desordenadas, el offset dice dónde va cada una.
+    """
+    first = sp.playlist_items(playlist_id, fields=fields, limit=PAGE_SIZE, offset=0)
+    total = first.get('total') or 0
+    yield 0, total, first['items']
+
+    def fetch_page(offset):
+        return sp.playlist_items(playlist_id, fields=fields, limit=PAGE_SIZE, offset=offset)['items']
+
+    offsets = page_offsets(total)
+    if max_workers <= 1:
+        for offset in offsets:
+            yield offset, total, fetch_page(offset)
+        return
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fetch_page, offset): offset for offset in offsets}
+        for future in as_completed(futures):
+            yield futures[future], total, future.result()
+
+
+def fetch_playlist_tracks(sp, playlist_id, max_workers=DEFAULT_WORKERS, fields=URI_FIELDS, cache=None):
+    """Descarga la playlist y devuelve TrackRecord solo de los tracks válidos.
+
+    Con 'cache' (PlaylistCache) se hace antes una consulta fields=snapshot_id
+    y, si la playlist no ha cambiado, se sirve la copia local sin paginar.
+    """
+    snapshot_id = None
+    if cache is not None:
+        snapshot_id = sp.playlist(playlist_id, fields="snapshot_id")['snapshot_id']
+        cached = cache.get(playlist_id, snapshot_id, fields)
+        if cached is not None:
+            return cached
+
+    items = fetch_playlist_items(sp, playlist_id, max_workers=max_workers, fields=fields)
+    tracks = [TrackRecord.from_item(item) for item in items if item.get('track')]
+    if cache is not None:
+        cache.put(playlist_id, snapshot_id, fields, tracks)
+    return tracks
@@ -0,0 +1,80 @@
+"""Caché HTTP con peticiones condicionales (ETag / If-None-Match).
+
+Se monta como adaptador de la sesión de requests que usa spotipy. Las
+respuestas GET de playlists que traen ETag se guardan en disco; la
+siguiente vez se pide con If-None-Match y, si Spotify contesta 304, el
+cuerpo se sirve de la copia local sin volver a descargarlo.
+
+La caché es por cuenta: las respuestas de /me/... dependen del usuario.
+"""
+import re
+import threading
+
+from requests.adapters import HTTPAdapter
+
+from spotibot.cache import DiskLRU
+
+# Lecturas que merece la pena revalidar en vez de descargar enteras
+CACHEABLE = re.compile(r"/v1/(playlists/[^/?]+(/tracks|/items)?|me/playlists|users/[^/]+/playlists)(\?|$)")
+
+
+class HTTPCacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.not_modified = 0  # 304: servido de disco
+        self.changed = 0       # había copia pero el recurso cambió
+        self.misses = 0        # sin copia
+        self.bytes_saved = 0
+
+    def add(self, name, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self):
+        with self._lock:
+            lookups = self.not_modified + self.changed + self.misses
+            return {
+                "not_modified": self.not_modified,
+                "changed": self.changed,
+                "misses": self.misses,
+                "hit_ratio": round(self.not_modified / lookups, 3) if lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+            }
+
+
+class ConditionalCacheAdapter(HTTPAdapter):
+    def __init__(self, directory="cache/http", max_bytes=100 * 1024 * 1024, **kwargs):
+        super().__init__(**kwargs)
+        self.store = DiskLRU(directory, max_bytes)
+        self.stats = HTTPCacheStats()
+
+    def send(self, request, **kwargs):
+        if request.method != "GET" or kwargs.get("stream") or not CACHEABLE.search(request.url):
+            return super().send(request, **kwargs)
+
+        key = request.url
+        cached = self.store.get(key)
+        etag = body = None
+        if cached is not None:
+            etag, _, body = cached.partition(b"\n")
+            request.headers["If-None-Match"] = etag.decode()
+
+        response = super().send(request, **kwargs)
+        if response.status_code == 304 and body is not None:
+            self.stats.add("not_modified")
+            self.stats.add("bytes_saved", len(body))
+            response.status_code = 200
+            response.reason = "OK"
+            response._content = body
+            response._content_consumed = True
+            response.encoding = "utf-8"
+            response.headers["Content-Type"] = "application/json; charset=utf-8"
+            return response
+
+        self.stats.add("misses" if cached is None else "changed")
+        new_etag = response.headers.get("ETag")
+        if response.status_code == 200 and new_etag and "\n" not in new_etag:
+            self.store.put(key, new_etag.encode() + b"\n" + response.content)
+        elif cached is not None:
+            self.store.delete(key)
+        return response
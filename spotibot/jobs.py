@@ -0,0 +1,99 @@
+"""Cola de trabajos para el bot de Telegram.
+
+Las llamadas a spotipy son síncronas; si se hacen dentro de un handler
+async bloquean el bucle de eventos y el bot deja de responder a todo el
+mundo. Aquí cada trabajo se ejecuta en un pool de hilos, con una cola FIFO
+por usuario (sus trabajos van de uno en uno y en orden) y un límite global
+de trabajos simultáneos.
+
+Como cada usuario tiene como mucho un trabajo esperando plaza en el límite
+global, las plazas se reparten por turnos: quien encola veinte trabajos no
+deja sin turno a los demás. Con max_pending además se le cierra la cola.
+"""
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from spotibot.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """El usuario ya tiene max_pending trabajos en cola."""
+
+
+class JobManager:
+    def __init__(self, max_workers=4, max_pending=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="spotibot-job")
+        self._limit = None  # asyncio.Semaphore, se crea ya dentro del bucle
+        self._locks = {}
+        self._pending = {}
+        self._running = {}
+
+    def queue_depth(self, user_id=None):
+        """Trabajos esperando (de un usuario o de todos)."""
+        if user_id is not None:
+            return len(self._pending.get(user_id, ()))
+        return sum(len(p) for p in self._pending.values())
+
+    def running(self, user_id=None):
+        if user_id is not None:
+            return self._running.get(user_id)
+        return [label for label in self._running.values() if label]
+
+    def submit(self, user_id, label, func, *args, on_done=None, on_error=None):
+        """Encola func(*args) para el usuario; on_done/on_error son corrutinas."""
+        if self.max_pending is not None and self.queue_depth(user_id) >= self.max_pending:
+            raise QueueFull(user_id)
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_workers)
+        task = asyncio.get_running_loop().create_task(
+            self._run(user_id, label, functools.partial(func, *args), on_done, on_error)
+        )
+        self._pending.setdefault(user_id, set()).add(task)
+        return task
+
+    async def _run(self, user_id, label, call, on_done, on_error):
+        task = asyncio.current_task()
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        queued_at = time.perf_counter()
+        try:
+            async with lock:
+                async with self._limit:
+                    self._pending[user_id].discard(task)
+                    self._running[user_id] = label
+                    started = time.perf_counter()
+                    METRICS.observe("job_queue_seconds", started - queued_at, command=label)
+                    try:
+                        result = await asyncio.get_running_loop().run_in_executor(self.executor, call)
+                    finally:
+                        self._running[user_id] = None
+                        METRICS.observe("job_seconds", time.perf_counter() - started, command=label)
+        except asyncio.CancelledError:
+            logger.info(f"Trabajo '{label}' de {user_id} cancelado")
+            raise
+        except Exception as e:
+            logger.error(f"Trabajo '{label}' de {user_id}: {e}")
+            METRICS.inc("job_errors_total", command=label)
+            if on_error:
+                await on_error(e)
+            return
+        finally:
+            self._pending.get(user_id, set()).discard(task)
+        if on_done:
+            await on_done(result)
+
+    def cancel_pending(self, user_id):
+        """Descarta los trabajos en cola del usuario (el que ya corre sigue)."""
+        pending = self._pending.pop(user_id, set())
+        for task in pending:
+            task.cancel()
+        return len(pending)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,271 @@
+"""Diario de escrituras en playlists (write-ahead log).
+
+Crear una mezcla, reemplazar una playlist en /sort o /top o añadir las
+novedades del actualizador son varias llamadas seguidas; si el proceso
+muere a mitad, la playlist queda a medias. Antes de la primera llamada se
+apunta en el diario la operación completa (los pasos y, si se conoce, el
+contenido final) y tras cada paso su snapshot_id. Al volver a arrancar,
+resume_pending() termina lo que quedó pendiente desde el último paso
+confirmado, sin volver a leer las fuentes.
+
+Si el proceso murió justo después de que Spotify aplicara un paso pero
+antes de apuntarlo, el snapshot_id de la playlist ya no coincide con el
+último confirmado: un 'add' se da por hecho si la cola de la playlist es
+ese lote, y si no, cuando se conoce el contenido final, se reemplaza la
+playlist entera (el reemplazo se puede repetir sin riesgo).
+
+El fichero es JSONL con fsync tras cada línea y se vacía cuando no queda
+nada pendiente.
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+
+from spotibot.cache import atomic_write
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PATH = "write_journal.jsonl"
+BATCH = 100
+
+
+def batches(uris, size=BATCH):
+    return [list(uris[i:i + size]) for i in range(0, len(uris), size)]
+
+
+def replace_steps(uris):
+    """Pasos para dejar la playlist exactamente con 'uris'."""
+    chunks = batches(uris) or [[]]
+    return [('replace', chunks[0])] + [('add', chunk) for chunk in chunks[1:]]
+
+
+class Operation:
+    """Escritura de varios pasos sobre una playlist.
+
+    steps: ('replace', uris) | ('add', uris) | ('remove', items) |
+    ('reorder', range_start, insert_before, range_length)
+    """
+
+    def __init__(self, journal, op_id, playlist_id, steps, target=None, snapshot_id=None, meta=None):
+        self.journal = journal
+        self.id = op_id
+        self.playlist_id = playlist_id
+        self.steps = [tuple(step) for step in steps]
+        self.target = target
+        self.snapshot_id = snapshot_id
+        self.meta = meta or {}
+        self.acked = 0
+        self.finished = False
+        self.claimed = False
+
+    def ack(self, snapshot_id):
+        """Paso siguiente confirmado por Spotify."""
+        self.snapshot_id = snapshot_id
+        self.acked += 1
+        if self.journal:
+            self.journal._append({"op": self.id, "event": "ack", "step": self.acked, "snapshot_id": snapshot_id})
+
+    def done(self):
+        if self.finished:
+            return
+        self.finished = True
+        if self.journal:
+            self.journal._finish(self)
+
+
+class WriteJournal:
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ops = {}
+        self._file = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Línea a medio escribir: el proceso murió ahí
+                    continue
+                op = self._ops.get(record["op"])
+                if record["event"] == "begin":
+                    self._ops[record["op"]] = Operation(self, record["op"], record["playlist"], record["steps"],
+                                                        record.get("target"), record.get("snapshot_id"),
+                                                        record.get("meta"))
+                elif op is not None and record["event"] == "ack":
+                    op.acked, op.snapshot_id = record["step"], record["snapshot_id"]
+                elif op is not None and record["event"] == "done":
+                    del self._ops[record["op"]]
+        # Se reescribe solo con lo pendiente para que no crezca sin límite
+        lines = []
+        for op in self._ops.values():
+            lines.append(self._begin_record(op))
+            if op.acked:
+                lines.append({"op": op.id, "event": "ack", "step": op.acked, "snapshot_id": op.snapshot_id})
+        atomic_write(self.path, "".join(json.dumps(r) + "\n" for r in lines).encode())
+        if self._ops:
+            logger.info(f"Diario {self.path}: {len(self._ops)} escrituras pendientes")
+
+    @staticmethod
+    def _begin_record(op):
+        return {"op": op.id, "event": "begin", "playlist": op.playlist_id, "steps": op.steps,
+                "target": op.target, "snapshot_id": op.snapshot_id, "meta": op.meta}
+
+    def _write(self, record):
+        """Escribe una línea con fsync; hay que llamarla con self._lock cogido."""
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _append(self, record):
+        with self._lock:
+            self._write(record)
+
+    def _finish(self, op):
+        # Todo con el candado: si no, otro hilo podría vaciar el fichero
+        # justo después de que begin() apunte una operación nueva
+        with self._lock:
+            self._write({"op": op.id, "event": "done"})
+            self._ops.pop(op.id, None)
+            if not self._ops:
+                self._file.truncate(0)
+
+    def begin(self, playlist_id, steps, target=None, snapshot_id=None, **meta):
+        """Apunta una operación antes de empezarla (queda reservada para quien la lanza)."""
+        op = Operation(self, uuid.uuid4().hex, playlist_id, steps, target, snapshot_id, meta)
+        op.claimed = True
+        with self._lock:
+            self._write(self._begin_record(op))
+            self._ops[op.id] = op
+        return op
+
+    def pending(self):
+        with self._lock:
+            return [op for op in self._ops.values() if not op.claimed]
+
+    def claim_pending(self):
+        """Las operaciones pendientes que nadie está ejecutando ya."""
+        with self._lock:
+            ops = [op for op in self._ops.values() if not op.claimed]
+            for op in ops:
+                op.claimed = True
+            return ops
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _apply(sp, playlist_id, step, snapshot_id):
+    kind = step[0]
+    if kind == 'replace':
+        return sp.playlist_replace_items(playlist_id, step[1])
+    if kind == 'add':
+        return sp.playlist_add_items(playlist_id, step[1])
+    if kind == 'remove':
+        return sp.playlist_remove_specific_occurrences_of_items(playlist_id, step[1], snapshot_id=snapshot_id)
+    _, start, insert_before, length = step
+    return sp.playlist_reorder_items(playlist_id, start, insert_before, range_length=length, snapshot_id=snapshot_id)
+
+
+def _is_permanent(error):
+    """Errores que no se arreglan reintentando (permisos, playlist borrada...)."""
+    status = getattr(error, "http_status", None)
+    return status is not None and 400 <= status < 500 and status != 429
+
+
+def run_operation(sp, op, on_done=None):
+    """Ejecuta los pasos que falten; on_done(op) va antes de cerrarla en el diario.
+
+    Si falla por algo pasajero la operación queda pendiente para el
+    siguiente resume_pending(); si Spotify la rechaza, se abandona.
+    """
+    try:
+        for step in op.steps[op.acked:]:
+            res = _apply(sp, op.playlist_id, step, op.snapshot_id)
+            op.ack((res or {}).get('snapshot_id'))
+    except Exception as e:
+        if _is_permanent(e):
+            op.done()
+        else:
+            op.claimed = False
+        raise
+    if on_done:
+        on_done(op)
+    op.done()
+
+
+def write_steps(sp, playlist_id, steps, journal=None, target=None, snapshot_id=None, on_done=None, **meta):
+    """Ejecuta 'steps' sobre la playlist, pasando por el diario si lo hay."""
+    if journal is None:
+        op = Operation(None, None, playlist_id, steps, target, snapshot_id, meta)
+    else:
+        op = journal.begin(playlist_id, steps, target=target, snapshot_id=snapshot_id, **meta)
+    run_operation(sp, op, on_done=on_done)
+    return op
+
+
+def _tail_is(sp, playlist_id, total, uris):
+    if not uris or total < len(uris):
+        return False
+    page = sp.playlist_items(playlist_id, fields="items(track(uri))", limit=len(uris), offset=total - len(uris))
+    return [(item.get('track') or {}).get('uri') for item in page['items']] == list(uris)
+
+
+def commit_seen(op):
+    """Las canciones del actualizador quedan como vistas solo al terminar su escritura."""
+    rows = op.meta.get("seen")
+    if rows:
+        from spotibot.seen import SeenStore
+        with SeenStore(op.meta["seen_path"], migrate=False) as seen:
+            seen.add_many([tuple(row) for row in rows])
+
+
+def resume_operation(sp, op):
+    """Termina una operación interrumpida; devuelve 'resumed' o 'replaced'."""
+    if op.acked < len(op.steps) and op.steps[op.acked][0] != 'replace':
+        info = sp.playlist(op.playlist_id, fields="snapshot_id,tracks.total")
+        if op.snapshot_id is None or info['snapshot_id'] != op.snapshot_id:
+            # La playlist cambió después del último paso confirmado
+            step = op.steps[op.acked]
+            if step[0] == 'add' and _tail_is(sp, op.playlist_id, info['tracks']['total'], step[1]):
+                op.ack(info['snapshot_id'])
+            elif op.target is not None:
+                for step in replace_steps(op.target):
+                    _apply(sp, op.playlist_id, step, None)
+                commit_seen(op)
+                op.done()
+                return 'replaced'
+    run_operation(sp, op, on_done=commit_seen)
+    return 'resumed'
+
+
+def resume_pending(sp, journal, log=print):
+    """Reanuda las escrituras que quedaron a medias; devuelve cuántas se terminaron."""
+    finished = 0
+    for op in journal.claim_pending():
+        label = op.meta.get("label") or op.playlist_id
+        step = op.acked
+        try:
+            how = resume_operation(sp, op)
+        except Exception as e:
+            if _is_permanent(e):
+                op.done()
+            else:
+                op.claimed = False
+            log(f"   ⚠️ No se pudo reanudar la escritura '{label}': {e}")
+            continue
+        finished += 1
+        detail = "reemplazo completo" if how == 'replaced' else f"desde el paso {step + 1} de {len(op.steps)}"
+        log(f"   ♻️ Escritura '{label}' reanudada ({detail})")
+    return finished
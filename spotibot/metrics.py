@@ -0,0 +1,169 @@
+"""Métricas en memoria: contadores, histogramas de tiempos y gauges.
+
+Hay un registro global (METRICS) que usan los módulos de spotibot; el bot
+lo enseña con /stats y, si se configura, en un endpoint HTTP local con
+formato Prometheus. La CLI lo vuelca con --metrics.
+"""
+import bisect
+import contextlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (segundos) de los cubos de los histogramas
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _labels_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Aproximación por cubos (el límite superior del cubo que la contiene)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def gauge(self, name, func, **labels):
+        """Registra un valor que se calcula al leer las métricas (colas, cachés...)."""
+        with self._lock:
+            self._gauges[_key(name, labels)] = func
+
+    def _gauge_values(self):
+        with self._lock:
+            gauges = list(self._gauges.items())
+        values = {}
+        for key, func in gauges:
+            try:
+                values[key] = func()
+            except Exception as e:
+                logger.debug(f"Gauge {key[0]}: {e}")
+        return values
+
+    def snapshot(self):
+        """Todas las métricas como dict serializable en JSON."""
+        def name_of(key):
+            return key[0] + _labels_text(key[1])
+
+        with self._lock:
+            counters = {name_of(k): v for k, v in self._counters.items()}
+            histograms = {
+                name_of(k): {
+                    "count": h.count,
+                    "sum": round(h.sum, 4),
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                }
+                for k, h in self._histograms.items()
+            }
+        gauges = {name_of(k): v for k, v in self._gauge_values().items()}
+        return {"counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2, ensure_ascii=False)
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda kv: kv[0])
+            hist_data = [(k, h.buckets, list(h.counts), h.count, h.sum) for k, h in histograms]
+        for (name, labels), value in counters:
+            lines.append(f"spotibot_{name}{_labels_text(labels)} {value}")
+        for (name, labels), buckets, counts, count, total in hist_data:
+            cumulative = 0
+            for bound, n in zip(buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else bound
+                lines.append(f"spotibot_{name}_bucket{_labels_text(labels + (('le', le),))} {cumulative}")
+            lines.append(f"spotibot_{name}_count{_labels_text(labels)} {count}")
+            lines.append(f"spotibot_{name}_sum{_labels_text(labels)} {total}")
+        for (name, labels), value in sorted(self._gauge_values().items()):
+            if isinstance(value, (int, float)):
+                lines.append(f"spotibot_{name}{_labels_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Endpoint /metrics en formato Prometheus, en un hilo aparte."""
+        # Solo lo necesita el bot; la CLI no paga el import
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True, name="spotibot-metrics").start()
+        return server
+
+
+METRICS = Metrics()
@@ -0,0 +1,116 @@
+"""Motor del Party Mixer.
+
+Cada estrategia recorre las listas de origen (TrackRecord) sin copiarlas y
+va devolviendo URIs sin repetir; la deduplicación es con un set, así que
+el coste es lineal en el número total de canciones.
+"""
+import heapq
+import itertools
+
+
+def _unique(uris):
+    seen = set()
+    for uri in uris:
+        if uri and uri not in seen:
+            seen.add(uri)
+            yield uri
+
+
+def _normal(lists):
+    """Una lista detrás de otra."""
+    for tracks in lists:
+        for t in tracks:
+            yield t.uri
+
+
+def _round_robin(lists):
+    """1 de A, 1 de B, 1 de C... (el modo MIX de siempre)."""
+    for row in itertools.zip_longest(*lists):
+        for t in row:
+            if t is not None:
+                yield t.uri
+
+
+def _weighted(lists):
+    """Round-robin ponderado: en cada vuelta cada lista aporta según su tamaño.
+
+    Una lista el triple de larga que la más corta pone 3 canciones seguidas
+    por vuelta, así todas se acaban a la vez.
+    """
+    sizes = [len(tracks) for tracks in lists if len(tracks)]
+    if not sizes:
+        return
+    smallest = min(sizes)
+    iters = [(iter(tracks), max(1, round(len(tracks) / smallest))) for tracks in lists]
+    while iters:
+        alive = []
+        for it, weight in iters:
+            taken = 0
+            for t in itertools.islice(it, weight):
+                taken += 1
+                yield t.uri
+            if taken == weight:
+                alive.append((it, weight))
+        iters = alive
+
+
+def _spread(lists):
+    """Reparto proporcional: la canción j de una lista de n va en la posición j/n."""
+    def keyed(k, tracks):
+        n = len(tracks)
+        for j, t in enumerate(tracks):
+            yield (j + 0.5) / n, k, t.uri
+
+    for _, _, uri in heapq.merge(*(keyed(k, tracks) for k, tracks in enumerate(lists))):
+        yield uri
+
+
+def _popularity(lists):
+    """Intercala eligiendo en cada paso, entre la siguiente canción de cada
+    lista, la que deja la popularidad media acumulada más cerca de la media
+    global: alterna hits y canciones menos conocidas.
+    """
+    total = sum(len(tracks) for tracks in lists)
+    if not total:
+        return
+    target = sum(t.popularity for tracks in lists for t in tracks) / total
+    iters = [iter(tracks) for tracks in lists]
+    heads = [next(it, None) for it in iters]
+    acc, count = 0, 0
+    while True:
+        best, best_gap = None, None
+        for k, t in enumerate(heads):
+            if t is None:
+                continue
+            gap = abs((acc + t.popularity) / (count + 1) - target)
+            if best_gap is None or gap < best_gap:
+                best, best_gap = k, gap
+        if best is None:
+            return
+        t = heads[best]
+        acc += t.popularity
+        count += 1
+        heads[best] = next(iters[best], None)
+        yield t.uri
+
+
+STRATEGIES = {
+    "normal": _normal,
+    "mix": _round_robin,
+    "peso": _weighted,
+    "reparto": _spread,
+    "popularidad": _popularity,
+}
+
+STRATEGY_LABELS = {
+    "normal": "Normal (una lista tras otra)",
+    "mix": "Mix (1 de cada, alternadas)",
+    "peso": "Ponderado (según el tamaño de cada lista)",
+    "reparto": "Reparto proporcional (cada lista repartida por toda la mezcla)",
+    "popularidad": "Popularidad equilibrada (alterna hits y menos conocidas)",
+}
+
+
+def mix(lists, strategy="normal"):
+    """URIs únicos de 'lists' (listas de TrackRecord) según 'strategy'."""
+    return _unique(STRATEGIES[strategy](lists))
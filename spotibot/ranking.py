@@ -0,0 +1,159 @@
+"""Ranking de popularidad en streaming.
+
+Las canciones se van metiendo según llegan las páginas: para un top N
+basta un heap de N elementos (memoria O(N)) y el resultado está listo en
+cuanto aterriza la última página. Para 'all' se ordena por tramos que, si
+la playlist es muy grande, se vuelcan a ficheros temporales y se mezclan
+al final con heapq.merge.
+
+Orden: popularidad descendente y, a igualdad, el orden de la playlist
+(desempate estable).
+"""
+import heapq
+import json
+import os
+import tempfile
+import time
+
+from spotibot.fetch import DEFAULT_WORKERS, iter_playlist_pages
+from spotibot.metrics import METRICS
+from spotibot.records import RANK_FIELDS, TrackRecord
+
+# Canciones que se ordenan en memoria antes de volcar un tramo a disco
+RUN_SIZE = 20000
+# Playlists más grandes no se guardan en PlaylistCache: la copia para la
+# caché tendría todas sus canciones en memoria, justo lo que el ranking evita
+CACHE_MAX_TRACKS = 10000
+
+
+class TopN:
+    """Las n canciones más populares vistas hasta ahora."""
+
+    def __init__(self, n):
+        self.n = n
+        # Heap de mínimos: en la cima está la peor del top
+        self._heap = []
+
+    def add(self, position, record):
+        if self.n <= 0:
+            # Como antes: un top de 0 (o negativo) sale vacío
+            return
+        key = (record.popularity or 0, -position)
+        if len(self._heap) < self.n:
+            heapq.heappush(self._heap, (key, record))
+        elif key > self._heap[0][0]:
+            heapq.heapreplace(self._heap, (key, record))
+
+    def __len__(self):
+        return len(self._heap)
+
+    def top(self, k=None):
+        ranked = [record for _, record in sorted(self._heap, key=lambda e: e[0], reverse=True)]
+        return ranked if k is None else ranked[:k]
+
+
+class ExternalRanking:
+    """Todas las canciones ordenadas; los tramos grandes van a disco."""
+
+    def __init__(self, run_size=None, directory=None):
+        self.run_size = run_size or RUN_SIZE
+        self.directory = directory
+        self._buffer = []
+        self._runs = []
+        self.count = 0
+
+    def add(self, position, record):
+        self._buffer.append((-(record.popularity or 0), position, record.to_row()))
+        self.count += 1
+        if len(self._buffer) >= self.run_size:
+            self._spill()
+
+    def _spill(self):
+        self._buffer.sort(key=lambda e: e[:2])
+        fd, path = tempfile.mkstemp(prefix="rank-", suffix=".jsonl", dir=self.directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for entry in self._buffer:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._runs.append(path)
+        self._buffer = []
+
+    def _read_run(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield tuple(json.loads(line))
+
+    def __iter__(self):
+        """Recorre el ranking completo (y borra los temporales al acabar)."""
+        self._buffer.sort(key=lambda e: e[:2])
+        runs = [self._read_run(path) for path in self._runs]
+        try:
+            for _, _, row in heapq.merge(self._buffer, *runs, key=lambda e: e[:2]):
+                yield TrackRecord.from_row(row)
+        finally:
+            self.close()
+
+    def close(self):
+        for path in self._runs:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._runs = []
+
+
+def rank_playlist(sp, playlist_id, n=None, max_workers=DEFAULT_WORKERS, cache=None, on_page=None):
+    """Canciones de la playlist de más a menos popular.
+
+    Con 'n' devuelve una lista con el top n; con n=None un iterable con
+    todas. on_page(fetched, total, preview) se llama tras cada página;
+    preview es un TopN con lo mejor visto hasta el momento.
+
+    Con 'cache' (PlaylistCache) una playlist sin cambios no se pagina, y
+    al descargarla se guardan también sus registros para la caché si no
+    pasa de CACHE_MAX_TRACKS canciones.
+    """
+    ranking = TopN(n) if n is not None else ExternalRanking()
+    preview = ranking if n is not None else TopN(10)
+
+    def add(position, record):
+        ranking.add(position, record)
+        if preview is not ranking:
+            preview.add(position, record)
+
+    snapshot_id = None
+    if cache is not None:
+        snapshot_id = sp.playlist(playlist_id, fields="snapshot_id")['snapshot_id']
+        cached = cache.get(playlist_id, snapshot_id, RANK_FIELDS)
+        if cached is not None:
+            for position, record in enumerate(cached):
+                add(position, record)
+            if on_page:
+                on_page(len(cached), len(cached), preview)
+            return ranking.top() if n is not None else ranking
+
+    # Un hueco por posición: las páginas llegan en cualquier orden
+    slots = None
+    keep = cache is not None
+    fetched = 0
+    started = time.perf_counter()
+    for offset, total, items in iter_playlist_pages(sp, playlist_id, max_workers=max_workers, fields=RANK_FIELDS):
+        if keep and slots is None:
+            keep = total <= CACHE_MAX_TRACKS
+            slots = [None] * total if keep else None
+        for i, item in enumerate(items):
+            if item.get('track'):
+                record = TrackRecord.from_item(item)
+                add(offset + i, record)
+                if keep and offset + i < len(slots):
+                    slots[offset + i] = record
+                elif keep:
+                    # Ha crecido mientras se leía: la copia ya no sería de un solo snapshot
+                    keep, slots = False, None
+        fetched += len(items)
+        if on_page:
+            on_page(fetched, total, preview)
+
+    METRICS.observe("phase_seconds", time.perf_counter() - started, phase="rank_fetch")
+    if keep and slots is not None:
+        cache.put(playlist_id, snapshot_id, RANK_FIELDS, (r for r in slots if r is not None))
+    return ranking.top() if n is not None else ranking
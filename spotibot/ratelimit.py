@@ -0,0 +1,229 @@
+"""Capa de peticiones con control de ritmo para spotipy.
+
+RateLimitedSpotify envuelve un spotipy.Spotify y hace pasar cada llamada
+por:
+  * un token bucket compartido por todos los hilos (peticiones por segundo),
+  * un límite de concurrencia AIMD: sube de uno en uno mientras todo va
+    bien y se reduce a la mitad con cada 429 (o algo menos si la latencia
+    se dispara),
+  * reintentos de los 429 respetando la cabecera Retry-After; mientras
+    dura la espera se frena a todos los que comparten el cliente.
+
+Con varios clientes (uno por usuario del bot) cada uno lleva su propio
+bucket y además todos comparten otro ('shared_bucket') con el límite de
+la aplicación, que es el que aplica Spotify.
+
+spotipy por defecto reintenta los 429 él solo dentro de la sesión HTTP, a
+ciegas y sin avisar a los demás hilos; make_client() monta una sesión que
+solo reintenta los 5xx para que los 429 lleguen hasta aquí.
+"""
+import functools
+import threading
+import time
+
+import requests
+import spotipy
+from urllib3.util.retry import Retry
+
+from spotibot.httpcache import ConditionalCacheAdapter
+from spotibot.metrics import METRICS
+
+# Métodos de spotipy.Spotify que no hacen peticiones
+_PASSTHROUGH = {"prefix", "requests_timeout", "auth_manager", "language"}
+SERVER_ERRORS = (500, 502, 503, 504)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        """Bloquea a todos los clientes durante 'seconds' (Retry-After)."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+    def acquire(self):
+        """Espera a tener un token; devuelve los segundos esperados."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class AIMDLimiter:
+    """Límite de peticiones simultáneas que se adapta a los 429 y la latencia."""
+
+    def __init__(self, initial=8, minimum=1, maximum=32, latency_target=2.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        start = time.monotonic()
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        return time.monotonic() - start
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self, latency):
+        with self._cond:
+            if latency > self.latency_target:
+                self.limit = max(self.minimum, self.limit * 0.9)
+            else:
+                # +1 por cada "ventana" completa de peticiones correctas
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def on_throttle(self):
+        with self._cond:
+            self.limit = max(self.minimum, self.limit / 2)
+
+
+def retry_after_seconds(error, default=1.0):
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return default
+
+
+class RateLimitedSpotify:
+    def __init__(self, sp, rate=25, burst=50, max_concurrency=16, max_retries=5, shared_bucket=None):
+        self.sp = sp
+        self.bucket = TokenBucket(rate, burst)
+        self.shared_bucket = shared_bucket
+        self.limiter = AIMDLimiter(initial=max_concurrency, maximum=max_concurrency)
+        self.max_retries = max_retries
+        # HTTPCacheStats si la sesión lleva caché condicional (make_client)
+        self.http_cache = None
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+        self.retry_after_seconds = 0.0
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "retry_after_seconds": round(self.retry_after_seconds, 3),
+                "concurrency_limit": int(self.limiter.limit),
+            }
+
+    def _record(self, **inc):
+        with self._stats_lock:
+            for name, value in inc.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def _call(self, name, fn, args, kwargs):
+        attempt = 0
+        while True:
+            waited = self.bucket.acquire()
+            if self.shared_bucket is not None:
+                waited += self.shared_bucket.acquire()
+            waited += self.limiter.acquire()
+            start = time.monotonic()
+            METRICS.inc("spotify_calls_total", method=name)
+            if waited:
+                METRICS.inc("spotify_wait_seconds_total", waited)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if getattr(e, "http_status", None) != 429 or attempt >= self.max_retries:
+                    self._record(calls=1, wait_seconds=waited)
+                    METRICS.inc("spotify_errors_total", method=name, status=getattr(e, "http_status", "none"))
+                    raise
+                delay = retry_after_seconds(e)
+                self.limiter.on_throttle()
+                self.bucket.pause(delay)
+                if self.shared_bucket is not None:
+                    self.shared_bucket.pause(delay)
+                self._record(calls=1, throttled=1, wait_seconds=waited, retry_after_seconds=delay)
+                METRICS.inc("spotify_throttled_total", method=name)
+                attempt += 1
+                continue
+            finally:
+                self.limiter.release()
+            latency = time.monotonic() - start
+            self.limiter.on_success(latency)
+            self._record(calls=1, wait_seconds=waited)
+            METRICS.observe("spotify_call_seconds", latency, method=name)
+            return result
+
+    def __getattr__(self, name):
+        attr = getattr(self.sp, name)
+        if name.startswith("_") or name in _PASSTHROUGH or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return self._call(name, attr, args, kwargs)
+        return call
+
+
+def build_session(retries=3, pool_size=32, http_cache_dir=None, http_cache_max_bytes=100 * 1024 * 1024):
+    """Sesión HTTP que reintenta errores de red y 5xx, pero no los 429.
+
+    Con 'http_cache_dir' las lecturas de playlists van con If-None-Match
+    (ver spotibot.httpcache).
+    """
+    retry = Retry(
+        total=retries,
+        connect=None,
+        read=False,
+        status=retries,
+        allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+        backoff_factor=0.3,
+        status_forcelist=SERVER_ERRORS,
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    if http_cache_dir:
+        adapter = ConditionalCacheAdapter(http_cache_dir, http_cache_max_bytes, max_retries=retry,
+                                          pool_connections=pool_size, pool_maxsize=pool_size)
+    else:
+        adapter = requests.adapters.HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def make_client(auth_manager=None, auth=None, rate=25, burst=50, max_concurrency=16, max_retries=5,
+                http_cache_dir=None, http_cache_max_bytes=100 * 1024 * 1024, shared_bucket=None):
+    session = build_session(pool_size=max_concurrency * 2, http_cache_dir=http_cache_dir,
+                            http_cache_max_bytes=http_cache_max_bytes)
+    sp = spotipy.Spotify(auth=auth, auth_manager=auth_manager, requests_session=session)
+    client = RateLimitedSpotify(sp, rate=rate, burst=burst, max_concurrency=max_concurrency, max_retries=max_retries,
+                                shared_bucket=shared_bucket)
+    adapter = session.get_adapter("https://")
+    client.http_cache = adapter.stats if isinstance(adapter, ConditionalCacheAdapter) else None
+    return client
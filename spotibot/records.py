@@ -0,0 +1,54 @@
+"""Registro compacto de canción y proyecciones 'fields=' por funcionalidad.
+
+En vez de guardar el JSON completo de cada track (album, images,
+available_markets...) nos quedamos solo con lo que usan las herramientas.
+"""
+
+# Proyecciones para /playlists/{id}/tracks. 'total' hace falta siempre
+# para que fetch_playlist_items calcule los offsets.
+RANK_FIELDS = "total,items(track(id,uri,name,popularity,artists(name)))"
+URI_FIELDS = "total,items(track(id,uri,popularity))"
+UPDATER_FIELDS = "total,items(added_at,track(id,uri))"
+
+# Atributos de TrackRecord que rellena cada proyección
+PROJECTION_ATTRS = {
+    RANK_FIELDS: {"id", "uri", "name", "artist", "popularity"},
+    URI_FIELDS: {"id", "uri", "popularity"},
+    UPDATER_FIELDS: {"id", "uri", "added_at"},
+}
+
+
+class TrackRecord:
+    __slots__ = ("id", "uri", "name", "artist", "popularity", "added_at")
+
+    def __init__(self, id, uri, name=None, artist=None, popularity=0, added_at=None):
+        self.id = id
+        self.uri = uri
+        self.name = name
+        self.artist = artist
+        self.popularity = popularity
+        self.added_at = added_at
+
+    @classmethod
+    def from_item(cls, item):
+        """Crea el registro a partir de un item de playlist_items."""
+        track = item['track']
+        artists = track.get('artists')
+        return cls(
+            track.get('id'),
+            track.get('uri'),
+            track.get('name'),
+            artists[0].get('name') if artists else None,
+            track.get('popularity') or 0,
+            item.get('added_at'),
+        )
+
+    def to_row(self):
+        return [self.id, self.uri, self.name, self.artist, self.popularity, self.added_at]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    def __repr__(self):
+        return f"TrackRecord({self.uri!r}, {self.name!r}, popularity={self.popularity})"
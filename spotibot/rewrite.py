@@ -0,0 +1,140 @@
+"""Reescritura mínima de una playlist para /sort y /top.
+
+En lugar de reemplazar siempre la playlist entera (1 llamada cada 100
+canciones), se comparan el orden actual y el objetivo: las canciones que
+forman la subsecuencia creciente más larga ya están bien colocadas y solo
+se mueven las demás con playlist_reorder_items. Si eso sale más caro que
+el reemplazo completo, se hace el reemplazo.
+"""
+import bisect
+import math
+
+from spotibot.journal import BATCH, replace_steps, write_steps
+from spotibot.metrics import METRICS
+
+
+
+def _keys(uris):
+    """(uri, nº de aparición) para distinguir duplicados."""
+    count = {}
+    keys = []
+    for uri in uris:
+        n = count.get(uri, 0)
+        count[uri] = n + 1
+        keys.append((uri, n))
+    return keys
+
+
+def _lis_mask(seq):
+    """Marca los elementos de una subsecuencia estrictamente creciente más larga."""
+    tails, tails_idx = [], []
+    prev = [-1] * len(seq)
+    for i, v in enumerate(seq):
+        j = bisect.bisect_left(tails, v)
+        if j == len(tails):
+            tails.append(v)
+            tails_idx.append(i)
+        else:
+            tails[j] = v
+            tails_idx[j] = i
+        prev[i] = tails_idx[j - 1] if j else -1
+    mask = [False] * len(seq)
+    i = tails_idx[-1] if tails_idx else -1
+    while i != -1:
+        mask[i] = True
+        i = prev[i]
+    return mask
+
+
+def full_replace_calls(target):
+    return max(1, math.ceil(len(target) / BATCH))
+
+
+def plan_rewrite(current, target, max_ops=None):
+    """Operaciones para pasar de 'current' a 'target' (listas de URIs).
+
+    Devuelve una lista de tuplas:
+      ('remove', [{'uri', 'positions'}...])  posiciones de mayor a menor
+      ('add', [uris])                         al final de la playlist
+      ('reorder', range_start, insert_before, range_length)
+    o None en cuanto se pasa de 'max_ops' operaciones.
+    """
+    cur_keys = _keys(current)
+    tgt_keys = _keys(target)
+    tgt_index = {k: i for i, k in enumerate(tgt_keys)}
+    ops = []
+
+    # 1. Quitar lo que sobra, de atrás hacia delante para no mover posiciones
+    removals = [(pos, k) for pos, k in enumerate(cur_keys) if k not in tgt_index]
+    removals.reverse()
+    for i in range(0, len(removals), BATCH):
+        ops.append(('remove', [{'uri': k[0], 'positions': [pos]} for pos, k in removals[i:i + BATCH]]))
+    cur = [k for k in cur_keys if k in tgt_index]
+    if max_ops is not None and len(ops) > max_ops:
+        return None
+
+    # 2. Añadir al final lo que falta
+    present = set(cur)
+    missing = [k for k in tgt_keys if k not in present]
+    for i in range(0, len(missing), BATCH):
+        ops.append(('add', [k[0] for k in missing[i:i + BATCH]]))
+    cur.extend(missing)
+
+    # 3. Mover solo lo que no está en la subsecuencia creciente más larga
+    fixed = _lis_mask([tgt_index[k] for k in cur])
+    placed = {k for k, ok in zip(cur, fixed) if ok}
+
+    i = 0
+    while i < len(tgt_keys):
+        key = tgt_keys[i]
+        if key in placed:
+            i += 1
+            continue
+        start = cur.index(key)
+        length = 1
+        while (i + length < len(tgt_keys) and tgt_keys[i + length] not in placed
+               and start + length < len(cur) and cur[start + length] == tgt_keys[i + length]):
+            length += 1
+        insert_before = cur.index(tgt_keys[i - 1]) + 1 if i else 0
+        block = tgt_keys[i:i + length]
+        if insert_before != start:
+            ops.append(('reorder', start, insert_before, length))
+            if max_ops is not None and len(ops) > max_ops:
+                return None
+            del cur[start:start + length]
+            at = insert_before - length if insert_before > start else insert_before
+            cur[at:at] = block
+        placed.update(block)
+        i += length
+    return ops
+
+
+def _apply_full_replace(sp, playlist_id, target, journal=None, label=None):
+    write_steps(sp, playlist_id, replace_steps(target), journal=journal, target=target, label=label)
+    return {'mode': 'replace', 'calls': full_replace_calls(target)}
+
+
+def rewrite_playlist(sp, playlist_id, current, target, journal=None, label=None):
+    """Deja la playlist con 'target' usando la secuencia de llamadas más barata.
+
+    'current' debe ser el contenido completo actual; si no cuadra con el
+    total que da Spotify (p.ej. había items sin track) se reemplaza entera.
+    El snapshot_id de cada respuesta se encadena con la siguiente llamada.
+    Con 'journal' (WriteJournal) la escritura se puede reanudar si se corta.
+    """
+    info = sp.playlist(playlist_id, fields="snapshot_id,tracks.total")
+    if info['tracks']['total'] != len(current):
+        METRICS.inc("rewrite_total", mode="replace")
+        return _apply_full_replace(sp, playlist_id, target, journal, label)
+
+    # Solo compensa si sale estrictamente más barato que el reemplazo
+    with METRICS.timer("phase_seconds", phase="rewrite_plan"):
+        ops = plan_rewrite(current, target, max_ops=full_replace_calls(target) - 1)
+    if ops is None:
+        METRICS.inc("rewrite_total", mode="replace")
+        return _apply_full_replace(sp, playlist_id, target, journal, label)
+    METRICS.inc("rewrite_total", mode="diff")
+
+    if ops:
+        write_steps(sp, playlist_id, ops, journal=journal, target=target, snapshot_id=info['snapshot_id'], label=label)
+    return {'mode': 'diff', 'calls': len(ops)}
@@ -0,0 +1,159 @@
+"""Programador del actualizador para el bot.
+
+Admite intervalos fijos ("30m", "12h", "1d") o expresiones cron de 5
+campos ("0 6 * * *", hora local del servidor). La hora de la última
+ejecución correcta se guarda en disco: tras un reinicio, si se ha perdido
+alguna ejecución se recupera una sola vez y con la ventana justa (desde
+la última ejecución, no N días a ciegas).
+"""
+import asyncio
+import datetime
+import json
+import logging
+import random
+import re
+
+from spotibot.cache import atomic_write
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_STATE_PATH = "scheduler_state.json"
+# Margen hacia atrás sobre la última ejecución para no perder nada en el borde
+WINDOW_OVERLAP = datetime.timedelta(hours=1)
+
+_INTERVAL_RE = re.compile(r"^(\d+)\s*([mhd])$")
+_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+
+def _parse_cron_field(field, lo, hi):
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_str = part.split("/")
+            step = int(step_str)
+        if part == "*":
+            start, end = lo, hi
+        elif "-" in part:
+            start, end = (int(x) for x in part.split("-"))
+        else:
+            start = int(part)
+            end = hi if step != 1 else start
+        if start < lo or end > hi or start > end or step < 1:
+            raise ValueError(f"Campo cron fuera de rango: {field}")
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+
+class Schedule:
+    def __init__(self, spec):
+        self.spec = spec.strip()
+        match = _INTERVAL_RE.match(self.spec.lower())
+        if match:
+            self.interval = datetime.timedelta(**{_UNITS[match.group(2)]: int(match.group(1))})
+            if not self.interval:
+                raise ValueError("El intervalo tiene que ser mayor que 0")
+            return
+        self.interval = None
+        fields = self.spec.split()
+        if len(fields) != 5:
+            raise ValueError(f"Programación no válida: '{spec}' (usa '12h' o 'min hora dia mes dia_semana')")
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = set(_parse_cron_field(fields[2], 1, 31))
+        self.months = set(_parse_cron_field(fields[3], 1, 12))
+        # 0 y 7 son domingo
+        self.weekdays = {d % 7 for d in _parse_cron_field(fields[4], 0, 7)}
+        self.dom_any = fields[2] == "*"
+        self.dow_any = fields[4] == "*"
+
+    def _day_matches(self, day):
+        if day.month not in self.months:
+            return False
+        dom = day.day in self.days
+        dow = (day.weekday() + 1) % 7 in self.weekdays
+        if self.dom_any or self.dow_any:
+            return dom and dow
+        # Como en cron: si se restringen ambos basta con uno
+        return dom or dow
+
+    def next_after(self, after):
+        """Siguiente ejecución estrictamente posterior a 'after' (datetime con zona)."""
+        if self.interval is not None:
+            return after + self.interval
+        local = after.astimezone().replace(tzinfo=None, second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        day = local.date()
+        for _ in range(366 * 5):
+            if self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime.datetime.combine(day, datetime.time(hour, minute))
+                        if candidate >= local:
+                            return candidate.astimezone()
+            day += datetime.timedelta(days=1)
+        raise ValueError(f"La programación '{self.spec}' no se cumple nunca")
+
+
+class UpdaterScheduler:
+    """Lanza run_once(cutoff) según la programación, en segundo plano.
+
+    run_once es una corrutina que devuelve True si la ejecución terminó
+    bien; solo entonces se guarda como última ejecución.
+    """
+
+    def __init__(self, spec, run_once, state_path=SCHEDULER_STATE_PATH, jitter=300, default_days=7):
+        self.schedule = Schedule(spec)
+        self.run_once = run_once
+        self.state_path = state_path
+        # Retraso aleatorio para no salir siempre al segundo exacto
+        self.jitter = jitter
+        self.default_days = default_days
+
+    def last_run(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return datetime.datetime.fromisoformat(json.load(f)["last_run"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, when):
+        atomic_write(self.state_path, json.dumps({"last_run": when.isoformat()}).encode())
+
+    def first_run_at(self, now):
+        last = self.last_run()
+        if last is None:
+            return self.schedule.next_after(now)
+        due = self.schedule.next_after(last)
+        # Ejecuciones perdidas mientras el bot estaba parado: solo una
+        return now if due <= now else due
+
+    def cutoff_for(self, now):
+        last = self.last_run()
+        if last is None:
+            return now - datetime.timedelta(days=self.default_days)
+        return last - WINDOW_OVERLAP
+
+    async def run_forever(self):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        next_at = self.first_run_at(now)
+        while True:
+            delay = (next_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+            delay = max(0.0, delay) + random.uniform(0, self.jitter)
+            logger.info(f"Próxima actualización programada en {delay / 60:.1f} min")
+            await asyncio.sleep(delay)
+
+            started = datetime.datetime.now(datetime.timezone.utc)
+            try:
+                ok = await self.run_once(self.cutoff_for(started))
+            except Exception as e:
+                logger.error(f"Actualización programada: {e}")
+                ok = False
+            if ok:
+                self._save(started)
+            # Desde la hora prevista, no desde 'started': si no, el retraso
+            # aleatorio de cada ejecución se sumaría a las siguientes
+            now = datetime.datetime.now(datetime.timezone.utc)
+            next_at = self.schedule.next_after(next_at)
+            while next_at <= now:
+                # La ejecución duró más que el intervalo: solo la siguiente que quede
+                next_at = self.schedule.next_after(next_at)
@@ -0,0 +1,102 @@
+"""Índice SQLite de canciones ya vistas por el actualizador.
+
+Sustituye a global_tracks.txt y data/{pid}_tracks.txt, que crecían sin
+límite y se cargaban enteros en memoria en cada ejecución. La primera vez
+que se abre la base de datos se migran esos ficheros si existen.
+"""
+import datetime
+import glob
+import os
+import sqlite3
+
+SEEN_DB_PATH = "seen_tracks.db"
+LEGACY_GLOBAL_PATH = "global_tracks.txt"
+LEGACY_DATA_DIR = "data"
+
+# Máximo de parámetros por consulta (SQLite antiguo admite 999)
+_CHUNK = 900
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (
+    track_id   TEXT NOT NULL,
+    source_pid TEXT NOT NULL,
+    genre      TEXT,
+    first_seen TEXT NOT NULL,
+    PRIMARY KEY (track_id, source_pid)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _read_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+class SeenStore:
+    """(track_id, source_pid, genre, first_seen) con consultas e inserciones por lotes."""
+
+    def __init__(self, path=SEEN_DB_PATH, migrate=True):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        if migrate:
+            self.migrate_from_txt()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def known(self, track_ids):
+        """Subconjunto de 'track_ids' que ya se vio desde cualquier fuente."""
+        ids = list(set(track_ids))
+        found = set()
+        for i in range(0, len(ids), _CHUNK):
+            chunk = ids[i:i + _CHUNK]
+            marks = ",".join("?" * len(chunk))
+            rows = self.conn.execute(f"SELECT DISTINCT track_id FROM seen WHERE track_id IN ({marks})", chunk)
+            found.update(r[0] for r in rows)
+        return found
+
+    def add_many(self, rows):
+        """Inserta (track_id, source_pid, genre) en una sola transacción."""
+        now = _now()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO seen (track_id, source_pid, genre, first_seen) VALUES (?, ?, ?, ?)",
+                ((tid, pid, genre, now) for tid, pid, genre in rows),
+            )
+
+    def migrate_from_txt(self, global_path=LEGACY_GLOBAL_PATH, data_dir=LEGACY_DATA_DIR):
+        """Importa una sola vez global_tracks.txt y data/*_tracks.txt."""
+        done = self.conn.execute("SELECT value FROM meta WHERE key = 'migrated_txt'").fetchone()
+        if done:
+            return 0
+        rows = []
+        for path in sorted(glob.glob(os.path.join(data_dir, "*_tracks.txt"))):
+            pid = os.path.basename(path)[:-len("_tracks.txt")]
+            rows.extend((tid, pid, None) for tid in _read_lines(path))
+        if os.path.exists(global_path):
+            # Sin fuente conocida: se guardan con source_pid vacío
+            rows.extend((tid, "", None) for tid in _read_lines(global_path))
+        self.add_many(rows)
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_txt', ?)", (_now(),))
+        return len(rows)
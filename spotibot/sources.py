@@ -0,0 +1,202 @@
+"""playlists.txt: fuentes del actualizador ya validadas y agrupadas.
+
+Cada línea es 'URL GENERO'. Al compilarla se descartan (y se avisan) las
+URLs que no son de una playlist, las líneas sin género y las repetidas. Si
+existe genres.txt (un género por línea) también las de géneros que no estén
+en él; si no, un género casi igual a otro más usado se avisa como errata. El
+resultado es un plan en el que cada fuente aparece una sola vez con todos
+los géneros que la usan: se lee una vez y sus canciones van a cada uno.
+
+El plan compilado se guarda en caché con el hash del fichero como clave,
+así que mientras playlists.txt no cambie no se vuelve a analizar.
+"""
+import difflib
+import hashlib
+import json
+import re
+
+from spotibot.cache import DiskLRU
+
+SOURCES_PATH = "playlists.txt"
+# Géneros admitidos (opcional): sin este fichero vale cualquiera
+GENRES_PATH = "genres.txt"
+PLAN_CACHE_DIR = "cache/plans"
+# Súbelo si cambia lo que se guarda en el plan: invalida los ya compilados
+PLAN_VERSION = 1
+
+_PLAYLIST_ID = re.compile(r"^[A-Za-z0-9]{22}$")
+
+
+class SourcesError(Exception):
+    """playlists.txt no existe o no tiene ninguna fuente válida."""
+
+
+def normalize_genre(raw):
+    """'HARDTECHNO_&_SCHRANZ' -> 'HARDTECHNO AND SCHRANZ'"""
+    return raw.replace("&", "AND").replace("_", " ").upper()
+
+
+def parse_playlist_id(text):
+    """ID de playlist de una URL de open.spotify.com o una URI spotify:playlist:; None si no lo es."""
+    if "playlist/" in text:
+        pid = text.split("playlist/")[1].split("?")[0].split("/")[0]
+    elif text.startswith("spotify:playlist:"):
+        pid = text[len("spotify:playlist:"):]
+    else:
+        return None
+    return pid if _PLAYLIST_ID.match(pid) else None
+
+
+class SourcePlan:
+    """Géneros con sus fuentes y, al revés, cada fuente con sus géneros.
+
+    errors son las líneas descartadas y warnings avisos sobre líneas que sí
+    se usan; ambos como (número de línea, mensaje).
+    """
+
+    def __init__(self, genres, errors=(), warnings=(), entries=0, digest=None):
+        self.genres = {genre: list(pids) for genre, pids in genres.items()}
+        self.errors = [tuple(e) for e in errors]
+        self.warnings = [tuple(w) for w in warnings]
+        self.entries = entries
+        self.digest = digest
+        self.sources = {}
+        for genre, pids in self.genres.items():
+            for pid in pids:
+                self.sources.setdefault(pid, []).append(genre)
+
+    @property
+    def source_map(self):
+        """{GÉNERO: [playlist_id, ...]} para run_updater()."""
+        return self.genres
+
+    def shared(self):
+        """Fuentes que usan varios géneros."""
+        return {pid: genres for pid, genres in self.sources.items() if len(genres) > 1}
+
+    def planned_calls(self):
+        """Cota inferior de llamadas a la API antes de ejecutar el plan.
+
+        Sin llamar a Spotify solo se sabe lo mínimo: una lectura por fuente
+        distinta y otra para la lista de playlists del usuario. Las fuentes
+        de más de 100 canciones leen alguna página más, y crear playlists,
+        subir portadas y escribir (una llamada por cada 100 canciones
+        nuevas) depende de lo que se encuentre.
+        """
+        return {"sources": len(self.sources), "entries": self.entries,
+                "saved": self.entries - len(self.sources),
+                "min_source_reads": len(self.sources), "min_index_reads": 1,
+                "min_total": len(self.sources) + 1}
+
+    def report(self):
+        """Líneas de texto con el plan y sus problemas, para enseñar antes de ejecutarlo."""
+        calls = self.planned_calls()
+        lines = [f"📋 {calls['sources']} fuentes para {len(self.genres)} géneros: mínimo {calls['min_total']} "
+                 f"llamadas a la API ({calls['min_source_reads']} lecturas de fuentes + "
+                 f"{calls['min_index_reads']} de tus playlists; las fuentes grandes, las playlists "
+                 f"nuevas y las escrituras, 1 por cada 100 canciones, suman más)"]
+        if calls["saved"]:
+            lines.append(f"   ♻️ {calls['saved']} lecturas menos por fuentes compartidas entre géneros")
+        for lineno, message in self.errors:
+            lines.append(f"   ❌ Línea {lineno}: {message} (ignorada)")
+        for lineno, message in self.warnings:
+            lines.append(f"   ⚠️ Línea {lineno}: {message}")
+        return lines
+
+    def to_json(self):
+        return json.dumps({"genres": self.genres, "errors": self.errors, "warnings": self.warnings,
+                           "entries": self.entries, "digest": self.digest})
+
+    @classmethod
+    def from_json(cls, data):
+        raw = json.loads(data)
+        return cls(raw["genres"], raw["errors"], raw["warnings"], raw["entries"], raw["digest"])
+
+
+def _suspected_typos(genres, counts):
+    """{género: parecido} para los géneros casi iguales a otro que se usa más."""
+    typos = {}
+    for genre in genres:
+        others = [g for g in genres if g != genre and counts[g] > counts[genre]]
+        match = difflib.get_close_matches(genre, others, n=1, cutoff=0.85)
+        if match:
+            typos[genre] = match[0]
+    return typos
+
+
+def compile_sources(text, known_genres=None, digest=None):
+    """Analiza el contenido de playlists.txt y devuelve su SourcePlan.
+
+    Con 'known_genres' los géneros que no estén en la lista se descartan;
+    sin ella solo se avisan los que parecen una errata de otro.
+    """
+    known = {normalize_genre(g) for g in known_genres} if known_genres else None
+    genres, errors, seen = {}, [], {}
+    lines_of = {}
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split()
+        pid = parse_playlist_id(parts[0])
+        if pid is None:
+            errors.append((lineno, f"URL de playlist no válida: {parts[0]}"))
+            continue
+        if len(parts) < 2:
+            errors.append((lineno, "falta el género"))
+            continue
+        genre = normalize_genre(parts[1])
+        if known is not None and genre not in known:
+            errors.append((lineno, f"género desconocido: {genre}"))
+            continue
+        if (pid, genre) in seen:
+            errors.append((lineno, f"repetida (ya está en la línea {seen[pid, genre]})"))
+            continue
+        seen[pid, genre] = lineno
+        genres.setdefault(genre, []).append(pid)
+        lines_of.setdefault(genre, lineno)
+
+    warnings = []
+    if known is None:
+        counts = {genre: len(pids) for genre, pids in genres.items()}
+        for genre, similar in _suspected_typos(genres, counts).items():
+            warnings.append((lines_of[genre], f"género '{genre}' parecido a '{similar}': ¿errata?"))
+    return SourcePlan(genres, errors, sorted(warnings), entries=len(seen), digest=digest)
+
+
+def load_genres(path=GENRES_PATH):
+    """Géneros de genres.txt (uno por línea, '#' para comentarios); None si no existe."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [line.strip() for line in f]
+    except FileNotFoundError:
+        return None
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def load_plan(path=SOURCES_PATH, known_genres=None, cache_dir=PLAN_CACHE_DIR, genres_path=GENRES_PATH):
+    """Plan de 'path', compilado solo si el fichero ha cambiado desde la última vez.
+
+    Sin 'known_genres' se usan los de genres_path, si existe.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        raise SourcesError(f"No existe el archivo '{path}'.")
+    if known_genres is None and genres_path:
+        known_genres = load_genres(genres_path)
+    digest = hashlib.sha256(data).hexdigest()
+    genres_key = ",".join(sorted(normalize_genre(g) for g in known_genres)) if known_genres is not None else "*"
+    key = f"{PLAN_VERSION}|{digest}|{genres_key}"
+    cache = DiskLRU(cache_dir, 1024 * 1024) if cache_dir else None
+    cached = cache.get(key) if cache else None
+    if cached is not None:
+        plan = SourcePlan.from_json(cached)
+    else:
+        plan = compile_sources(data.decode("utf-8"), known_genres=known_genres, digest=digest)
+        if cache:
+            cache.put(key, plan.to_json().encode())
+    if not plan.genres:
+        raise SourcesError(f"'{path}' no tiene ninguna fuente válida ('URL_PLAYLIST GENERO' por línea).")
+    return plan
@@ -0,0 +1,117 @@
+"""Un cliente de Spotify por usuario de Telegram.
+
+Cada usuario vincula su propia cuenta (token en su propio fichero) y el
+bot le crea el cliente la primera vez que lo necesita. Los clientes que
+llevan tiempo sin usarse, o los más antiguos si hay demasiados, se
+descartan (LRU) y se vuelven a crear a partir del token cuando hagan falta.
+
+Cada cliente tiene su propio ritmo y límite de concurrencia, y todos
+pasan además por un token bucket común: el límite de Spotify es por
+aplicación, no por usuario.
+"""
+import collections
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+TENANT_DIR = "tenants"
+
+
+class NotLinked(Exception):
+    """El usuario todavía no ha vinculado su cuenta de Spotify."""
+
+
+def tenant_dir(key, base=TENANT_DIR):
+    """Directorio con el token y los datos propios del usuario."""
+    return os.path.join(base, str(key))
+
+
+class Tenant:
+    def __init__(self, key, client):
+        self.key = key
+        self.client = client
+        self.last_used = time.monotonic()
+        self._profile = None
+        self._lock = threading.Lock()
+
+    @property
+    def profile(self):
+        """current_user() de su cuenta; se pide una vez (hace una llamada a la API)."""
+        with self._lock:
+            if self._profile is None:
+                self._profile = self.client.current_user()
+            return self._profile
+
+    @property
+    def user_id(self):
+        return self.profile['id']
+
+
+class TenantPool:
+    """Clientes por usuario creados bajo demanda con factory(key).
+
+    factory devuelve None si el usuario no tiene token. is_busy(key) evita
+    descartar el cliente de alguien con trabajos en marcha o en cola.
+    """
+
+    def __init__(self, factory, max_clients=20, idle_seconds=3600, is_busy=None):
+        self.factory = factory
+        self.max_clients = max_clients
+        self.idle_seconds = idle_seconds
+        self.is_busy = is_busy or (lambda key: False)
+        self._tenants = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._tenants)
+
+    def __contains__(self, key):
+        return key in self._tenants
+
+    def clients(self):
+        with self._lock:
+            return [tenant.client for tenant in self._tenants.values()]
+
+    def get(self, key):
+        with self._lock:
+            tenant = self._tenants.get(key)
+            if tenant is None:
+                client = self.factory(key)
+                if client is None:
+                    raise NotLinked(key)
+                tenant = self._tenants[key] = Tenant(key, client)
+                self.created += 1
+            self._tenants.move_to_end(key)
+            tenant.last_used = time.monotonic()
+            self._evict()
+            return tenant
+
+    def add(self, key, client):
+        """Mete un cliente ya creado (p.ej. el autenticado por consola)."""
+        with self._lock:
+            tenant = self._tenants[key] = Tenant(key, client)
+            self._tenants.move_to_end(key)
+            self._evict()
+            return tenant
+
+    def drop(self, key):
+        with self._lock:
+            return self._tenants.pop(key, None) is not None
+
+    def _evict(self):
+        now = time.monotonic()
+        # El último es el que se acaba de pedir: ese no se toca
+        for key in list(self._tenants)[:-1]:
+            tenant = self._tenants[key]
+            over = len(self._tenants) > self.max_clients
+            idle = now - tenant.last_used > self.idle_seconds
+            if not (over or idle) or self.is_busy(key):
+                continue
+            del self._tenants[key]
+            self.evicted += 1
+            logger.info(f"Cliente de Spotify de {key} descartado ({'inactivo' if idle else 'LRU'})")
@@ -0,0 +1,229 @@
+"""Motor del actualizador (/updater y opción 3 de la CLI).
+
+Las playlists "espía" suelen añadir canciones al final, así que en vez de
+leerlas enteras desde el offset 0 empezamos por la cola y retrocedemos
+hasta encontrar una página entera más antigua que el corte. Todas las
+fuentes se leen en paralelo y luego se reparten por género en orden fijo.
+"""
+import datetime
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from spotibot.covers import CoverStore, CoverUploader, cover_path
+from spotibot.fetch import DEFAULT_WORKERS, PAGE_SIZE, fetch_playlist_items
+from spotibot.journal import batches, resume_pending, write_steps
+from spotibot.metrics import METRICS
+from spotibot.records import UPDATER_FIELDS
+from spotibot.seen import SEEN_DB_PATH, SeenStore
+from spotibot.user_playlists import PlaylistIndex
+
+ADDED_AT_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def cutoff_string(cutoff):
+    """Pasa el corte a texto: las fechas ISO de Spotify se comparan como str."""
+    return cutoff.astimezone(datetime.timezone.utc).strftime(ADDED_AT_FORMAT)
+
+
+def _is_recent(item, cutoff):
+    added = item.get('added_at')
+    return bool(item.get('track')) and added is not None and added >= cutoff
+
+
+def _dates(items):
+    return [i['added_at'] for i in items if i.get('added_at')]
+
+
+def _full_scan(sp, playlist_id, cutoff, max_workers):
+    items = fetch_playlist_items(sp, playlist_id, max_workers=max_workers, fields=UPDATER_FIELDS)
+    return [i for i in items if _is_recent(i, cutoff)]
+
+
+def scan_recent_items(sp, playlist_id, cutoff, max_workers=1, page_size=PAGE_SIZE):
+    """Items añadidos desde 'cutoff' (datetime), en el orden de la playlist.
+
+    Devuelve (items, stats) con stats = {'mode', 'calls', 'full_calls'}.
+    Si la playlist no está ordenada por fecha de alta se hace el escaneo
+    completo de siempre.
+    """
+    cutoff = cutoff_string(cutoff)
+    head = sp.playlist_items(playlist_id, fields=UPDATER_FIELDS, limit=page_size, offset=0)
+    total = head.get('total') or 0
+    full_calls = max(1, math.ceil(total / page_size))
+    calls = 1
+    head_items = head['items']
+    head_dates = _dates(head_items)
+
+    if total <= page_size:
+        recent = [i for i in head_items if _is_recent(i, cutoff)]
+        return recent, {'mode': 'head', 'calls': calls, 'full_calls': full_calls}
+
+    def fallback():
+        recent = _full_scan(sp, playlist_id, cutoff, max_workers)
+        return recent, {'mode': 'full', 'calls': calls + full_calls, 'full_calls': full_calls}
+
+    if head_dates != sorted(head_dates):
+        return fallback()
+
+    pages = []
+    newer_first = None  # primera fecha de la página posterior ya leída
+    end = total
+    reached_head = True
+    while end > page_size:
+        start = max(page_size, end - page_size)
+        page = sp.playlist_items(playlist_id, fields=UPDATER_FIELDS, limit=end - start, offset=start)['items']
+        calls += 1
+        dates = _dates(page)
+        if dates != sorted(dates) or (dates and newer_first is not None and dates[-1] > newer_first):
+            return fallback()
+        if dates:
+            newer_first = dates[0]
+        pages.append(page)
+        end = start
+        if dates and dates[-1] < cutoff:
+            reached_head = False
+            break
+
+    # La cabeza tiene que ser más antigua que todo lo leído en la cola
+    if head_dates and newer_first is not None and head_dates[-1] > newer_first:
+        return fallback()
+
+    recent = [i for i in head_items if _is_recent(i, cutoff)] if reached_head else []
+    for page in reversed(pages):
+        recent.extend(i for i in page if _is_recent(i, cutoff))
+    return recent, {'mode': 'tail', 'calls': calls, 'full_calls': full_calls}
+
+
+def fetch_sources(sp, pids, cutoff, max_workers=DEFAULT_WORKERS, log=print):
+    """Escanea todas las fuentes en paralelo con un límite global de peticiones.
+
+    Devuelve {pid: (items, stats)}; las fuentes que fallan no aparecen.
+    Cada escaneo va con max_workers=1 para que el pool sea el único límite.
+    """
+    def scan(pid):
+        try:
+            return pid, scan_recent_items(sp, pid, cutoff, max_workers=1)
+        except Exception as e:
+            log(f"   Error leyendo fuente {pid}: {e}")
+            return pid, None
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        return {pid: res for pid, res in pool.map(scan, pids) if res is not None}
+
+
+def find_or_create_destination(sp, user_id, genre, index, log=print, covers=None):
+    """Playlist 'GENERO AÑO' del usuario; si no existe se crea y se encarga su portada.
+
+    La portada la sube 'covers' (CoverUploader) en segundo plano; sin él se
+    sube aquí mismo, ya comprobada y reducida si hacía falta.
+    """
+    dest_name = f"{genre} {datetime.date.today().year}"
+    dest_id = index.get(dest_name)
+    if dest_id:
+        return dest_id
+
+    log(f"   Creando playlist nueva: {dest_name}")
+    new_pl = sp.user_playlist_create(user_id, dest_name, public=False, description=f"Auto-gen: {genre}")
+    dest_id = new_pl['id']
+    index.created(dest_name, dest_id)
+    img_path = cover_path(genre)
+    if os.path.exists(img_path):
+        if covers is not None:
+            covers.upload(sp, dest_id, img_path, log=log)
+        else:
+            try:
+                sp.playlist_upload_cover_image(dest_id, CoverStore().payload(img_path))
+            except Exception as e:
+                log(f"   Error imagen: {e}")
+    return dest_id
+
+
+def run_updater(sp, user_id, source_map, cutoff, max_workers=DEFAULT_WORKERS, log=print, seen_path=SEEN_DB_PATH,
+                migrate_seen=True, journal=None, queue=None, covers=None):
+    """Actualiza las playlists por género con las novedades de sus fuentes.
+
+    Primero se leen todas las fuentes en paralelo; después se reparten por
+    género en el orden de 'source_map', igual que una ejecución secuencial.
+    Cada fuente se lee una vez aunque la usen varios géneros, y sus
+    novedades van a todos ellos; una canción que llega por dos fuentes
+    distintas solo va al primer género.
+    Las canciones ya vistas se consultan en SeenStore de una sola vez y las
+    de cada género se marcan como vistas en cuanto Spotify confirma su
+    escritura. Con 'journal' (WriteJournal) antes se terminan las escrituras
+    de una ejecución anterior que se cortó, y las de esta se pueden reanudar.
+    Con 'queue' (WriteQueue, con el mismo seen_path) los añadidos se juntan
+    con los de otros trabajos que escriben en las mismas playlists.
+    Las portadas se preparan mientras se leen las fuentes y se suben en
+    segundo plano con 'covers' (CoverUploader); sin él se crea uno para
+    esta ejecución y se esperan sus subidas al final.
+    Devuelve {'summary': [(genre, añadidas)], 'calls', 'calls_saved'}.
+    """
+    if journal is not None:
+        # Lo que quedó a medias tiene que estar como visto antes de filtrar
+        resume_pending(sp, journal, log=log)
+    own_covers = covers is None
+    if own_covers:
+        covers = CoverUploader()
+    try:
+        covers.prepare([cover_path(genre) for genre in source_map], log=log)
+        pids = list(dict.fromkeys(pid for pids in source_map.values() for pid in pids))
+        log(f"🚀 Escaneando {len(pids)} fuentes de {len(source_map)} géneros...")
+        with METRICS.timer("phase_seconds", phase="updater_scan"):
+            scans = fetch_sources(sp, pids, cutoff, max_workers=max_workers, log=log)
+
+        calls = sum(stats['calls'] for _, stats in scans.values())
+        calls_saved = sum(stats['full_calls'] - stats['calls'] for _, stats in scans.values())
+        summary = []
+        index = PlaylistIndex(sp, user_id)
+
+        with SeenStore(seen_path, migrate=migrate_seen) as seen, METRICS.timer("phase_seconds", phase="updater_write"):
+            candidates = [item['track']['id'] for items, _ in scans.values() for item in items]
+            already_seen = seen.known(candidates)
+            claimed = {}  # canción -> fuente de la que sale en esta ejecución
+            pending = []
+
+            for genre, genre_pids in source_map.items():
+                log(f"\n📂 Procesando GÉNERO: {genre}")
+                dest_id = find_or_create_destination(sp, user_id, genre, index, log=log, covers=covers)
+
+                tracks_to_add = []
+                genre_rows = []
+                genre_tids = set()
+                for pid in genre_pids:
+                    if pid not in scans:
+                        continue
+                    for item in scans[pid][0]:
+                        tid = item['track']['id']
+                        # Una fuente compartida reparte sus novedades a todos sus géneros
+                        if tid in already_seen or tid in genre_tids or claimed.setdefault(tid, pid) != pid:
+                            continue
+                        tracks_to_add.append(item['track']['uri'])
+                        genre_tids.add(tid)
+                        genre_rows.append((tid, pid, genre))
+
+                if tracks_to_add and queue is not None:
+                    log(f"   🔥 Encolando {len(tracks_to_add)} canciones nuevas...")
+                    pending.append((genre, queue.add(dest_id, tracks_to_add, seen=genre_rows, label=f"updater {genre}")))
+                    continue
+                if tracks_to_add:
+                    log(f"   🔥 Agregando {len(tracks_to_add)} canciones nuevas...")
+                    # Vistas solo si la escritura del género termina
+                    write_steps(sp, dest_id, [('add', chunk) for chunk in batches(tracks_to_add)], journal=journal,
+                                on_done=lambda op, rows=genre_rows: seen.add_many(rows),
+                                label=f"updater {genre}", seen=genre_rows, seen_path=seen_path)
+                else:
+                    log("   💤 Sin novedades.")
+                pending.append((genre, len(tracks_to_add)))
+
+        for genre, added in pending:
+            # Con cola: lo que otro trabajo ya había encolado no cuenta aquí
+            added = added if isinstance(added, int) else added.result()
+            summary.append((genre, added))
+            METRICS.inc("updater_tracks_added_total", added)
+    finally:
+        # Solo el que se creó aquí: el del bot sigue subiendo para otros trabajos
+        if own_covers:
+            covers.close()
+
+    return {'summary': summary, 'calls': calls, 'calls_saved': calls_saved}
@@ -0,0 +1,74 @@
+"""Índice nombre -> id de todas las playlists del usuario.
+
+current_user_playlists devuelve como mucho 50 por página; antes solo se
+miraba la primera y en cuentas grandes se creaban playlists "GENERO AÑO"
+duplicadas. El índice se pagina entero una vez por ejecución y se guarda
+en disco para la siguiente.
+"""
+import json
+import os
+import time
+
+from spotibot.cache import atomic_write
+
+USER_PLAYLISTS_PATH = "cache/user_playlists.json"
+
+
+class PlaylistIndex:
+    def __init__(self, sp, user_id, path=USER_PLAYLISTS_PATH, max_age=6 * 3600):
+        self.sp = sp
+        self.user_id = user_id
+        self.path = path
+        # Por si el usuario crea o borra playlists a mano desde Spotify
+        self.max_age = max_age
+        self.names = None
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("user_id") != self.user_id or time.time() - data.get("built_at", 0) > self.max_age:
+            return None
+        return data["names"]
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        data = {"user_id": self.user_id, "built_at": time.time(), "names": self.names}
+        atomic_write(self.path, json.dumps(data).encode())
+
+    def build(self):
+        """Recorre todas las páginas de current_user_playlists."""
+        names = {}
+        offset = 0
+        while True:
+            page = self.sp.current_user_playlists(limit=50, offset=offset)
+            for pl in page['items']:
+                # Solo las propias: en las seguidas no se puede escribir
+                if pl and pl['owner']['id'] == self.user_id:
+                    names.setdefault(pl['name'], pl['id'])
+            offset += len(page['items'])
+            if not page.get('next') or not page['items']:
+                break
+        self.names = names
+        self._save()
+        return names
+
+    def ensure(self):
+        if self.names is None:
+            self.names = self._load()
+        if self.names is None:
+            self.build()
+        return self.names
+
+    def get(self, name):
+        return self.ensure().get(name)
+
+    def created(self, name, playlist_id):
+        """Registra una playlist creada por el bot e invalida la copia en disco."""
+        self.ensure()[name] = playlist_id
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
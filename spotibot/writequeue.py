@@ -0,0 +1,240 @@
+"""Cola de escrituras por playlist de destino.
+
+Cuando varios trabajos añaden canciones a la misma playlist (el
+actualizador manual y el programado sobre "ROCK 2026", por ejemplo), cada
+uno mandaría sus propios lotes de 100, el último casi siempre a medias, y
+sus escrituras se intercalarían. Aquí los añadidos se juntan por destino
+en lotes completos, se descartan las URIs que ya están en cola o en la
+playlist y se escriben desde un único hilo: en cuanto hay un lote lleno o
+cuando el más antiguo lleva 'max_delay' segundos esperando.
+
+add() devuelve un Future que se resuelve, cuando han llegado a Spotify
+todas sus canciones, con cuántas de ellas se escribieron de verdad (las
+repetidas no cuentan). Las filas de 'seen' de las repetidas no se pierden:
+si ya están en la playlist se confirman enseguida y, si están en cola, con
+el lote que las escribe.
+
+Lo que ya tiene cada playlist se lee una vez y se guarda junto a su
+snapshot_id; solo se vuelve a leer cuando alguien más la cambia.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from spotibot.journal import BATCH, commit_seen, write_steps
+from spotibot.metrics import METRICS
+from spotibot.seen import SeenStore
+
+logger = logging.getLogger(__name__)
+
+
+class _Ticket:
+    """Lo que ha pedido una llamada a add()."""
+
+    def __init__(self, pending):
+        self.future = Future()
+        self.pending = pending
+        self.landed = 0
+        if not pending:
+            self.future.set_result(0)
+
+
+class _Destination:
+    def __init__(self):
+        self.items = []      # (uri, filas de seen, _Ticket)
+        self.known = None    # URIs en la playlist o ya en cola
+        self.snapshot = None  # snapshot_id de la playlist con el que 'known' está al día
+        self.pending = {}    # URI en cola o en vuelo -> sus filas de seen
+        self.first_at = None
+        self.in_flight = 0   # URIs sacadas de la cola que aún no han llegado
+        self.loads = 0       # veces que se ha cargado u olvidado 'known'
+
+
+class WriteQueue:
+    """Añadidos agrupados por playlist, escritos por un hilo propio.
+
+    present(playlist_id) devuelve las URIs que ya tiene la playlist; se
+    llama al empezar y cada vez que su snapshot_id cambia por algo que no
+    ha escrito la cola. Con 'journal' cada lote pasa por el diario y las
+    filas de 'seen' del actualizador se confirman en 'seen_path' solo
+    cuando su lote está escrito.
+    """
+
+    def __init__(self, sp, journal=None, seen_path=None, batch_size=BATCH, max_delay=2.0, present=None):
+        self.sp = sp
+        self.journal = journal
+        self.seen_path = seen_path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.present = present
+        self._cond = threading.Condition()
+        self._dests = {}
+        self._thread = None
+        self._closed = False
+
+    def depth(self):
+        """URIs esperando a escribirse (todas las playlists)."""
+        with self._cond:
+            return sum(len(d.items) for d in self._dests.values())
+
+    def _known(self, playlist_id):
+        """Destino con 'known' al día; la playlist solo se relee si su snapshot no es el último visto."""
+        while True:
+            with self._cond:
+                dest = self._dests.setdefault(playlist_id, _Destination())
+                # Con escrituras nuestras en marcha 'known' ya cuenta con ellas
+                if dest.known is not None and (dest.items or dest.in_flight):
+                    return dest
+                loads, loaded = dest.loads, dest.known is not None
+            # Las lecturas de Spotify van fuera del candado
+            snapshot = self.sp.playlist(playlist_id, fields="snapshot_id")['snapshot_id']
+            if not loaded:
+                known = set(self.present(playlist_id)) if self.present else set()
+            with self._cond:
+                if dest.loads != loads:
+                    continue  # otro add() la cargó u olvidó mientras tanto
+                if loaded:
+                    if dest.snapshot == snapshot or dest.items or dest.in_flight:
+                        return dest
+                    # La cambió otro (/sort, /top, a mano): lo que quitó se puede volver a añadir
+                    self._forget(dest)
+                    continue
+                dest.known, dest.snapshot = known, snapshot
+                dest.loads += 1
+                return dest
+
+    def _forget(self, dest):
+        dest.known = None
+        dest.snapshot = None
+        dest.loads += 1
+
+    def add(self, playlist_id, uris, seen=None, label=None):
+        """Encola 'uris' para la playlist; 'seen' son sus filas de SeenStore (mismo orden)."""
+        while True:
+            dest = self._known(playlist_id)
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("La cola de escrituras está cerrada")
+                if dest.known is None:
+                    continue  # otro add() vio que la playlist cambió y la olvidó entre medias
+                ticket, present_rows = self._enqueue(playlist_id, dest, uris, seen, label)
+                break
+        self._commit_seen(present_rows)
+        return ticket.future
+
+    def _enqueue(self, playlist_id, dest, uris, seen, label):
+        """Con el candado: pone en cola lo nuevo y devuelve el _Ticket y las filas a confirmar ya."""
+        fresh, present_rows = [], []
+        for i, uri in enumerate(uris):
+            row = seen[i] if seen else None
+            if uri in dest.known:
+                # Vista cuando llegue el lote que ya la lleva, o ahora si ya está en la playlist
+                if row is not None and uri in dest.pending:
+                    dest.pending[uri].append(row)
+                elif row is not None:
+                    present_rows.append(row)
+                continue
+            dest.known.add(uri)
+            fresh.append((uri, [row] if row is not None else []))
+        ticket = _Ticket(len(fresh))
+        METRICS.inc("write_queue_deduped_total", len(uris) - len(fresh))
+        if fresh:
+            if not dest.items:
+                dest.first_at = time.monotonic()
+            dest.items.extend((uri, rows, ticket) for uri, rows in fresh)
+            dest.pending.update(fresh)
+            if label:
+                logger.info(f"Cola de escritura {playlist_id}: +{len(fresh)} de '{label}'")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, daemon=True, name="spotibot-writes")
+                self._thread.start()
+            self._cond.notify()
+        return ticket, present_rows
+
+    def _commit_seen(self, rows):
+        if rows and self.seen_path:
+            with SeenStore(self.seen_path, migrate=False) as store:
+                store.add_many(rows)
+
+    def flush(self):
+        """Escribe ya lo pendiente sin esperar a max_delay."""
+        with self._cond:
+            for dest in self._dests.values():
+                if dest.items:
+                    dest.first_at = 0.0
+            self._cond.notify()
+
+    def close(self, wait=True):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def _next_batch(self):
+        """Espera a que algún destino tenga un lote listo y lo saca de la cola."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                waiting = [(pid, d) for pid, d in self._dests.items() if d.items]
+                if not waiting and self._closed:
+                    return None, None
+                for pid, dest in waiting:
+                    if len(dest.items) >= self.batch_size or self._closed or now - dest.first_at >= self.max_delay:
+                        batch = dest.items[:self.batch_size]
+                        del dest.items[:self.batch_size]
+                        dest.in_flight += len(batch)
+                        dest.first_at = now if dest.items else None
+                        return pid, batch
+                timeout = min(d.first_at + self.max_delay - now for _, d in waiting) if waiting else None
+                self._cond.wait(timeout)
+
+    def _worker(self):
+        while True:
+            playlist_id, batch = self._next_batch()
+            if batch is None:
+                return
+            uris = [uri for uri, _, _ in batch]
+            tickets = list(dict.fromkeys(ticket for _, _, ticket in batch))
+            with self._cond:
+                # Las filas que otros add() colgaron de estas URIs hasta ahora
+                counts = [len(uri_rows) for _, uri_rows, _ in batch]
+                rows = [row for _, uri_rows, _ in batch for row in uri_rows]
+            try:
+                op = write_steps(self.sp, playlist_id, [('add', uris)], journal=self.journal,
+                                 on_done=commit_seen if rows and self.seen_path else None,
+                                 label=f"cola {playlist_id}", seen=rows, seen_path=self.seen_path)
+            except Exception as e:
+                logger.error(f"Cola de escritura {playlist_id}: {e}")
+                with self._cond:
+                    dest = self._dests[playlist_id]
+                    dest.in_flight -= len(batch)
+                    for uri in uris:
+                        dest.pending.pop(uri, None)
+                        dest.known.discard(uri)
+                    # No se sabe qué llegó: se relee la playlist en el siguiente add()
+                    if not dest.items and dest.in_flight == 0:
+                        self._forget(dest)
+                for ticket in tickets:
+                    if not ticket.future.done():
+                        ticket.future.set_exception(e)
+                continue
+            with self._cond:
+                dest = self._dests[playlist_id]
+                dest.in_flight -= len(batch)
+                for uri in uris:
+                    dest.pending.pop(uri, None)
+                # Las que llegaron mientras se escribía el lote
+                late = [row for (_, uri_rows, _), n in zip(batch, counts) for row in uri_rows[n:]]
+                # La playlist ya es la que 'known' describe
+                dest.snapshot = op.snapshot_id
+            self._commit_seen(late)
+            METRICS.inc("write_queue_batches_total")
+            METRICS.inc("write_queue_uris_total", len(uris))
+            for _, _, ticket in batch:
+                ticket.pending -= 1
+                ticket.landed += 1
+            for ticket in tickets:
+                if ticket.pending == 0 and not ticket.future.done():
+                    ticket.future.set_result(ticket.landed)